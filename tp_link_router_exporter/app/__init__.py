@@ -37,6 +37,8 @@ def create_app(config=config.base_config):
         from .routes import debug  # noqa: F401
         from .routes import tp_link_router  # noqa: F401
         from .routes import collector  # noqa: F401
+        from .routes import metrics as metrics_routes  # noqa: F401
+        from .routes import device_history  # noqa: F401
 
         # after routes, register metrics
         register_metrics(app)
@@ -0,0 +1,143 @@
+import time
+
+
+class AdaptiveIntervalException(Exception):
+    pass
+
+
+class ScrapeSummary(object):
+    """What one scrape saw, just enough to tell how much changed since the
+    one before it
+    """
+    __slots__ = ('device_keys', 'client_counts', 'packets_total', 'taken_at')
+
+    def __init__(self, device_keys, client_counts, packets_total,
+                 taken_at=None):
+        super().__init__()
+        self.device_keys = frozenset(device_keys)
+        self.client_counts = tuple(client_counts)
+        self.packets_total = packets_total
+        if taken_at is None:
+            taken_at = time.monotonic()
+        self.taken_at = taken_at
+
+    def __repr__(self):
+        return (f'ScrapeSummary ({len(self.device_keys)} devices) '
+                f'=> {self.client_counts}, {self.packets_total}')
+
+
+class AdaptiveInterval(object):
+    """Scrape interval of one router that follows how busy the router is
+
+    Every scrape is compared with the one before it. The interval is
+    stretched while the client counts and the packet rate barely move,
+    tightened as soon as they move a lot or a device joins or leaves, and
+    always kept well above how long the scrapes themselves take. It never
+    leaves `min_seconds` to `max_seconds`.
+    """
+    # change ratios (relative to the previous scrape) to stretch / tighten at
+    LOW_CHANGE_RATIO = 0.05
+    HIGH_CHANGE_RATIO = 0.25
+    STRETCH_FACTOR = 1.5
+    TIGHTEN_FACTOR = 0.5
+    # a scrape taking more than this share of the interval is too close,
+    # so the interval is grown until it takes `TARGET_BUSY_RATIO` again
+    MAX_BUSY_RATIO = 0.75
+    TARGET_BUSY_RATIO = 0.5
+
+    def __init__(self, enabled, min_seconds, max_seconds):
+        super().__init__()
+        self.enabled = bool(enabled)
+        self.min_seconds = float(min_seconds)
+        self.max_seconds = max(float(max_seconds), self.min_seconds)
+        self._interval_seconds = None
+        self._previous = None
+        self._previous_packets_rate = None
+
+    def __repr__(self):
+        return (f'AdaptiveInterval ({self.min_seconds}-{self.max_seconds}) '
+                f'=> {self._interval_seconds}')
+
+    @property
+    def is_enabled(self):
+        return self.enabled
+
+    @property
+    def interval_seconds(self):
+        return self._interval_seconds
+
+    def clamp(self, interval_seconds):
+        return min(max(interval_seconds, self.min_seconds), self.max_seconds)
+
+    def start(self, base_seconds):
+        # the fixed interval the router would have used is the starting point
+        self._interval_seconds = self.clamp(float(base_seconds))
+        return self._interval_seconds
+
+    @classmethod
+    def get_client_count_change_ratio(cls, previous, current):
+        changed = sum(abs(c - p) for c, p in zip(
+            current.client_counts,
+            previous.client_counts))
+        return changed / max(sum(previous.client_counts), 1)
+
+    def _get_packets_rate(self, previous, current):
+        elapsed = current.taken_at - previous.taken_at
+        delta = current.packets_total - previous.packets_total
+        if elapsed <= 0 or delta < 0:
+            # counters reset (router reboot), no rate to compare against
+            return None
+        return delta / elapsed
+
+    def get_change_ratio(self, previous, current):
+        """How much changed between two scrapes, `None` if devices joined or
+        left
+        """
+        if current.device_keys != previous.device_keys:
+            self._previous_packets_rate = None
+            return None
+        change_ratio = self.get_client_count_change_ratio(previous, current)
+        packets_rate = self._get_packets_rate(previous, current)
+        previous_packets_rate = self._previous_packets_rate
+        self._previous_packets_rate = packets_rate
+        if packets_rate is None or previous_packets_rate is None:
+            return change_ratio
+        rate_change_ratio = (abs(packets_rate - previous_packets_rate)
+                             / max(previous_packets_rate, 1.0))
+        return max(change_ratio, rate_change_ratio)
+
+    def _adapt_to_changes(self, interval_seconds, summary):
+        previous = self._previous
+        self._previous = summary
+        if previous is None:
+            return interval_seconds
+        change_ratio = self.get_change_ratio(previous, summary)
+        if change_ratio is None or change_ratio >= self.HIGH_CHANGE_RATIO:
+            return interval_seconds * self.TIGHTEN_FACTOR
+        if change_ratio <= self.LOW_CHANGE_RATIO:
+            return interval_seconds * self.STRETCH_FACTOR
+        return interval_seconds
+
+    def _adapt_to_scrape_seconds(self, interval_seconds, scrape_seconds):
+        if not scrape_seconds:
+            return interval_seconds
+        if scrape_seconds <= interval_seconds * self.MAX_BUSY_RATIO:
+            return interval_seconds
+        return scrape_seconds / self.TARGET_BUSY_RATIO
+
+    def observe(self, summary, scrape_seconds):
+        """Adapts to one finished scrape, `summary` is `None` when nothing
+        new was fetched. Returns the new interval.
+        """
+        interval_seconds = self._interval_seconds
+        if not self.enabled or interval_seconds is None:
+            return interval_seconds
+        if summary is not None:
+            interval_seconds = self._adapt_to_changes(
+                interval_seconds,
+                summary)
+        interval_seconds = self._adapt_to_scrape_seconds(
+            interval_seconds,
+            scrape_seconds)
+        self._interval_seconds = self.clamp(interval_seconds)
+        return self._interval_seconds
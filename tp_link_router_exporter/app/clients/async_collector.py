@@ -0,0 +1,192 @@
+import asyncio
+from flask import current_app as app
+from ..common.router_endpoints import RouterEndpoints
+from ..common.scrape_events import ScrapeEvents
+from ..common.scrape_phases import ScrapePhases
+from .async_tp_link_router import AsyncTPLinkRouter
+from .collector import Collector, CollectorFetchException
+
+
+log = app.logger
+
+
+class AsyncCollector(Collector):
+    """Collector that scrapes its router on an asyncio event loop
+
+    Recording metrics and the device cache are shared with `Collector`, only
+    the router I/O is awaited instead of blocking a thread.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # each cycle runs on its own event loop and always logs out
+        self.session_reuse = False
+
+    @classmethod
+    def get_router_client(cls, **kwargs):
+        return AsyncTPLinkRouter.get_client(**kwargs)
+
+    async def _async_authorize(self):
+        try:
+            with self._time_scrape_phase(ScrapePhases.AUTHORIZE):
+                await self.router_client.authorize()
+        except Exception:
+            self._handle_authorize_error()
+            raise
+        self._handle_authorize_success()
+
+    async def _async_logout(self):
+        try:
+            with self._time_scrape_phase(ScrapePhases.LOGOUT):
+                await self.router_client.logout()
+        except Exception as logout_exc:
+            self._handle_logout_exception(logout_exc)
+        else:
+            event = ScrapeEvents.LOGOUT
+            self._inc_scrape_event(event)
+
+    async def _async_fetch(self, fetch_func, event, description):
+        try:
+            result = await fetch_func()
+            self._inc_scrape_event(event)
+            return result
+        except Exception as unexp:
+            u_m = f'{description} got unexp: {unexp}'
+            log.error(u_m)
+            raise CollectorFetchException(u_m)
+
+    async def _async_get_firmware(self):
+        return await self._async_fetch(
+            self.router_client.get_firmware,
+            ScrapeEvents.GET_FIRMWARE,
+            'get firmware')
+
+    async def _async_get_status(self):
+        return await self._async_fetch(
+            self.router_client.get_status,
+            ScrapeEvents.GET_STATUS,
+            'get router status')
+
+    async def _async_get_ipv4_reservations(self):
+        return await self._async_fetch(
+            self.router_client.get_ipv4_reservations,
+            ScrapeEvents.GET_IPV4_RESERVATIONS,
+            'get ipv4 reservations')
+
+    async def _async_get_ipv4_dhcp_leases(self):
+        leases = await self._async_fetch(
+            self.router_client.get_ipv4_dhcp_leases,
+            ScrapeEvents.GET_IPV4_DHCP_LEASES,
+            'get ipv4 dhcp leases')
+        self._anchor_ipv4_dhcp_leases(leases)
+        return leases
+
+    async def _async_get_and_record(self, endpoint, fetch_func, record_func,
+                                    description):
+        tier = self.get_refresh_tier(endpoint)
+        record_phase = ScrapePhases.get_record_phase(endpoint)
+        try:
+            if not tier.is_due():
+                with self._time_scrape_phase(record_phase):
+                    return self._record_cached(record_func, tier, description)
+            with self._time_scrape_phase(
+                    ScrapePhases.get_fetch_phase(endpoint)):
+                result = await fetch_func()
+            tier.update(result)
+            with self._time_scrape_phase(record_phase):
+                self._record_fetched(record_func, result, description)
+        except Exception as exc:
+            self._handle_get_and_record_exception(exc, description)
+
+    async def _async_get_and_record_authed_router_metrics(self):
+        self._start_authed_router_metrics()
+
+        await self._async_get_and_record(
+            RouterEndpoints.FIRMWARE,
+            self._async_get_firmware,
+            self._record_firmware_metrics,
+            'firmware')
+        # same as the sync flow, at least **something** came back
+        self._update_last_update_date()
+        await self._async_get_and_record(
+            RouterEndpoints.STATUS,
+            self._async_get_status,
+            self._record_status_and_devices,
+            'status and devices')
+        await self._async_get_and_record(
+            RouterEndpoints.IPV4_RESERVATIONS,
+            self._async_get_ipv4_reservations,
+            self._record_ipv4_reservations,
+            'ipv4 reservations')
+        await self._async_get_and_record(
+            RouterEndpoints.IPV4_DHCP_LEASES,
+            self._async_get_ipv4_dhcp_leases,
+            self._record_ipv4_dhcp_leases,
+            'ipv4 dhcp leases')
+
+    # handles flow, including log in/out
+    async def _async_execute_get_router_metrics(self):
+        self._start_router_scrape_flow()
+        async with self.router_client.open_session():
+            authorized = False
+            try:
+                await self._async_authorize()
+                authorized = True
+                self._handle_authorized()
+                await self._async_get_and_record_authed_router_metrics()
+            except Exception as unexp:
+                self._handle_scrape_error(unexp)
+            else:
+                self._handle_scrape_success()
+
+            finally:
+                if authorized:
+                    self._start_logout()
+                    await self._async_logout()
+                else:
+                    self._skip_logout()
+                self._finish_router_scrape_flow()
+
+    async def async_get_router_metrics(self):
+        if not self.has_due_refresh_tiers():
+            # no router I/O needed, so nothing to await
+            return self._execute_record_cached_router_metrics()
+        if not self._allow_router_scrape():
+            return None
+        return await self._async_execute_get_router_metrics()
+
+    async def _async_acquire_router_lock(self):
+        # same as `_acquire_router_lock`, without blocking the event loop
+        router_lock = self.router_lock
+        if router_lock.acquire(0):
+            return True
+        self._inc_scrape_event(ScrapeEvents.ROUTER_LOCK_WAIT)
+        deadline = router_lock.get_now() + router_lock.timeout_seconds
+        while router_lock.get_now() < deadline:
+            await asyncio.sleep(router_lock.POLL_SECONDS)
+            if router_lock.acquire(0):
+                return True
+        self._handle_router_lock_timeout()
+        return False
+
+    async def async_update_router_metrics(self):
+        # waiting on the lock would stall the whole event loop, and an
+        # on demand scrape already in flight leaves nothing to do anyway
+        if not self._scrape_lock.acquire(blocking=False):
+            self._inc_scrape_event(ScrapeEvents.SKIP_IN_FLIGHT_SCRAPE)
+            return None
+        try:
+            if not await self._async_acquire_router_lock():
+                return None
+            started_at = self.get_monotonic_now()
+            try:
+                return await self.async_get_router_metrics()
+            finally:
+                self.router_lock.release()
+                self._finish_scrape_timing(started_at)
+        finally:
+            self._mark_scraped()
+            self._scrape_lock.release()
+
+    def get_router_metrics(self):
+        # lets the sync callers (routes, scheduler) drive an async collector
+        return asyncio.run(self.async_get_router_metrics())
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from contextlib import nullcontext
+from flask import current_app as app
+
+
+log = app.logger
+
+
+class AsyncScrapeLoopException(Exception):
+    pass
+
+
+class AsyncScrapeLoop(object):
+    """One long-lived event loop for every async scrape of a process
+
+    Scheduled jobs and the update route hand their scrapes to it, instead of
+    starting an event loop (and holding a thread) per router. At most
+    `max_tasks` of them run on it at the same time.
+    """
+    def __init__(self, max_tasks, flask_app=None):
+        super().__init__()
+        self.max_tasks = max(int(max_tasks), 1)
+        self.flask_app = flask_app
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'AsyncScrapeLoop ({self.max_tasks}) => {self._loop}'
+
+    def _run(self, loop, started):
+        asyncio.set_event_loop(loop)
+        self._semaphore = asyncio.Semaphore(self.max_tasks)
+        # tasks copy the loop thread's context, app context included
+        context = nullcontext()
+        if self.flask_app is not None:
+            context = self.flask_app.app_context()
+        with context:
+            started.set()
+            loop.run_forever()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(loop, started),
+                    name='async_scrape_loop',
+                    daemon=True)
+                thread.start()
+                started.wait()
+                self._loop = loop
+                log.debug(f'{self} started')
+            return self._loop
+
+    async def _run_bounded(self, coroutine_func):
+        async with self._semaphore:
+            return await coroutine_func()
+
+    def submit(self, coroutine_func):
+        """Runs `coroutine_func()` on the loop, returns its
+        `concurrent.futures.Future` right away
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._run_bounded(coroutine_func),
+            self.loop)
@@ -0,0 +1,263 @@
+import re
+import json
+from contextlib import asynccontextmanager
+from importlib.metadata import version, PackageNotFoundError
+import aiohttp
+from tplinkrouterc6u.exception import ClientException, ClientError
+from flask import current_app as app
+from .tp_link_router import (
+    SessionTplinkRouter,
+    TPLinkRouter,
+    TP_LINK_ROUTER_TIMEOUT,
+)
+
+
+log = app.logger
+
+
+# https://github.com/AlexandrErohin/TP-Link-Archer-C6U
+#
+# The async client speaks the same encrypted web API as `TplinkRouter`, but
+# does all network I/O with `aiohttp`. Encryption, signing and parsing of the
+# responses are left to `tplinkrouterc6u` by replaying the raw responses
+# fetched here through a `TplinkRouter` that never touches the network.
+#
+# The replay relies on `TplinkRouter` internals (`_prepare_data`,
+# `_decrypt_response`, `_seq`, `_pwdNN`, `_encryption`, `_data_block`,
+# `_url_firmware`, ...), so `tplinkrouterc6u` is pinned to the version below
+# in requirements.txt.
+TPLINKROUTERC6U_VERSION = '3.4.1'
+
+
+class AsyncTPLinkRouterException(Exception):
+    pass
+
+
+class ReplayTplinkRouter(SessionTplinkRouter):
+    """`TplinkRouter` that answers requests from pre-fetched responses"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._responses = {}
+
+    def add_response(self, path, response):
+        self._responses[path] = response
+
+    def request(self, path, data, ignore_response=False,
+                ignore_errors=False):
+        return self._responses.pop(path)
+
+
+class AsyncTPLinkRouter(TPLinkRouter):
+    _checked_version = False
+    STATUS_PATH = 'admin/status?form=all&operation=read'
+    LOGOUT_PATH = 'admin/system?form=logout'
+    KEYS_PATH = 'login?form=keys'
+    AUTH_PATH = 'login?form=auth'
+    LOGIN_PATH = 'login?form=login'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._session = None
+        self.check_version()
+
+    @classmethod
+    def check_version(cls):
+        if cls._checked_version:
+            return
+        cls._checked_version = True
+        try:
+            installed = version('tplinkrouterc6u')
+        except PackageNotFoundError:
+            installed = None
+        if installed != TPLINKROUTERC6U_VERSION:
+            log.warning(f'AsyncTPLinkRouter was written against '
+                        f'tplinkrouterc6u {TPLINKROUTERC6U_VERSION}, '
+                        f'found: {installed}')
+
+    @property
+    def router(self):
+        if self._router:
+            return self._router
+        self._router = ReplayTplinkRouter(
+            self.router_ip,
+            self.router_password,
+            timeout=TP_LINK_ROUTER_TIMEOUT)
+        return self._router
+
+    @property
+    def session(self):
+        if not self._session:
+            e_m = (f'no open session for router_ip: {self.router_ip}, '
+                   f'use `open_session()` first')
+            raise AsyncTPLinkRouterException(e_m)
+        return self._session
+
+    @asynccontextmanager
+    async def open_session(self):
+        timeout = aiohttp.ClientTimeout(total=TP_LINK_ROUTER_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            self._session = session
+            try:
+                yield self
+            finally:
+                self._session = None
+
+    @property
+    def _ssl(self):
+        # `None` means aiohttp default verification
+        return None if self.router._verify_ssl else False
+
+    def _login_url(self, path):
+        return f'{self.router.host}/cgi-bin/luci/;stok=/{path}'
+
+    def _url(self, path):
+        router = self.router
+        return f'{router.host}/cgi-bin/luci/;stok={router._stok}/{path}'
+
+    async def _post(self, url, **kwargs):
+        async with self.session.post(url, ssl=self._ssl, **kwargs) as resp:
+            text = await resp.text()
+            return resp.status, text, resp.headers
+
+    @classmethod
+    def _load_json(cls, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    async def _request_pwd(self):
+        router = self.router
+        url = self._login_url(self.KEYS_PATH)
+        _, text, _ = await self._post(url, params={'operation': 'read'})
+        try:
+            args = self._load_json(text)[router._data_block]['password']
+            router._pwdNN = args[0]
+            router._pwdEE = args[1]
+        except Exception as e:
+            error = (f'AsyncTPLinkRouter - Unknown error for pwd! '
+                     f'Error - {e}; Response - {text}')
+            raise ClientException(error)
+
+    async def _request_seq(self):
+        router = self.router
+        url = self._login_url(self.AUTH_PATH)
+        _, text, _ = await self._post(url, params={'operation': 'read'})
+        try:
+            data = self._load_json(text)[router._data_block]
+            router._seq = data['seq']
+            router.nn = data['key'][0]
+            router.ee = data['key'][1]
+        except Exception as e:
+            error = (f'AsyncTPLinkRouter - Unknown error for seq! '
+                     f'Error - {e}; Response - {text}')
+            raise ClientException(error)
+
+    async def _try_login(self):
+        router = self.router
+        crypted_pwd = router._encryption.rsa_encrypt(
+            router.password,
+            router._pwdNN,
+            router._pwdEE)
+        body = router._prepare_data(router._get_login_data(crypted_pwd))
+        return await self._post(
+            self._login_url(self.LOGIN_PATH),
+            data=body,
+            headers=router._headers)
+
+    async def authorize(self):
+        router = self.router
+        if router._pwdNN == '':
+            await self._request_pwd()
+        if router._seq == '':
+            await self._request_seq()
+
+        status, text, headers = await self._try_login()
+        if self._load_json(text) is None or status == 403:
+            router._logged = False
+            await self._request_pwd()
+            await self._request_seq()
+            status, text, headers = await self._try_login()
+
+        try:
+            data = router._decrypt_response(self._load_json(text))
+            router._stok = data[router._data_block]['stok']
+            regex_result = re.search(
+                'sysauth=(.*);', headers['set-cookie'])
+            router._sysauth = regex_result.group(1)
+            router._logged = True
+        except Exception as e:
+            error = (f'AsyncTPLinkRouter - Cannot authorize! '
+                     f'Error - {e}; Response - {text}')
+            raise ClientException(error)
+
+    async def _request(self, path, data, ignore_response=False):
+        router = self.router
+        if router._logged is False:
+            raise Exception('Not authorised')
+        _, text, _ = await self._post(
+            self._url(path),
+            data=router._prepare_data(data),
+            headers=router._headers,
+            cookies={'sysauth': router._sysauth})
+        if ignore_response:
+            return None
+
+        error = ''
+        try:
+            response = self._load_json(text)
+            if not response or 'data' not in response:
+                raise Exception("Router didn't respond with JSON")
+            response = router._decrypt_response(response)
+            if router._is_valid_response(response):
+                return response.get(router._data_block)
+        except Exception as e:
+            error = (f'AsyncTPLinkRouter - An unknown response - {e}; '
+                     f'Request {path} - Response {text}')
+        if not error:
+            error = (f'AsyncTPLinkRouter - Response with error; '
+                     f'Request {path} - Response {text}')
+        raise ClientError(error)
+
+    async def _prefetch(self, path, data):
+        response = await self._request(path, data)
+        self.router.add_response(path, response)
+
+    async def get_firmware(self):
+        router = self.router
+        await self._prefetch(router._url_firmware, 'operation=read')
+        firmware = router.get_firmware()
+        log.debug(f'router firmware: {firmware}')
+        return firmware
+
+    async def get_status(self):
+        router = self.router
+        await self._prefetch(self.STATUS_PATH, 'operation=read')
+        await self._prefetch(router._url_wireless_stats, 'operation=read')
+        status = router.get_status()
+        log.debug(f'router status: {status}')
+        return status
+
+    async def get_ipv4_reservations(self):
+        router = self.router
+        await self._prefetch(router._url_ipv4_reservations, 'operation=load')
+        ipv4_reservations = router.get_ipv4_reservations()
+        log.debug(f'router ipv4_reservations: {ipv4_reservations}')
+        return ipv4_reservations
+
+    async def get_ipv4_dhcp_leases(self):
+        router = self.router
+        await self._prefetch(router._url_ipv4_dhcp_leases, 'operation=load')
+        ipv4_dhcp_leases = router.get_ipv4_dhcp_leases()
+        log.debug(f'router ipv4_dhcp_leases: {ipv4_dhcp_leases}')
+        return ipv4_dhcp_leases
+
+    async def logout(self):
+        router = self.router
+        await self._request(
+            self.LOGOUT_PATH,
+            'operation=write',
+            ignore_response=True)
+        router._stok = ''
+        router._sysauth = ''
+        router._logged = False
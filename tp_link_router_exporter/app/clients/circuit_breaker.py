@@ -0,0 +1,95 @@
+import time
+import random
+from ..common.circuit_breaker_states import CircuitBreakerStates
+
+
+class CircuitBreakerException(Exception):
+    pass
+
+
+class CircuitBreaker(object):
+    """Stops logging in to a router that keeps failing to log in
+
+    After `failure_threshold` failures in a row the breaker opens and the
+    router is skipped for `base_seconds`, doubling with every further failure
+    up to `max_seconds`. Each backoff is shortened by a random share of up to
+    `jitter`, so routers that went down together don't all come back at once.
+    Once the backoff is over the breaker is half-open: one success closes it
+    again, one failure reopens it with the next longer backoff. A
+    `failure_threshold` of `0` turns the breaker off.
+    """
+    DEFAULT_JITTER = 0.2
+    # 2 ** 30 times any sane `base_seconds` is way past `max_seconds` anyway
+    MAX_EXPONENT = 30
+
+    def __init__(self, failure_threshold, base_seconds, max_seconds,
+                 jitter=DEFAULT_JITTER):
+        super().__init__()
+        self.failure_threshold = int(failure_threshold or 0)
+        self.base_seconds = float(base_seconds)
+        self.max_seconds = max(float(max_seconds), self.base_seconds)
+        self.jitter = min(max(float(jitter), 0.0), 1.0)
+        self._state = CircuitBreakerStates.CLOSED
+        self._consecutive_failures = 0
+        self._next_attempt_at = None
+
+    def __repr__(self):
+        return (f'CircuitBreaker ({self.state.label_string}: '
+                f'{self.consecutive_failures}) => {self.next_attempt_at}')
+
+    @classmethod
+    def get_now(cls):
+        # wall clock, the next attempt is exported as a unix timestamp
+        return time.time()
+
+    @classmethod
+    def get_random(cls):
+        return random.random()
+
+    @property
+    def is_enabled(self):
+        return bool(self.failure_threshold > 0)
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def consecutive_failures(self):
+        return self._consecutive_failures
+
+    @property
+    def next_attempt_at(self):
+        return self._next_attempt_at
+
+    def get_backoff_seconds(self):
+        exponent = self.consecutive_failures - self.failure_threshold
+        exponent = min(max(exponent, 0), self.MAX_EXPONENT)
+        backoff = min(self.base_seconds * (2 ** exponent), self.max_seconds)
+        return backoff * (1.0 - self.jitter * self.get_random())
+
+    def allow_request(self, now=None):
+        if self.state is CircuitBreakerStates.OPEN:
+            if now is None:
+                now = self.get_now()
+            if now < self._next_attempt_at:
+                return False
+            self._state = CircuitBreakerStates.HALF_OPEN
+        return True
+
+    def record_success(self):
+        self._state = CircuitBreakerStates.CLOSED
+        self._consecutive_failures = 0
+        self._next_attempt_at = None
+
+    def record_failure(self, now=None):
+        self._consecutive_failures += 1
+        if not self.is_enabled:
+            return
+        if self.state is not CircuitBreakerStates.HALF_OPEN and \
+                self.consecutive_failures < self.failure_threshold:
+            return
+        if now is None:
+            now = self.get_now()
+        self._state = CircuitBreakerStates.OPEN
+        self._next_attempt_at = now + self.get_backoff_seconds()
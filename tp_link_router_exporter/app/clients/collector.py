@@ -1,12 +1,35 @@
-from datetime import datetime
+import time
+import threading
+from contextlib import contextmanager
 from flask import current_app as app
-from ..utils import global_get_now, normalize_name
+from tplinkrouterc6u.exception import ClientError
+from ..utils import global_get_now, normalize_name, normalize_bool
 from ..common.router_firmware_properties import RouterFirmwareProperties
 from ..common.client_connection_types import ClientConnectionTypes
 from ..common.scrape_events import ScrapeEvents
+from ..common.scrape_phases import ScrapePhases
 from ..common.packet_actions import PacketActions
+from ..common.router_endpoints import RouterEndpoints
+from ..common.metrics_recording_modes import MetricsRecordingModes
+from ..common.circuit_breaker_states import CircuitBreakerStates
+from ..common.series_writes import SeriesWrites
 from ..metrics import Metrics
+from .adaptive_interval import AdaptiveInterval, ScrapeSummary
+from .circuit_breaker import CircuitBreaker
 from .device_cache import DeviceCache
+from .device_cache_store import DeviceCacheStore
+from .device_eviction import DeviceEvictionPolicy
+from .device_history import DeviceHistory
+from .device_metric_children import DeviceMetricChildrenCache
+from .env_vars import EnvVars
+from .refresh_tier import RefreshTier
+from .router_lock import RouterLock
+from .scrape_log import ScrapeLog
+from .series_write_cache import SeriesWriteCache
+from .lease_expiry import LeaseExpiryAnchors, lease_expiry_collector
+from .multiprocess_compactor import multiprocess_compactor
+from .packet_rates import PacketRates
+from .router_snapshot import RouterSnapshotBuilder, router_snapshot_collector
 from .tp_link_router import TPLinkRouter
 
 
@@ -55,8 +78,8 @@ class InvalidClientConnectionTypeCollectorException(CollectorException):
 
 class Collector(object):
     DEFAULT_ROUTER_NAME = 'default'
-    PERMANENT_LEASE = 'Permanent'
-    DATETIME_FORMAT = "%H:%M:%S"
+    PERMANENT_LEASE = LeaseExpiryAnchors.PERMANENT_LEASE
+    NOT_AUTHORISED = 'Not authorised'
 
     @classmethod
     def normalize_input(cls, input):
@@ -70,46 +93,208 @@ class Collector(object):
     def default_device_cache(cls):
         return DeviceCache.default_device_cache()
 
+    @classmethod
+    def get_router_client(cls, **kwargs):
+        return TPLinkRouter.get_client(**kwargs)
+
     @classmethod
     def get_collector(cls, router_client=None, **kwargs):
         if not router_client:
-            router_client = TPLinkRouter.get_client(**kwargs)
-        router_name = kwargs.get('router_name')
+            router_client = cls.get_router_client(**kwargs)
+        router_name = kwargs.pop('router_name', None)
         if not router_name:
             router_name = cls.default_router_name()
-        device_cache = kwargs.get('device_cache')
-        if not device_cache:
-            device_cache = cls.default_device_cache()
-        return cls(router_client, router_name, device_cache)
+        device_cache = kwargs.pop('device_cache', None)
+        return cls(router_client, router_name, device_cache, **kwargs)
 
-    def __init__(self, router_client, router_name, device_cache):
+    def __init__(self, router_client, router_name, device_cache, **kwargs):
         super().__init__()
         self.router_client = router_client
         self.router_name = router_name
+        self._scrape_event_children = self._bind_scrape_event_children()
+        self._scrape_phase_children = self._bind_scrape_phase_children()
+        self._series_write_children = self._bind_series_write_children()
+        # gauges mode only, snapshots are rebuilt every scrape anyway
+        self.series_writes = SeriesWriteCache()
+        self._device_children = DeviceMetricChildrenCache(router_name)
+        self.scrape_log = ScrapeLog(
+            router_name,
+            level=kwargs.get(
+                'log_level',
+                EnvVars.get_default_scrape_log_level()),
+            sample_rate=kwargs.get(
+                'log_sample_rate',
+                EnvVars.get_default_scrape_log_sample_rate()))
         self._last_update_date = None
+        self.device_cache_store = DeviceCacheStore(kwargs.get(
+            'device_cache_dir',
+            EnvVars.get_default_device_cache_dir()))
+        if not device_cache:
+            device_cache = self.load_device_cache()
         self._device_cache = device_cache
+        # `None` means the scheduler picks (global interval, staggered start)
+        interval_seconds = kwargs.get('interval_seconds')
+        self.interval_seconds = interval_seconds
+        offset_seconds = kwargs.get('offset_seconds')
+        self.offset_seconds = offset_seconds
+        adaptive_interval = kwargs.get(
+            'adaptive_interval',
+            EnvVars.get_default_adaptive_interval())
+        self.adaptive_interval = AdaptiveInterval(
+            normalize_bool(adaptive_interval),
+            kwargs.get(
+                'adaptive_interval_min_seconds',
+                EnvVars.get_default_adaptive_interval_min_seconds()),
+            kwargs.get(
+                'adaptive_interval_max_seconds',
+                EnvVars.get_default_adaptive_interval_max_seconds()))
+        self._scrape_summary = None
+        self._summarized_status = None
+        # opt-in, keeps the router logged in between scrapes
+        session_reuse = kwargs.get(
+            'session_reuse',
+            EnvVars.get_default_session_reuse())
+        self.session_reuse = normalize_bool(session_reuse)
+        session_ttl_seconds = kwargs.get(
+            'session_ttl_seconds',
+            EnvVars.get_default_session_ttl_seconds())
+        self.session_ttl_seconds = float(session_ttl_seconds)
+        session_idle_logout_seconds = kwargs.get(
+            'session_idle_logout_seconds',
+            EnvVars.get_default_session_idle_logout_seconds())
+        self.session_idle_logout_seconds = float(session_idle_logout_seconds)
+        self._session_lock = threading.RLock()
+        # serializes whole scrapes, see `update_router_metrics_if_stale`
+        self._scrape_lock = threading.Lock()
+        self._last_scraped_at = None
+        # serializes everything talking to this router, across processes too
+        self.router_lock = RouterLock.get_lock(
+            self.router_ip,
+            timeout_seconds=kwargs.get('router_lock_timeout_seconds'))
+        self.circuit_breaker = CircuitBreaker(
+            kwargs.get(
+                'circuit_breaker_failure_threshold',
+                EnvVars.get_default_circuit_breaker_failure_threshold()),
+            kwargs.get(
+                'circuit_breaker_base_seconds',
+                EnvVars.get_default_circuit_breaker_base_seconds()),
+            kwargs.get(
+                'circuit_breaker_max_seconds',
+                EnvVars.get_default_circuit_breaker_max_seconds()))
+        self._record_circuit_breaker_metrics()
+        on_demand_ttl_seconds = kwargs.get(
+            'on_demand_ttl_seconds',
+            EnvVars.get_default_on_demand_ttl_seconds())
+        self.on_demand_ttl_seconds = float(on_demand_ttl_seconds)
+        self._idle_logout_timer = None
+        self._refresh_tiers = self._create_refresh_tiers(**kwargs)
+        self.metrics_recording_mode = self._get_metrics_recording_mode(
+            kwargs.get(
+                'metrics_recording_mode',
+                EnvVars.get_default_metrics_recording_mode()))
+        self.snapshot_collector = kwargs.get(
+            'snapshot_collector',
+            router_snapshot_collector)
+        self._snapshot_builder = None
+        self.lease_expiry = LeaseExpiryAnchors(router_name)
+        self.lease_expiry_collector = kwargs.get(
+            'lease_expiry_collector',
+            lease_expiry_collector)
+        device_eviction_ttl_seconds = kwargs.get(
+            'device_eviction_ttl_seconds',
+            EnvVars.get_default_device_eviction_ttl_seconds())
+        self.device_eviction = DeviceEvictionPolicy(
+            device_eviction_ttl_seconds)
+        self.device_history = DeviceHistory(
+            router_name,
+            samples=kwargs.get('device_history_samples'),
+            max_devices=kwargs.get('device_history_max_devices'))
+        self._history_status = None
+        self.packet_rates = PacketRates()
+        self._packet_rates_status = None
+        # monotonic time of the status being recorded, `None` when it was
+        # recorded before and the packet counts have nothing new in them
+        self._packets_observed_at = None
+        self._packet_counter_resets_child = (
+            Metrics.ROUTER_DEVICE_PACKET_COUNTER_RESETS_TOTAL.labels(
+                router_name=router_name))
+
+    @classmethod
+    def _get_metrics_recording_mode(cls, mode):
+        try:
+            return MetricsRecordingModes(mode)
+        except ValueError:
+            log.error(f'Unknown metrics recording mode: {mode}, falling '
+                      f'back to: {MetricsRecordingModes.DEFAULT.label_string}')
+            return MetricsRecordingModes.DEFAULT
+
+    @property
+    def records_snapshots(self):
+        return bool(
+            self.metrics_recording_mode == MetricsRecordingModes.SNAPSHOT)
+
+    @classmethod
+    def _create_refresh_tiers(cls, **kwargs):
+        refresh_tiers = {}
+        for endpoint in RouterEndpoints.metrics_endpoints_list():
+            refresh_seconds = kwargs.get(
+                endpoint.refresh_seconds_key_name,
+                EnvVars.get_default_refresh_seconds(endpoint))
+            refresh_tiers[endpoint] = RefreshTier(endpoint, refresh_seconds)
+        return refresh_tiers
+
+    @property
+    def refresh_tiers(self):
+        return self._refresh_tiers
+
+    def get_refresh_tier(self, endpoint):
+        return self.refresh_tiers[endpoint]
+
+    def has_due_refresh_tiers(self):
+        return any(tier.is_due() for tier in self.refresh_tiers.values())
 
     @property
     def device_cache(self):
         return self._device_cache
 
+    def load_device_cache(self):
+        if self.device_cache_store.is_enabled:
+            try:
+                device_cache = self.device_cache_store.load(self.router_name)
+            except Exception as unexp:
+                log.error(f'{self.router_name} => loading device cache '
+                          f'from: {self.device_cache_store} '
+                          f'got unexp: {unexp}')
+            else:
+                if device_cache:
+                    return device_cache
+        return self.default_device_cache()
+
+    def save_device_cache(self):
+        if not self.device_cache_store.is_enabled:
+            return
+        try:
+            self.device_cache_store.save(self.router_name, self.device_cache)
+        except Exception as unexp:
+            log.error(f'{self.router_name} => saving device cache '
+                      f'to: {self.device_cache_store} got unexp: {unexp}')
+            return
+        self._inc_scrape_event(ScrapeEvents.SAVE_DEVICE_CACHE)
+
     def has_device(self, device):
-        return self.device_cache.has_device(
-            device,
-            self.last_update_date)
+        return self.device_cache.has_device(device)
 
-    def add_or_update_device(self, device):
+    def add_or_update_device(self, device, key=None):
         self.device_cache.add_or_update_device(
             device,
-            self.last_update_date)
+            self.last_update_date,
+            key=key)
 
     def get_stale_device_map_from_cache(self):
-        return self.device_cache.get_stale_devices_map(
-            self.last_update_date)
+        return self.device_cache.get_stale_devices_map()
 
     def drop_all_stale_devices_from_cache(self):
-        return self.device_cache.drop_all_stale_devices(
-            self.last_update_date)
+        return self.device_cache.drop_all_stale_devices()
 
     @property
     def last_update_date(self):
@@ -118,105 +303,290 @@ class Collector(object):
     def _update_last_update_date(self):
         self._inc_scrape_event(ScrapeEvents.UPDATE_LAST_UPDATE_DATE)
         self._last_update_date = self.get_now()
+        self.device_cache.start_generation()
 
     @classmethod
     def get_now(cls):
         return global_get_now()
 
     def __repr__(self):
-        return (f'Collector (updated: {self.last_update_date}) => '
+        return (f'Collector ({self.router_name}) '
+                f'(updated: {self.last_update_date}) => '
                 f'router_client: {self.router_client}')
 
+    def _bind_scrape_event_children(self):
+        return {
+            event: Metrics.ROUTER_SCRAPE_EVENT_COLLECTOR_COUNTER.labels(
+                router_name=self.router_name,
+                scrape_event=event.label_string,
+            )
+            for event in ScrapeEvents
+        }
+
     def _inc_scrape_event(self, event):
-        Metrics.ROUTER_SCRAPE_EVENT_COLLECTOR_COUNTER.labels(
-            router_name=self.router_name,
-            scrape_event=event.label_string,
-        ).inc()
+        self._scrape_event_children[event].inc()
+
+    def _bind_scrape_phase_children(self):
+        return {
+            phase: Metrics.ROUTER_SCRAPE_PHASE_SECONDS.labels(
+                router_name=self.router_name,
+                scrape_phase=phase.label_string,
+            )
+            for phase in ScrapePhases
+        }
+
+    def _observe_scrape_phase(self, phase, seconds):
+        self._scrape_phase_children[phase].observe(seconds)
+
+    def _bind_series_write_children(self):
+        return {
+            write: Metrics.ROUTER_SERIES_WRITES_TOTAL.labels(
+                router_name=self.router_name,
+                series_write=write.label_string,
+            )
+            for write in SeriesWrites
+        }
+
+    def _record_series_writes(self):
+        for write, count in self.series_writes.pop_counts().items():
+            if count:
+                self._series_write_children[write].inc(count)
+
+    @contextmanager
+    def _time_scrape_phase(self, phase):
+        # failed phases are timed too, a router timing out is what shows
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe_scrape_phase(
+                phase,
+                time.perf_counter() - started_at)
 
     @property
     def router_ip(self):
         return self.router_client.router_ip
 
+    def _set_gauge(self, gauge, value, **labels):
+        if self._snapshot_builder is not None:
+            self._snapshot_builder.add(gauge, value, **labels)
+            return
+        key = self.series_writes.get_key(gauge, labels)
+        if not self.series_writes.should_write(key, value):
+            return
+        gauge.labels(**labels).set(value)
+        if self.device_eviction.is_enabled:
+            self.device_eviction.track(gauge, labels)
+
+    def _set_series(self, series, value):
+        if self._snapshot_builder is not None:
+            self._snapshot_builder.add_values(
+                series.gauge,
+                series.labelnames,
+                series.label_values,
+                value)
+            return
+        if not self.series_writes.should_write(series.key, value):
+            return
+        self._bind_series_child(series).set(value)
+
+    def _bind_series_child(self, series):
+        child = series.child
+        if child is None:
+            child = series.gauge.labels(**series.labels)
+            series.child = child
+            if self.device_eviction.is_enabled:
+                self.device_eviction.track(series.gauge, series.labels)
+        return child
+
+    def _inc_series(self, series, amount, total):
+        # snapshots carry the whole total, the counter itself only increases
+        if self._snapshot_builder is not None:
+            self._snapshot_builder.add_values(
+                series.gauge,
+                series.labelnames,
+                series.label_values,
+                total)
+            return
+        # bound at `0` right away, so the first increase is not lost
+        child = self._bind_series_child(series)
+        if amount:
+            child.inc(amount)
+
+    def _start_snapshot(self):
+        if not self.records_snapshots:
+            return
+        self._snapshot_builder = RouterSnapshotBuilder(self.router_name)
+
+    def _publish_snapshot(self):
+        builder = self._snapshot_builder
+        if builder is None:
+            return
+        self._snapshot_builder = None
+        snapshot = builder.build()
+        self.snapshot_collector.update(snapshot)
+        self._inc_scrape_event(ScrapeEvents.PUBLISH_SNAPSHOT)
+
+    def _record_circuit_breaker_metrics(self):
+        breaker = self.circuit_breaker
+        for state in CircuitBreakerStates.metrics_states_list():
+            Metrics.ROUTER_CIRCUIT_BREAKER_STATE.labels(
+                router_name=self.router_name,
+                circuit_breaker_state=state.label_string,
+            ).set(1 if state is breaker.state else 0)
+        Metrics.ROUTER_CIRCUIT_BREAKER_CONSECUTIVE_FAILURES.labels(
+            router_name=self.router_name,
+        ).set(breaker.consecutive_failures)
+        Metrics.ROUTER_CIRCUIT_BREAKER_NEXT_ATTEMPT_TIMESTAMP_SECONDS.labels(
+            router_name=self.router_name,
+        ).set(breaker.next_attempt_at or 0)
+
+    def _allow_router_scrape(self):
+        breaker = self.circuit_breaker
+        previous_state = breaker.state
+        if breaker.allow_request():
+            if breaker.state is not previous_state:
+                log.info(f'self.router_ip: {self.router_ip} backoff over, '
+                         f'trying again after '
+                         f'{breaker.consecutive_failures} failed logins')
+                self._record_circuit_breaker_metrics()
+            return True
+        self.scrape_log.debug(
+            'circuit breaker open, skipping scrape until %s',
+            breaker.next_attempt_at)
+        self._inc_scrape_event(ScrapeEvents.CIRCUIT_BREAKER_SKIP)
+        return False
+
+    def _handle_authorize_success(self):
+        breaker = self.circuit_breaker
+        if breaker.state is not CircuitBreakerStates.CLOSED:
+            log.info(f'self.router_ip: {self.router_ip} logged in again, '
+                     f'closing circuit breaker')
+        changed = bool(breaker.consecutive_failures
+                       or breaker.state is not CircuitBreakerStates.CLOSED)
+        breaker.record_success()
+        if changed:
+            self._record_circuit_breaker_metrics()
+        self._inc_scrape_event(ScrapeEvents.AUTHORIZE)
+
+    def _handle_authorize_error(self):
+        breaker = self.circuit_breaker
+        breaker.record_failure()
+        if breaker.state is CircuitBreakerStates.OPEN:
+            log.warning(f'self.router_ip: {self.router_ip} failed to log in '
+                        f'{breaker.consecutive_failures} times in a row, '
+                        f'not trying again until {breaker.next_attempt_at}')
+        self._record_circuit_breaker_metrics()
+        self._inc_scrape_event(ScrapeEvents.AUTHORIZE_ERROR)
+
     def _authorize(self):
-        self.router_client.authorize()
-        event = ScrapeEvents.AUTHORIZE
-        self._inc_scrape_event(event)
+        try:
+            with self._time_scrape_phase(ScrapePhases.AUTHORIZE):
+                self.router_client.authorize()
+        except Exception:
+            self._handle_authorize_error()
+            raise
+        self._handle_authorize_success()
+
+    @classmethod
+    def _is_not_authorised_exception(cls, exc):
+        if str(exc) == cls.NOT_AUTHORISED:
+            return True
+        # every other failed request is a `ClientError` too, only the ones
+        # the router turned away for the session are worth logging in for
+        if not isinstance(exc, ClientError):
+            return False
+        return TPLinkRouter.is_session_error(exc)
+
+    def _handle_logout_exception(self, logout_exc):
+        if str(logout_exc) == self.NOT_AUTHORISED:
+            nae_m = (f'logout got not authorised exception '
+                     f'from router_client logout_exc: {logout_exc}')
+            log.error(nae_m)
+            self._inc_scrape_event(
+                ScrapeEvents.LOGOUT_NOT_AUTHORIZED_ERROR)
+        else:
+            unae_m = (f'logout got unexpected exception from '
+                      f'router_client logout_exc: {logout_exc}')
+            log.error(unae_m)
+            self._inc_scrape_event(
+                ScrapeEvents.LOGOUT_UNEXPECTED_ERROR)
 
     def _logout(self):
         try:
-            self.router_client.logout()
+            with self._time_scrape_phase(ScrapePhases.LOGOUT):
+                self.router_client.logout()
         except Exception as logout_exc:
-            if str(logout_exc) == 'Not authorised':
-                nae_m = (f'logout got not authorised exception '
-                         f'from router_client logout_exc: {logout_exc}')
-                log.error(nae_m)
-                self._inc_scrape_event(
-                    ScrapeEvents.LOGOUT_NOT_AUTHORIZED_ERROR)
-            else:
-                unae_m = (f'logout got unexpected exception from '
-                          f'router_client logout_exc: {logout_exc}')
-                log.error(unae_m)
-                self._inc_scrape_event(
-                    ScrapeEvents.LOGOUT_UNEXPECTED_ERROR)
-
+            self._handle_logout_exception(logout_exc)
         else:
             event = ScrapeEvents.LOGOUT
             self._inc_scrape_event(event)
 
-    def _get_firmware(self):
+    def _call_with_session(self, fetch_func):
+        if not self.session_reuse:
+            return fetch_func()
         try:
-            firmware = self.router_client.get_firmware()
-            event = ScrapeEvents.GET_FIRMWARE
-            self._inc_scrape_event(event)
-            return firmware
-        except Exception as unexp:
-            u_m = f'get firmware got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorFetchException(u_m)
+            result = fetch_func()
+        except Exception as exc:
+            if not self._is_not_authorised_exception(exc):
+                raise
+            # the reused session went away on the router, log in again once
+            r_m = (f'self.router_ip: {self.router_ip} session not '
+                   f'authorised, re-authorizing after exc: {exc}')
+            log.warning(r_m)
+            self._inc_scrape_event(ScrapeEvents.SESSION_REAUTHORIZE)
+            self.router_client.invalidate_session()
+            self._authorize()
+            result = fetch_func()
+        self.router_client.mark_used()
+        return result
 
-    def _get_status(self):
+    def _fetch(self, fetch_func, event, description):
         try:
-            status = self.router_client.get_status()
-            event = ScrapeEvents.GET_STATUS
+            result = self._call_with_session(fetch_func)
             self._inc_scrape_event(event)
-            return status
+            return result
         except Exception as unexp:
-            u_m = f'get router status got unexp: {unexp}'
+            u_m = f'{description} got unexp: {unexp}'
             log.error(u_m)
             raise CollectorFetchException(u_m)
 
+    def _get_firmware(self):
+        return self._fetch(
+            self.router_client.get_firmware,
+            ScrapeEvents.GET_FIRMWARE,
+            'get firmware')
+
+    def _get_status(self):
+        return self._fetch(
+            self.router_client.get_status,
+            ScrapeEvents.GET_STATUS,
+            'get router status')
+
     def _get_ipv4_status(self):
-        try:
-            status = self.router_client.get_ipv4_status()
-            event = ScrapeEvents.GET_IPV4_STATUS
-            self._inc_scrape_event(event)
-            return status
-        except Exception as unexp:
-            u_m = f'ipv4 status got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorFetchException(u_m)
+        return self._fetch(
+            self.router_client.get_ipv4_status,
+            ScrapeEvents.GET_IPV4_STATUS,
+            'ipv4 status')
 
     def _get_ipv4_reservations(self):
-        try:
-            res = self.router_client.get_ipv4_reservations()
-            event = ScrapeEvents.GET_IPV4_RESERVATIONS
-            self._inc_scrape_event(event)
-            return res
-        except Exception as unexp:
-            u_m = f'get ipv4 reservations got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorFetchException(u_m)
+        return self._fetch(
+            self.router_client.get_ipv4_reservations,
+            ScrapeEvents.GET_IPV4_RESERVATIONS,
+            'get ipv4 reservations')
 
     def _get_ipv4_dhcp_leases(self):
-        try:
-            leases = self.router_client.get_ipv4_dhcp_leases()
-            event = ScrapeEvents.GET_IPV4_DHCP_LEASES
-            self._inc_scrape_event(event)
-            return leases
-        except Exception as unexp:
-            u_m = f'get ipv4 dhcp leases got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorFetchException(u_m)
+        leases = self._fetch(
+            self.router_client.get_ipv4_dhcp_leases,
+            ScrapeEvents.GET_IPV4_DHCP_LEASES,
+            'get ipv4 dhcp leases')
+        self._anchor_ipv4_dhcp_leases(leases)
+        return leases
+
+    def _anchor_ipv4_dhcp_leases(self, leases):
+        # only on a real fetch, cached leases keep counting down
+        self.lease_expiry.anchor(leases)
+        self.lease_expiry_collector.update(self.lease_expiry)
 
     def _get_devices(self, status):
         if not status:
@@ -242,31 +612,35 @@ class Collector(object):
     def _record_connected_client_count_metrics(self, status):
         if not status:
             return
-        log.debug(f'got status: {status}')
+        self.scrape_log.debug('got status: %s', status)
         for connection_type in ClientConnectionTypes.metrics_types_list():
             client_count = self._get_client_connection_type_value(
                 status,
                 connection_type)
-            Metrics.ROUTER_CONNECTED_CLIENTS_TOTAL.labels(
+            self._set_gauge(
+                Metrics.ROUTER_CONNECTED_CLIENTS_TOTAL,
+                client_count or 0,
                 router_name=self.router_name,
-                connection_type=connection_type.label_string,
-            ).set(client_count or 0)
+                connection_type=connection_type.label_string)
 
     def _record_status_metrics(self, status):
         if not status:
             return
         self._record_connected_client_count_metrics(status)
         # now do memory and cpu
-        Metrics.ROUTER_MEMORY_USAGE.labels(
-            router_name=self.router_name,
-        ).set(status.mem_usage or 0)
-        Metrics.ROUTER_CPU_USAGE.labels(
-            router_name=self.router_name,
-        ).set(status.cpu_usage or 0)
+        self._set_gauge(
+            Metrics.ROUTER_MEMORY_USAGE,
+            status.mem_usage or 0,
+            router_name=self.router_name)
+        self._set_gauge(
+            Metrics.ROUTER_CPU_USAGE,
+            status.cpu_usage or 0,
+            router_name=self.router_name)
         # now WAN IPv4 uptime
-        # Metrics.ROUTER_WAN_IPV4_UPTIME.labels(
-        #     router_name=self.router_name,
-        # ).set(status.wan_ipv4_uptime or 0)
+        # self._set_gauge(
+        #     Metrics.ROUTER_WAN_IPV4_UPTIME,
+        #     status.wan_ipv4_uptime or 0,
+        #     router_name=self.router_name)
 
     @classmethod
     def _get_packets_for_action(cls, device, packet_action):
@@ -279,98 +653,166 @@ class Collector(object):
             log.error(pe_m)
             raise InvalidPacketActionCollectorException(pe_m)
 
-    def _record_found_device_status(self, device):
+    def _record_found_device_status(self, device, children):
         try:
-            log.debug(f'recording found device: {device}')
-            device_type = self.normalize_input(device.type)
-            hostname = device.hostname
-            ipaddress = str(device.ipaddress)
-            macaddress = str(device.macaddress)
-            self.add_or_update_device(device)
-            d_m = (f'parsed device: {device} to get '
-                   f'device_type: {device_type}, '
-                   f'hostname: {hostname}, '
-                   f'ipaddress: {ipaddress}, '
-                   f'macaddress: {macaddress}, ')
-            log.debug(d_m)
-            Metrics.ROUTER_DEVICE_CONNECTED_STATUS.labels(
-                router_name=self.router_name,
-                device_type=device_type,
-                hostname=hostname,
-                ip_address=ipaddress,
-                mac_address=macaddress,
-            ).set(1)
+            mac_address = children.mac_address
+            self.add_or_update_device(device, mac_address)
+            self.device_eviction.mark_present(mac_address)
+            self._set_series(children.connected_status, 1)
 
         except Exception as unexp:
             u_m = f'recording found device status got unexp: {unexp}'
             log.error(u_m)
             raise CollectorRecordFoundDeviceStatusException(u_m)
 
-    def _record_device_packets(self, device, packet_action):
+    def _record_device_packets(self, device, packet_action, series):
         try:
             packets = self._get_packets_for_action(device, packet_action)
-            device_type = self.normalize_input(device.type)
-            hostname = device.hostname
-            ipaddress = str(device.ipaddress)
-            macaddress = str(device.macaddress)
-            d_m = (f'parsed device: {device} to get '
-                   f'device_type: {device_type}, '
-                   f'hostname: {hostname}, '
-                   f'ipaddress: {ipaddress}, '
-                   f'macaddress: {macaddress}, '
-                   f'packet_action: {packet_action}, '
-                   f'packets: {packets}')
-            log.debug(d_m)
-            Metrics.ROUTER_DEVICE_PACKETS_TOTAL.labels(
-                router_name=self.router_name,
-                device_type=device_type,
-                hostname=hostname,
-                ip_address=ipaddress,
-                mac_address=macaddress,
-                packet_action=packet_action.label_string,
-            ).set(packets or 0)
+            self._set_series(series, packets or 0)
         except Exception as unexp:
             u_m = f'recording packets got unexp: {unexp}'
             log.error(u_m)
             raise CollectorRecordPacketActionException(u_m)
 
     def _record_device_metrics(self, device):
-        self._record_found_device_status(device)
-        for packet_action in PacketActions.metrics_actions_list():
-            self._record_device_packets(device, packet_action)
+        # labels and bound children are only worked out the first time a
+        # device shows up, or when its type, hostname or ip changes
+        children = self._device_children.get(device)
+        self._record_found_device_status(device, children)
+        for packet_action, series in children.packets:
+            self._record_device_packets(device, packet_action, series)
+        self._record_device_packet_rates(device, children)
+
+    def _start_packet_rates(self, status):
+        self._packets_observed_at = None
+        # a status re-recorded from its refresh tier has nothing new in it
+        if status is self._packet_rates_status:
+            return
+        self._packet_rates_status = status
+        self._packets_observed_at = self.get_monotonic_now()
+
+    def _record_device_packet_rates(self, device, children):
+        mac_address = children.mac_address
+        observed_at = self._packets_observed_at
+        for packet_action, monotonic, per_second in children.packet_counters:
+            increase = 0
+            if observed_at is not None:
+                packets = self._get_packets_for_action(device, packet_action)
+                increase, reset = self.packet_rates.observe(
+                    mac_address,
+                    packet_action,
+                    packets or 0,
+                    observed_at)
+                if reset:
+                    self._packet_counter_resets_child.inc()
+            rate = self.packet_rates.get(mac_address, packet_action)
+            if rate is None:
+                continue
+            self._inc_series(monotonic, increase, rate.total)
+            if rate.per_second is not None:
+                self._set_series(per_second, rate.per_second)
+
+    def _record_disconnected_packet_rates(self, mac_address, labels):
+        rates = self.packet_rates.mark_disconnected(mac_address)
+        for packet_action, rate in rates.items():
+            packet_labels = dict(
+                labels,
+                packet_action=packet_action.label_string)
+            if self._snapshot_builder is not None:
+                self._snapshot_builder.add(
+                    Metrics.ROUTER_DEVICE_PACKETS_MONOTONIC_TOTAL,
+                    rate.total,
+                    **packet_labels)
+            self._set_gauge(
+                Metrics.ROUTER_DEVICE_PACKETS_PER_SECOND,
+                rate.per_second,
+                **packet_labels)
+
+    def _record_disconnected_device(self, device):
+        device_type = self.normalize_input(device.type)
+        hostname = device.hostname
+        ipaddress = str(device.ipaddress)
+        macaddress = str(device.macaddress)
+        self.scrape_log.sampled_debug(
+            'disconnected_device',
+            'mark disconnected device: %s to get device_type: %s, '
+            'hostname: %s, ipaddress: %s, macaddress: %s',
+            device, device_type, hostname, ipaddress, macaddress)
+        labels = {
+            'router_name': self.router_name,
+            'device_type': device_type,
+            'hostname': hostname,
+            'ip_address': ipaddress,
+            'mac_address': macaddress,
+        }
+        self._set_gauge(Metrics.ROUTER_DEVICE_CONNECTED_STATUS, 0, **labels)
+        self._record_disconnected_packet_rates(macaddress, labels)
+
+    def _record_departed_devices(self, stale_devices):
+        # snapshots are rebuilt every scrape, so they need to keep
+        # re-reporting departed devices until they are evicted
+        if not self.records_snapshots:
+            return
+        for mac, departed in self.device_eviction.departed_devices.items():
+            if mac in stale_devices:
+                continue
+            self._record_disconnected_device(departed.cached_device.device)
+
+    def _remove_series(self, gauge, label_values):
+        self.series_writes.forget(
+            self.series_writes.get_removal_key(gauge, label_values))
+        multiprocess_compactor.mark_removed(gauge, label_values)
+        try:
+            gauge.remove(*label_values)
+        except KeyError:
+            return False
+        return True
+
+    def _evict_expired_devices(self):
+        expired = self.device_eviction.pop_expired()
+        if not expired:
+            return
+        removed_series = 0
+        for mac, departed, series in expired:
+            self.scrape_log.sampled_debug(
+                'evicted_device',
+                'evicting departed device: %s with %s series',
+                departed, len(series))
+            self.packet_rates.pop_mac(mac)
+            if self.records_snapshots:
+                continue
+            self._device_children.pop_mac(mac)
+            for gauge, label_values in series:
+                if self._remove_series(gauge, label_values):
+                    removed_series += 1
+        Metrics.ROUTER_DEVICE_EVICTIONS_TOTAL.labels(
+            router_name=self.router_name,
+        ).inc(len(expired))
+        if removed_series:
+            Metrics.ROUTER_DEVICE_SERIES_EVICTIONS_TOTAL.labels(
+                router_name=self.router_name,
+            ).inc(removed_series)
+        self._inc_scrape_event(ScrapeEvents.EVICT_DEPARTED_DEVICES)
 
     def _record_missing_and_drop_stale_devices(self):
         try:
             self._inc_scrape_event(
                 ScrapeEvents.ATTEMPT_DEVICE_CACHED_ROUTER_METRICS)
-            log.debug(f'{self.router_name} => record '
-                      f'missing and drop stale devices')
+            self.scrape_log.debug('record missing and drop stale devices')
             stale_devices = self.get_stale_device_map_from_cache()
-            log.debug(f'recording missing stale_devices: {stale_devices}')
-            for cached_device in stale_devices.values():
-                device = cached_device.device
-                device_type = self.normalize_input(device.type)
-                hostname = device.hostname
-                ipaddress = str(device.ipaddress)
-                macaddress = str(device.macaddress)
-                d_m = (f'mark disconnected device: {device} to get '
-                       f'device_type: {device_type}, '
-                       f'hostname: {hostname}, '
-                       f'ipaddress: {ipaddress}, '
-                       f'macaddress: {macaddress}, ')
-                log.debug(d_m)
-                Metrics.ROUTER_DEVICE_CONNECTED_STATUS.labels(
-                    router_name=self.router_name,
-                    device_type=device_type,
-                    hostname=hostname,
-                    ip_address=ipaddress,
-                    mac_address=macaddress,
-                ).set(0)
+            self.scrape_log.debug(
+                'recording %s missing stale_devices',
+                len(stale_devices))
+            for mac, cached_device in stale_devices.items():
+                self._record_disconnected_device(cached_device.device)
+                self.device_eviction.mark_departed(mac, cached_device)
+            self._evict_expired_devices()
+            self._record_departed_devices(stale_devices)
             self._inc_scrape_event(ScrapeEvents.RECORD_MISSING_DEVICES)
-            log.debug('now drop all stale devices from cache')
+            self.scrape_log.debug('now drop all stale devices from cache')
             self.drop_all_stale_devices_from_cache()
             self._inc_scrape_event(ScrapeEvents.DROP_ALL_STALE_DEVICES)
-            log.debug('all done with missing devices')
+            self.scrape_log.debug('all done with missing devices')
 
         except Exception as unexp:
             u_m = f'recording missing device status got unexp: {unexp}'
@@ -380,11 +822,15 @@ class Collector(object):
     def _record_devices_metrics(self, devices):
         if not devices:
             return
-        d_m = f'devices metrics to parse devices: {devices}'
-        log.debug(d_m)
-        for device in devices:
-            log.debug(f'recording metrics for device: {device}')
-            self._record_device_metrics(device)
+        scrape_log = self.scrape_log
+        scrape_log.debug('devices metrics to parse %s devices', len(devices))
+        with self._time_scrape_phase(ScrapePhases.RECORD_DEVICES):
+            for device in devices:
+                scrape_log.sampled_debug(
+                    'device',
+                    'recording metrics for device: %s',
+                    device)
+                self._record_device_metrics(device)
 
     def _get_firmware_property_value(self, firmware, property):
         if property == RouterFirmwareProperties.HARDWARE_VERSION:
@@ -400,33 +846,39 @@ class Collector(object):
     def _record_firmware_metrics(self, firmware):
         if not firmware:
             return
-        log.debug(f'got firmware: {firmware}')
+        self.scrape_log.debug('got firmware: %s', firmware)
         labels = {
             'router_name': self.router_name,
         }
         for property in RouterFirmwareProperties.metrics_properties_list():
             prop_value = self._get_firmware_property_value(firmware, property)
             labels[property.label_string] = prop_value
-        Metrics.ROUTER_FIRMWARE_INFO.labels(**labels).set(1)
+        self._set_gauge(Metrics.ROUTER_FIRMWARE_INFO, 1, **labels)
 
     def _record_ipv4_status_metrics(self, ipv4_status):
         if not ipv4_status:
             return
         # FIXME: actually implement this!
-        log.debug(f'got ipv4_status: {ipv4_status}')
+        self.scrape_log.debug('got ipv4_status: %s', ipv4_status)
 
     def _record_ipv4_reservations(self, reservations):
         if not reservations:
             return
-        log.debug(f'got ipv4 reservations: {reservations}')
+        self.scrape_log.debug(
+            'got %s ipv4 reservations',
+            len(reservations))
         for res in reservations:
-            log.debug(f'recording res.enabled: {res.enabled}')
-            Metrics.ROUTER_IPV4_RESERVATION_ENABLED.labels(
+            self.scrape_log.sampled_debug(
+                'reservation',
+                'recording reservation: %s res.enabled: %s',
+                res.macaddress, res.enabled)
+            self._set_gauge(
+                Metrics.ROUTER_IPV4_RESERVATION_ENABLED,
+                res.enabled,
                 router_name=self.router_name,
                 hostname=res.hostname,
                 ip_address=str(res.ipaddress),
-                mac_address=str(res.macaddress),
-            ).set(res.enabled)
+                mac_address=str(res.macaddress))
 
     @classmethod
     def _is_dhcp_lease_permanent(cls, lease_time):
@@ -434,45 +886,57 @@ class Collector(object):
             return False
         return bool(lease_time == cls.PERMANENT_LEASE)
 
-    @classmethod
-    def get_datetime(cls, input_str):
-        return datetime.strptime(input_str, cls.DATETIME_FORMAT)
-
-    @classmethod
-    def get_zeroth_dt(cls):
-        return cls.get_datetime("00:00:00")
-
     @classmethod
     def _convert_dhcp_lease_time(cls, lease_time):
-        if not lease_time:
-            return 0
-        # https://stackoverflow.com/questions/4628122/how-to-construct-a-timedelta-object-from-a-simple-string  # noqa: E501
-        dt_diff = cls.get_datetime(lease_time) - cls.get_zeroth_dt()
-        total_seconds = dt_diff.total_seconds()
-        log.debug(f'lease_time: {lease_time} got dt_diff: {dt_diff} '
-                  f'with total_seconds: {total_seconds}')
-        return total_seconds
+        return LeaseExpiryAnchors.parse_lease_seconds(lease_time)
+
+    def _get_dhcp_lease_expires_at(self, lease, mac_address):
+        expiry = self.lease_expiry.get_expiry(mac_address)
+        if expiry is not None:
+            return expiry.expires_at
+        # not fetched through `_get_ipv4_dhcp_leases`, anchor it right now
+        return (self.lease_expiry.get_now()
+                + self._convert_dhcp_lease_time(lease.lease_time))
 
     def _record_dhcp_lease(self, lease):
         try:
             lease_time = lease.lease_time
-            log.debug(f'recording lease_time: {lease_time}')
+            self.scrape_log.sampled_debug(
+                'lease',
+                'recording lease: %s lease_time: %s',
+                lease.macaddress, lease_time)
             if self._is_dhcp_lease_permanent(lease_time):
-                Metrics.ROUTER_IPV4_DHCP_PERMANENT_LEASE_INFO.labels(
+                self._set_gauge(
+                    Metrics.ROUTER_IPV4_DHCP_PERMANENT_LEASE_INFO,
+                    1,
                     router_name=self.router_name,
                     hostname=lease.hostname,
                     ip_address=str(lease.ipaddress),
-                    mac_address=str(lease.macaddress),
-                ).set(1)
+                    mac_address=str(lease.macaddress))
             else:
-                converted_lease_time = self._convert_dhcp_lease_time(
-                    lease_time)
-                Metrics.ROUTER_IPV4_DHCP_LEASE_TIME_SECONDS.labels(
-                    router_name=self.router_name,
-                    hostname=lease.hostname,
-                    ip_address=str(lease.ipaddress),
-                    mac_address=str(lease.macaddress),
-                ).set(converted_lease_time)
+                mac_address = str(lease.macaddress)
+                expires_at = self._get_dhcp_lease_expires_at(
+                    lease,
+                    mac_address)
+                labels = {
+                    'router_name': self.router_name,
+                    'hostname': lease.hostname,
+                    'ip_address': str(lease.ipaddress),
+                    'mac_address': mac_address,
+                }
+                # deprecated, `LeaseExpiryCollector` works out the time
+                # left whenever it is read
+                remaining_seconds = max(
+                    expires_at - self.lease_expiry.get_now(),
+                    0.0)
+                self._set_gauge(
+                    Metrics.ROUTER_IPV4_DHCP_LEASE_TIME_SECONDS,
+                    remaining_seconds,
+                    **labels)
+                self._set_gauge(
+                    Metrics.ROUTER_IPV4_DHCP_LEASE_EXPIRY_TIMESTAMP_SECONDS,
+                    expires_at,
+                    **labels)
         except Exception as unexp:
             u_m = f'recording dhcp lease got unexp: {unexp}'
             log.error(u_m)
@@ -481,80 +945,131 @@ class Collector(object):
     def _record_ipv4_dhcp_leases(self, leases):
         if not leases:
             return
-        log.debug(f'got ipv4 dhcp leases: {leases}')
+        self.scrape_log.debug('got %s ipv4 dhcp leases', len(leases))
         for lease in leases:
             self._record_dhcp_lease(lease)
 
-    def _get_and_record_firmware(self):
+    def _record_status_and_devices(self, status):
+        self._record_status_metrics(status)
+        devices = self._get_devices(status)
+        self._start_packet_rates(status)
+        self._record_devices_metrics(devices)
+        self._summarize_status(status, devices)
+        self._append_device_history(status, devices)
+
+    def _append_device_history(self, status, devices):
+        if not status or not self.device_history.is_enabled:
+            return
+        # one row per fetched status, not per re-recorded one
+        if status is self._history_status:
+            return
+        self._history_status = status
         try:
-            # Get firmware info - returns Firmware
-            firmware = self._get_firmware()
-            log.debug(f'router firmware: {firmware}')
-            self._record_firmware_metrics(firmware)
-        except CollectorFetchException as cfe:
-            log.warning(f'cannot record firmware due to cfe: {cfe}')
+            self.device_history.append(devices or [])
         except Exception as unexp:
-            u_m = f'record firmware got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorRecordException(u_m)
+            # the history is a nice to have, never fail a scrape over it
+            log.error(f'{self.device_history} append got unexp: {unexp}')
 
-    def _get_and_record_status_and_devices(self):
+    def _summarize_status(self, status, devices):
+        if not status or not self.adaptive_interval.is_enabled:
+            return
+        # a status re-recorded from its refresh tier has nothing new in it
+        if status is self._summarized_status:
+            return
+        self._summarized_status = status
+        devices = devices or []
+        client_counts = [
+            self._get_client_connection_type_value(
+                status,
+                connection_type) or 0
+            for connection_type in ClientConnectionTypes.metrics_types_list()
+        ]
+        packets_total = sum(
+            (device.packets_sent or 0) + (device.packets_received or 0)
+            for device in devices)
+        self._scrape_summary = ScrapeSummary(
+            (device.macaddress for device in devices),
+            client_counts,
+            packets_total)
+
+    def _record_fetched(self, record_func, result, description):
+        self.scrape_log.debug('router %s: %s', description, result)
+        record_func(result)
+
+    def _handle_get_and_record_exception(self, exc, description):
+        if isinstance(exc, CollectorFetchException):
+            log.warning(f'cannot record {description} due to cfe: {exc}')
+            return
+        u_m = f'record {description} got unexp: {exc}'
+        log.error(u_m)
+        raise CollectorRecordException(u_m)
+
+    def _record_cached(self, record_func, tier, description):
+        self.scrape_log.debug(
+            'router %s not due, re-recording %s',
+            description, tier)
+        self._inc_scrape_event(ScrapeEvents.RECORD_CACHED_RESULT)
+        record_func(tier.result)
+
+    def _get_and_record(self, endpoint, fetch_func, record_func,
+                        description):
+        tier = self.get_refresh_tier(endpoint)
+        record_phase = ScrapePhases.get_record_phase(endpoint)
         try:
-            # Get status info - returns Status
-            status = self._get_status()
-            log.debug(f'router status: {status}')
-            self._record_status_metrics(status)
-            devices = self._get_devices(status)
-            self._record_devices_metrics(devices)
-        except CollectorFetchException as cfe:
-            log.warning(f'cannot record status and devices due to cfe: {cfe}')
-        except Exception as unexp:
-            u_m = f'record status and devices got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorRecordException(u_m)
+            if not tier.is_due():
+                with self._time_scrape_phase(record_phase):
+                    return self._record_cached(record_func, tier, description)
+            with self._time_scrape_phase(
+                    ScrapePhases.get_fetch_phase(endpoint)):
+                result = fetch_func()
+            tier.update(result)
+            with self._time_scrape_phase(record_phase):
+                self._record_fetched(record_func, result, description)
+        except Exception as exc:
+            self._handle_get_and_record_exception(exc, description)
+
+    def _get_and_record_firmware(self):
+        # Get firmware info - returns Firmware
+        self._get_and_record(
+            RouterEndpoints.FIRMWARE,
+            self._get_firmware,
+            self._record_firmware_metrics,
+            'firmware')
+
+    def _get_and_record_status_and_devices(self):
+        # Get status info - returns Status
+        self._get_and_record(
+            RouterEndpoints.STATUS,
+            self._get_status,
+            self._record_status_and_devices,
+            'status and devices')
 
     def _get_and_record_ipv4_status(self):
+        # FIXME: get_ipv4_status raises an exception in underlying client
         try:
-            # Get IPv4 status
-            # FIXME: get_ipv4_status raises an exception in underlying client
             ipv4_status = self._get_ipv4_status()
-            log.debug(f'router ipv4_status: {ipv4_status}')
-            self._record_ipv4_status_metrics(ipv4_status)
-        except CollectorFetchException as cfe:
-            log.warning(f'cannot record ipv4 status due to cfe: {cfe}')
-        except Exception as unexp:
-            u_m = f'record ipv4 status got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorRecordException(u_m)
+            self._record_fetched(
+                self._record_ipv4_status_metrics,
+                ipv4_status,
+                'ipv4 status')
+        except Exception as exc:
+            self._handle_get_and_record_exception(exc, 'ipv4 status')
 
     def _get_and_record_ipv4_reservations(self):
-        try:
-            # Get IPv4 reservations
-            ipv4_reservations = self._get_ipv4_reservations()
-            log.debug(f'router ipv4_reservations: {ipv4_reservations}')
-            self._record_ipv4_reservations(ipv4_reservations)
-        except CollectorFetchException as cfe:
-            log.warning(f'cannot record ipv4 reservations due to cfe: {cfe}')
-        except Exception as unexp:
-            u_m = f'record ipv4 reservations got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorRecordException(u_m)
+        self._get_and_record(
+            RouterEndpoints.IPV4_RESERVATIONS,
+            self._get_ipv4_reservations,
+            self._record_ipv4_reservations,
+            'ipv4 reservations')
 
     def _get_and_record_ipv4_dhcp_leases(self):
-        try:
-            # Get IPv4 dhcp leases
-            ipv4_leases = self._get_ipv4_dhcp_leases()
-            log.debug(f'router ipv4_leases: {ipv4_leases}')
-            self._record_ipv4_dhcp_leases(ipv4_leases)
-        except CollectorFetchException as cfe:
-            log.warning(f'cannot record ipv4 dhcp leases due to cfe: {cfe}')
-        except Exception as unexp:
-            u_m = f'record ipv4 dhcp leases got unexp: {unexp}'
-            log.error(u_m)
-            raise CollectorRecordException(u_m)
+        self._get_and_record(
+            RouterEndpoints.IPV4_DHCP_LEASES,
+            self._get_ipv4_dhcp_leases,
+            self._record_ipv4_dhcp_leases,
+            'ipv4 dhcp leases')
 
-    # actual part where we decide what metrics to scrape
-    def _get_and_record_authed_router_metrics(self):
+    def _start_authed_router_metrics(self):
         log.debug('_get_router_metrics')
         event = ScrapeEvents.ATTEMPT_GET_AUTHED_ROUTER_METRICS
         self._inc_scrape_event(event)
@@ -563,6 +1078,10 @@ class Collector(object):
                f'self.router_ip: {self.router_ip}')
         log.debug(a_m)
 
+    # actual part where we decide what metrics to scrape
+    def _get_and_record_authed_router_metrics(self):
+        self._start_authed_router_metrics()
+
         # now actually get and record metrics
         self._get_and_record_firmware()
         # I am updating this value after getting the firmware,
@@ -574,45 +1093,280 @@ class Collector(object):
         self._get_and_record_ipv4_reservations()
         self._get_and_record_ipv4_dhcp_leases()
 
-    # handles flow, including log in/out
-    def _execute_get_router_metrics(self):
+    def _start_router_scrape_flow(self):
         log.debug('_get_router_metrics')
         self._inc_scrape_event(ScrapeEvents.START_ROUTER_SCRAPE_FLOW)
+        self._start_snapshot()
+        # authorizing
+        a_m = (f'attempting to authorize at '
+               f'self.router_ip: {self.router_ip}')
+        log.debug(a_m)
+
+    def _handle_authorized(self):
+        sa_m = (f'self.router_ip: {self.router_ip} '
+                f'succeeded at auth')
+        log.debug(sa_m)
+
+    def _handle_scrape_error(self, unexp):
+        u_m = (f'self.router_ip: {self.router_ip} '
+               f'got exception unexp: {unexp}')
+        log.error(u_m)
+        self._inc_scrape_event(ScrapeEvents.ERROR)
+
+    def _handle_scrape_success(self):
+        u_m = (f'self.router_ip: {self.router_ip} '
+               f'scraped successfully!')
+        log.debug(u_m)
+        self._inc_scrape_event(ScrapeEvents.SUCCESS)
+
+    def _start_logout(self):
+        # always logout as TP-Link Web
+        # Interface only supports upto 1 user logged
+        l_m = f'now logging out from self.router_ip: {self.router_ip}'
+        log.debug(l_m)
+
+    def _skip_logout(self):
+        # never logged in, and a router that is down would only make the
+        # logout wait for the whole timeout again
+        log.debug(f'self.router_ip: {self.router_ip} not logged in, '
+                  f'skipping logout')
+        self._inc_scrape_event(ScrapeEvents.SKIP_LOGOUT)
+
+    def _finish_router_scrape_flow(self):
+        log.debug(f'({self.last_update_date}) after device metrics, '
+                  f'need to unset and drop all devices not found')
+        try:
+            with self._time_scrape_phase(ScrapePhases.STALE_DEVICE_SWEEP):
+                self._record_missing_and_drop_stale_devices()
+            with self._time_scrape_phase(ScrapePhases.SAVE_DEVICE_CACHE):
+                self.save_device_cache()
+        finally:
+            self._publish_snapshot()
+            self._record_series_writes()
+        log.debug(f'({self.last_update_date}) completely done with '
+                  f'devices metrics, including cache')
+
+    # handles flow, including log in/out
+    def _execute_get_router_metrics(self):
+        self._start_router_scrape_flow()
+        authorized = False
         try:
-            # authorizing
-            a_m = (f'attempting to authorize at '
-                   f'self.router_ip: {self.router_ip}')
-            log.debug(a_m)
             self._authorize()
-            sa_m = (f'self.router_ip: {self.router_ip} '
-                    f'succeeded at auth')
-            log.debug(sa_m)
+            authorized = True
+            self._handle_authorized()
             self._get_and_record_authed_router_metrics()
         except Exception as unexp:
-            u_m = (f'self.router_ip: {self.router_ip} '
-                   f'got exception unexp: {unexp}')
-            log.error(u_m)
-            self._inc_scrape_event(ScrapeEvents.ERROR)
+            self._handle_scrape_error(unexp)
         else:
-            u_m = (f'self.router_ip: {self.router_ip} '
-                   f'scraped successfully!')
-            log.debug(u_m)
-            self._inc_scrape_event(ScrapeEvents.SUCCESS)
+            self._handle_scrape_success()
 
         finally:
-            # always logout as TP-Link Web
-            # Interface only supports upto 1 user logged
-            l_m = f'now logging out from self.router_ip: {self.router_ip}'
-            log.debug(l_m)
+            if authorized:
+                self._start_logout()
+                self._logout()
+            else:
+                self._skip_logout()
+            self._finish_router_scrape_flow()
+
+    def _is_session_expired(self):
+        age = self.router_client.session_age_seconds
+        return bool(age is None or age >= self.session_ttl_seconds)
+
+    def _ensure_authorized(self):
+        if self.router_client.is_authorized:
+            if not self._is_session_expired():
+                log.debug(f'self.router_ip: {self.router_ip} '
+                          f'reusing session')
+                self._inc_scrape_event(ScrapeEvents.SESSION_REUSED)
+                return
+            log.debug(f'self.router_ip: {self.router_ip} session expired')
+            self._inc_scrape_event(ScrapeEvents.SESSION_EXPIRED)
             self._logout()
-            log.debug(f'({self.last_update_date}) after device metrics, '
-                      f'need to unset and drop all devices not found')
-            self._record_missing_and_drop_stale_devices()
-            log.debug(f'({self.last_update_date}) completely done with '
-                      f'devices metrics, including cache')
+        self._authorize()
+
+    def _cancel_idle_logout(self):
+        if self._idle_logout_timer:
+            self._idle_logout_timer.cancel()
+            self._idle_logout_timer = None
+
+    def _schedule_idle_logout(self):
+        self._cancel_idle_logout()
+        if not self.router_client.is_authorized:
+            return
+        if self.session_idle_logout_seconds <= 0:
+            return
+        timer = threading.Timer(
+            self.session_idle_logout_seconds,
+            self._idle_logout)
+        timer.daemon = True
+        self._idle_logout_timer = timer
+        timer.start()
+
+    def _idle_logout(self):
+        # a scrape holding the router lock reschedules this when it is done
+        if not self.router_lock.acquire(0):
+            return
+        try:
+            self._idle_logout_session()
+        finally:
+            self.router_lock.release()
+
+    def _idle_logout_session(self):
+        with self._session_lock:
+            idle_seconds = self.router_client.session_idle_seconds
+            if not self.router_client.is_authorized:
+                return
+            if idle_seconds is not None and \
+                    idle_seconds < self.session_idle_logout_seconds:
+                return
+            # frees up the single TP-Link web interface session
+            log.debug(f'self.router_ip: {self.router_ip} idle for '
+                      f'{idle_seconds}s, logging out')
+            self._inc_scrape_event(ScrapeEvents.SESSION_IDLE_LOGOUT)
+            self._logout()
+
+    # same flow, but stays logged in until the session expires or idles
+    def _execute_get_router_metrics_with_session(self):
+        with self._session_lock:
+            self._cancel_idle_logout()
+            self._start_router_scrape_flow()
+            try:
+                self._ensure_authorized()
+                self._handle_authorized()
+                self._get_and_record_authed_router_metrics()
+            except Exception as unexp:
+                self._handle_scrape_error(unexp)
+                # start from a clean login next time around
+                if self.router_client.is_authorized:
+                    self._start_logout()
+                    self._logout()
+                else:
+                    self._skip_logout()
+            else:
+                self._handle_scrape_success()
+
+            finally:
+                self._schedule_idle_logout()
+                self._finish_router_scrape_flow()
+
+    # nothing is due, so re-record everything without logging in at all
+    def _execute_record_cached_router_metrics(self):
+        self._start_router_scrape_flow()
+        try:
+            log.debug(f'self.router_ip: {self.router_ip} no endpoints '
+                      f'due, recording cached router metrics')
+            self._inc_scrape_event(ScrapeEvents.RECORD_CACHED_ROUTER_METRICS)
+            self._get_and_record_authed_router_metrics()
+        except Exception as unexp:
+            self._handle_scrape_error(unexp)
+        else:
+            self._handle_scrape_success()
+        finally:
+            self._finish_router_scrape_flow()
 
     def get_router_metrics(self):
+        if not self.has_due_refresh_tiers():
+            return self._execute_record_cached_router_metrics()
+        if not self._allow_router_scrape():
+            return None
+        if self.session_reuse:
+            return self._execute_get_router_metrics_with_session()
         return self._execute_get_router_metrics()
 
+    @classmethod
+    def get_monotonic_now(cls):
+        return time.monotonic()
+
+    def get_scrape_age_seconds(self, now=None):
+        if self._last_scraped_at is None:
+            return None
+        if now is None:
+            now = self.get_monotonic_now()
+        return now - self._last_scraped_at
+
+    def is_scrape_stale(self, now=None):
+        age = self.get_scrape_age_seconds(now)
+        return bool(age is None or age >= self.on_demand_ttl_seconds)
+
+    def _mark_scraped(self):
+        self._last_scraped_at = self.get_monotonic_now()
+
+    def _record_interval_metrics(self, interval_seconds):
+        Metrics.ROUTER_SCRAPE_INTERVAL_SECONDS.labels(
+            router_name=self.router_name,
+        ).set(interval_seconds)
+
+    def start_interval(self, base_seconds):
+        """Interval to schedule this router at, `base_seconds` is the fixed
+        one it would otherwise use
+        """
+        interval_seconds = base_seconds
+        if self.adaptive_interval.is_enabled:
+            interval_seconds = self.adaptive_interval.start(base_seconds)
+        self._record_interval_metrics(interval_seconds)
+        return interval_seconds
+
+    def _finish_scrape_timing(self, started_at):
+        scrape_seconds = self.get_monotonic_now() - started_at
+        self._observe_scrape_phase(ScrapePhases.SCRAPE, scrape_seconds)
+        self._adapt_interval(scrape_seconds)
+
+    def _adapt_interval(self, scrape_seconds):
+        summary = self._scrape_summary
+        self._scrape_summary = None
+        adaptive_interval = self.adaptive_interval
+        previous_seconds = adaptive_interval.interval_seconds
+        interval_seconds = adaptive_interval.observe(summary, scrape_seconds)
+        if interval_seconds == previous_seconds:
+            return
+        self.scrape_log.debug(
+            'scrape took %.3fs, interval %ss => %ss',
+            scrape_seconds,
+            previous_seconds,
+            interval_seconds)
+        self._record_interval_metrics(interval_seconds)
+
+    def _handle_router_lock_timeout(self):
+        # the metrics from the last scrape are still being served
+        log.warning(f'self.router_ip: {self.router_ip} still being scraped '
+                    f'elsewhere after {self.router_lock.timeout_seconds}s, '
+                    f'skipping this scrape')
+        self._inc_scrape_event(ScrapeEvents.ROUTER_LOCK_TIMEOUT)
+
+    def _acquire_router_lock(self):
+        if self.router_lock.acquire(0):
+            return True
+        self._inc_scrape_event(ScrapeEvents.ROUTER_LOCK_WAIT)
+        if self.router_lock.acquire():
+            return True
+        self._handle_router_lock_timeout()
+        return False
+
+    def _update_router_metrics(self):
+        try:
+            if not self._acquire_router_lock():
+                return None
+            started_at = self.get_monotonic_now()
+            try:
+                return self.get_router_metrics()
+            finally:
+                self.router_lock.release()
+                self._finish_scrape_timing(started_at)
+        finally:
+            # failed scrapes count too, a down router shouldn't be
+            # hammered by every prometheus scrape
+            self._mark_scraped()
+
     def update_router_metrics(self):
-        return self.get_router_metrics()
+        with self._scrape_lock:
+            return self._update_router_metrics()
+
+    def update_router_metrics_if_stale(self):
+        # single-flight: callers queued up behind an in flight scrape find
+        # it fresh once they get the lock, and don't poll the router again
+        with self._scrape_lock:
+            if not self.is_scrape_stale():
+                self._inc_scrape_event(ScrapeEvents.ON_DEMAND_FRESH)
+                return None
+            self._inc_scrape_event(ScrapeEvents.ON_DEMAND_SCRAPE)
+            return self._update_router_metrics()
@@ -37,3 +37,22 @@ class ConfigParser(object):
     @classmethod
     def get_routers(cls, config):
         return config[ConfigKeys.ROUTERS.key_name]
+
+    @classmethod
+    def get_router_options(cls, router_config):
+        # optional, per router settings, only the ones that were supplied
+        return {
+            key.key_name: router_config[key.key_name]
+            for key in ConfigKeys.router_option_keys()
+            if router_config.get(key.key_name) is not None
+        }
+
+    @classmethod
+    def get_max_concurrent_routers(cls, config, default=None):
+        key = ConfigKeys.MAX_CONCURRENT_ROUTERS.key_name
+        return int(config.get(key, default))
+
+    @classmethod
+    def get_scrape_engine(cls, config, default=None):
+        key = ConfigKeys.SCRAPE_ENGINE.key_name
+        return config.get(key, default)
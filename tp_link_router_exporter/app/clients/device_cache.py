@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from flask import current_app as app
 
 
@@ -9,25 +10,36 @@ class DeviceCacheException(Exception):
 
 
 class DeviceCacheValue(object):
-    def __init__(self, device, update_date):
+    __slots__ = ('device', 'generation', 'update_date')
+
+    def __init__(self, device, generation, update_date=None):
         super().__init__()
         self.device = device
+        self.generation = generation
         self.update_date = update_date
 
     def __repr__(self):
-        return (f'DeviceCacheValue ({self.update_date}) '
+        return (f'DeviceCacheValue ({self.generation}: {self.update_date}) '
                 f'=> {self.device.ipaddress}')
 
 
 class DeviceCache(object):
+    """Devices seen by a collector, keyed by MAC address
+
+    Every scrape starts a new generation. Entries are kept in the order they
+    were last seen, so everything not seen in the current generation sits at
+    the front and finding or dropping stale devices only touches the devices
+    that actually departed.
+    """
     DATE_HASH_STRING_FORMAT = "%Y_%m_%d__%H_%M_%S"
 
     def __init__(self):
         super().__init__()
-        self._devices = {}
+        self._devices = OrderedDict()
+        self._generation = 0
 
     def __repr__(self):
-        return f'DeviceCache ({len(self.devices)})'
+        return f'DeviceCache ({self.generation}: {len(self.devices)})'
 
     @classmethod
     def default_device_cache(cls):
@@ -41,47 +53,67 @@ class DeviceCache(object):
     def devices(self):
         return self._devices
 
-    def get_key(self, device, update_date):
-        device_hash = str(device.macaddress)
-        return device_hash
-
-    def add_or_update_device(self, device, update_date):
-        key = self.get_key(device, update_date)
-        self.devices[key] = DeviceCacheValue(device, update_date)
-
-    def has_device(self, device, update_date):
-        key = self.get_key(device, update_date)
-        return bool(key in self.devices)
-
-    @classmethod
-    def is_stale(cls, cached_device, update_date):
-        log.debug(f'cached_device: {cached_device} => {update_date}')
-        return bool(cached_device.update_date < update_date)
-
-    @classmethod
-    def is_fresh(cls, cached_device, update_date):
-        return not cls.is_stale(cached_device, update_date)
-
-    def get_stale_devices_map(self, update_date):
-        log.debug(f'get_stale_devices_map {len(self.devices)}')
-        dev_map = {
-            k: v for k, v
-            in self.devices.items() if self.is_stale(v, update_date)
-        }
-        log.debug(f'dev_map: {dev_map}')
+    @property
+    def generation(self):
+        return self._generation
+
+    def start_generation(self):
+        self._generation += 1
+        return self._generation
+
+    def restore(self, generation, devices):
+        # `devices` are (key, DeviceCacheValue) pairs in last seen order
+        self._devices = OrderedDict(devices)
+        self._generation = generation
+
+    def get_key(self, device):
+        return str(device.macaddress)
+
+    def add_or_update_device(self, device, update_date=None, key=None):
+        if key is None:
+            key = self.get_key(device)
+        cached_device = self.devices.get(key)
+        if cached_device is None:
+            self.devices[key] = DeviceCacheValue(
+                device,
+                self.generation,
+                update_date)
+            return
+        cached_device.device = device
+        cached_device.generation = self.generation
+        cached_device.update_date = update_date
+        self.devices.move_to_end(key)
+
+    def has_device(self, device):
+        return bool(self.get_key(device) in self.devices)
+
+    def is_stale(self, cached_device):
+        return bool(cached_device.generation < self.generation)
+
+    def is_fresh(self, cached_device):
+        return not self.is_stale(cached_device)
+
+    def iter_stale_devices(self):
+        for key, cached_device in self.devices.items():
+            if not self.is_stale(cached_device):
+                break
+            yield key, cached_device
+
+    def get_stale_devices_map(self):
+        dev_map = dict(self.iter_stale_devices())
+        log.debug('get_stale_devices_map (%s) %s of %s',
+                  self.generation, len(dev_map), len(self.devices))
         return dev_map
 
-    def get_fresh_devices_map(self, update_date):
-        log.debug(f'get_fresh_devices_map {len(self.devices)}')
-        return {
-            k: v for k, v
-            in self.devices.items() if self.is_fresh(v, update_date)
-        }
-
-    def drop_all_stale_devices(self, update_date):
-        log.debug(f'^^^^^^^^^^^^ drop_all_stale_devices '
-                  f'starting ({len(self.devices)}) {self.devices}')
-        fresh_devices = self.get_fresh_devices_map(update_date)
-        log.debug(f'------------ drop_all_stale_devices '
-                  f'fresh_devices ({len(fresh_devices)}) {fresh_devices}')
-        self._devices = fresh_devices
+    def drop_all_stale_devices(self):
+        dropped = 0
+        devices = self.devices
+        while devices:
+            key = next(iter(devices))
+            if not self.is_stale(devices[key]):
+                break
+            del devices[key]
+            dropped += 1
+        log.debug('drop_all_stale_devices (%s) dropped %s, kept %s',
+                  self.generation, dropped, len(devices))
+        return dropped
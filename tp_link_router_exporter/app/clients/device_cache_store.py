@@ -0,0 +1,162 @@
+import gc
+import os
+import re
+import marshal
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timezone
+from tplinkrouterc6u.enum import Wifi
+from flask import current_app as app
+from .device_cache import DeviceCache, DeviceCacheValue
+
+
+log = app.logger
+
+
+class DeviceCacheStoreException(Exception):
+    pass
+
+
+# Stand-in for a cached `Device` restored from disk. It only carries what is
+# needed to report the device as disconnected, and is replaced by the real
+# `Device` as soon as the router reports it again.
+StoredDevice = namedtuple('StoredDevice', [
+    'macaddress',
+    'type',
+    'ipaddress',
+    'hostname',
+    'packets_sent',
+    'packets_received',
+])
+
+
+class DeviceCacheStore(object):
+    """Saves and loads one `DeviceCache` per router in `directory`
+
+    The cache is written with `marshal` as flat tuples of builtins, which
+    keeps both the file and the load time small, and swapped in with an
+    atomic rename so a crash never leaves a half written file behind.
+    """
+    FORMAT_VERSION = 1
+    FILE_SUFFIX = '.device_cache'
+    # `Wifi(value)` is far too slow to call for every device on load
+    DEVICE_TYPES = {device_type.value: device_type for device_type in Wifi}
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+
+    def __repr__(self):
+        return f'DeviceCacheStore ({self.directory})'
+
+    @property
+    def is_enabled(self):
+        return bool(self.directory)
+
+    def get_path(self, router_name):
+        file_name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(router_name))
+        return os.path.join(self.directory, f'{file_name}{self.FILE_SUFFIX}')
+
+    @classmethod
+    def _dump_date(cls, update_date):
+        if not update_date:
+            return None
+        return update_date.replace(tzinfo=timezone.utc).timestamp()
+
+    @classmethod
+    def _load_date(cls, timestamp):
+        if timestamp is None:
+            return None
+        dt = datetime.fromtimestamp(timestamp, timezone.utc)
+        return dt.replace(tzinfo=None)
+
+    @classmethod
+    def _dump_type(cls, device_type):
+        return getattr(device_type, 'value', device_type)
+
+    @classmethod
+    def dumps(cls, device_cache):
+        records = []
+        for key, cached_device in device_cache.devices.items():
+            device = cached_device.device
+            records.append((
+                key,
+                cls._dump_type(device.type),
+                str(device.ipaddress),
+                device.hostname,
+                device.packets_sent,
+                device.packets_received,
+                cached_device.generation,
+                cls._dump_date(cached_device.update_date),
+            ))
+        return marshal.dumps((
+            cls.FORMAT_VERSION,
+            device_cache.generation,
+            records,
+        ))
+
+    @classmethod
+    def loads(cls, data, device_cache=None):
+        if device_cache is None:
+            device_cache = DeviceCache.default_device_cache()
+        version, generation, records = marshal.loads(data)
+        if version != cls.FORMAT_VERSION:
+            e_m = f'unsupported device cache format version: {version}'
+            raise DeviceCacheStoreException(e_m)
+        device_types = cls.DEVICE_TYPES
+        load_date = cls._load_date
+        # nothing in here can form a cycle, and letting the collector walk
+        # the heap every few hundred new objects makes large loads crawl
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            devices = [
+                (key, DeviceCacheValue(
+                    StoredDevice(
+                        key,
+                        device_types.get(device_type, device_type),
+                        ipaddress,
+                        hostname,
+                        packets_sent,
+                        packets_received),
+                    device_generation,
+                    update_date and load_date(update_date)))
+                for (key, device_type, ipaddress, hostname, packets_sent,
+                     packets_received, device_generation,
+                     update_date) in records
+            ]
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        device_cache.restore(generation, devices)
+        return device_cache
+
+    def save(self, router_name, device_cache):
+        path = self.get_path(router_name)
+        data = self.dumps(device_cache)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.directory,
+            prefix='.',
+            suffix=self.FILE_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        log.debug(f'saved {len(device_cache.devices)} devices '
+                  f'({len(data)} bytes) to path: {path}')
+
+    def load(self, router_name):
+        path = self.get_path(router_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            device_cache = self.loads(f.read())
+        log.debug(f'loaded {len(device_cache.devices)} devices '
+                  f'from path: {path}')
+        return device_cache
@@ -0,0 +1,96 @@
+import time
+from flask import current_app as app
+
+
+log = app.logger
+
+
+class DeviceEvictionException(Exception):
+    pass
+
+
+class DepartedDevice(object):
+    __slots__ = ('cached_device', 'departed_at')
+
+    def __init__(self, cached_device, departed_at):
+        super().__init__()
+        self.cached_device = cached_device
+        self.departed_at = departed_at
+
+    def __repr__(self):
+        return (f'DepartedDevice ({self.departed_at}) '
+                f'=> {self.cached_device}')
+
+
+class DeviceEvictionPolicy(object):
+    """Tracks departed devices and every series written for them by MAC
+
+    Once a device has been gone for longer than `ttl_seconds` it is handed
+    back by `pop_expired` along with all of its series, so they can be
+    removed. A `ttl_seconds` of `0` turns eviction off, and with it the
+    tracking of departed devices, which would otherwise never be let go.
+    """
+    MAC_ADDRESS_LABEL = 'mac_address'
+
+    def __init__(self, ttl_seconds):
+        super().__init__()
+        self.ttl_seconds = float(ttl_seconds or 0)
+        # mac => {(gauge, label values)}
+        self._series = {}
+        # mac => DepartedDevice
+        self._departed = {}
+
+    def __repr__(self):
+        return (f'DeviceEvictionPolicy ({self.ttl_seconds}s) => '
+                f'series macs: {len(self._series)}, '
+                f'departed: {len(self._departed)}')
+
+    @classmethod
+    def get_now(cls):
+        return time.monotonic()
+
+    @property
+    def is_enabled(self):
+        return bool(self.ttl_seconds > 0)
+
+    @property
+    def departed_devices(self):
+        return self._departed
+
+    def track(self, gauge, labels):
+        mac = labels.get(self.MAC_ADDRESS_LABEL)
+        if mac is None:
+            return
+        series = self._series.get(mac)
+        if series is None:
+            series = set()
+            self._series[mac] = series
+        # `remove` takes the label values in the order they were declared
+        label_values = tuple(labels[name] for name in gauge._labelnames)
+        series.add((gauge, label_values))
+
+    def mark_present(self, mac):
+        self._departed.pop(mac, None)
+
+    def mark_departed(self, mac, cached_device, now=None):
+        if not self.is_enabled or mac in self._departed:
+            return
+        if now is None:
+            now = self.get_now()
+        self._departed[mac] = DepartedDevice(cached_device, now)
+
+    def pop_expired(self, now=None):
+        if not self.is_enabled or not self._departed:
+            return []
+        if now is None:
+            now = self.get_now()
+        expired_macs = [
+            mac for mac, departed in self._departed.items()
+            if now - departed.departed_at >= self.ttl_seconds
+        ]
+        expired = []
+        for mac in expired_macs:
+            departed = self._departed.pop(mac)
+            series = self._series.pop(mac, set())
+            expired.append((mac, departed, series))
+        return expired
@@ -0,0 +1,427 @@
+import os
+import re
+import math
+import mmap
+import time
+import fcntl
+import tempfile
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+import macaddress
+from flask import current_app as app
+from ..metrics import Metrics
+from .env_vars import EnvVars
+from .scheduler_leader import SchedulerLeader
+
+
+log = app.logger
+
+
+class DeviceHistoryException(Exception):
+    pass
+
+
+DeviceHistorySample = namedtuple('DeviceHistorySample', [
+    'timestamp',
+    'connected',
+    'packets_sent',
+    'packets_received',
+])
+
+
+class DeviceHistory(object):
+    """Fixed size ring buffer of the last `samples` scrapes of one router,
+    for up to `max_devices` devices
+
+    Lives in an mmap'ed file next to the scheduler leader state, so the
+    worker scraping the router writes it and every worker can answer
+    history queries from it. Each scrape takes one row: its timestamp plus,
+    per device slot, the connected state and both packet counters, in flat
+    typed arrays. Devices get a slot the first time they show up; once all
+    are taken the one seen the longest ago is handed over.
+
+    The size never changes, `get_file_bytes()` is
+    `HEADER_BYTES + samples * ROW_BYTES + max_devices * get_device_bytes()`.
+    """
+    MAGIC = 0x74706c6468697374
+    FORMAT_VERSION = 1
+    FILE_PREFIX = 'tp_link_router_exporter_device_history_'
+    FILE_SUFFIX = '.db'
+    LOCK_SUFFIX = '.lock'
+    # magic, version, samples, max_devices, next serial, 3 spare
+    HEADER_FIELDS = 8
+    HEADER_BYTES = HEADER_FIELDS * 8
+    NEXT_SERIAL = 4
+    # row serial (+ 1, `0` is an empty row) and timestamp
+    ROW_BYTES = 8 + 8
+    # mac (with `USED_SLOT`), serial it was handed out at, serial last seen
+    SLOT_BYTES = 8 + 8 + 8
+    # packets sent, packets received and connected, per row
+    SAMPLE_BYTES = 8 + 8 + 1
+    USED_SLOT = 1 << 48
+    MAC_MASK = USED_SLOT - 1
+    # (name, typecode, length) in file order, the 8 byte ones first
+    SECTIONS = (
+        ('header', 'Q', 'header'),
+        ('slot_macs', 'Q', 'max_devices'),
+        ('slot_since', 'Q', 'max_devices'),
+        ('slot_seen', 'Q', 'max_devices'),
+        ('row_serials', 'Q', 'samples'),
+        ('row_timestamps', 'd', 'samples'),
+        ('packets_sent', 'd', 'cells'),
+        ('packets_received', 'd', 'cells'),
+        ('connected', 'B', 'cells'),
+    )
+
+    def __init__(self, router_name, samples=None, max_devices=None,
+                 directory=None):
+        super().__init__()
+        self.router_name = router_name
+        if samples is None:
+            samples = EnvVars.get_default_device_history_samples()
+        self.samples = max(int(samples), 0)
+        if max_devices is None:
+            max_devices = EnvVars.get_default_device_history_max_devices()
+        self.max_devices = max(int(max_devices), 0)
+        if not directory:
+            directory = SchedulerLeader.shared().directory
+        self.directory = directory or tempfile.gettempdir()
+        # writer side, reopened whenever the file is replaced
+        self._inode = None
+        self._mmap = None
+        self._views = None
+        # `{mac value: slot}` and free slots as of `_slots_serial`, read
+        # again whenever someone else appended in between
+        self._slots = None
+        self._free_slots = None
+        self._slots_serial = None
+
+    def __repr__(self):
+        return (f'DeviceHistory ({self.router_name}) => '
+                f'{self.samples} samples x {self.max_devices} devices')
+
+    @property
+    def is_enabled(self):
+        return bool(self.samples > 0 and self.max_devices > 0)
+
+    @classmethod
+    def get_device_bytes(cls, samples):
+        return cls.SLOT_BYTES + samples * cls.SAMPLE_BYTES
+
+    @classmethod
+    def get_file_bytes(cls, samples, max_devices):
+        return (cls.HEADER_BYTES
+                + samples * cls.ROW_BYTES
+                + max_devices * cls.get_device_bytes(samples))
+
+    def get_path(self):
+        file_name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(self.router_name))
+        return os.path.join(
+            self.directory,
+            f'{self.FILE_PREFIX}{file_name}{self.FILE_SUFFIX}')
+
+    @classmethod
+    def get_mac_value(cls, mac_address):
+        if not isinstance(mac_address, macaddress.EUI48):
+            mac_address = macaddress.EUI48(mac_address)
+        return int(mac_address)
+
+    @classmethod
+    def to_mac_address(cls, mac_value):
+        return macaddress.EUI48(mac_value)
+
+    @contextmanager
+    def _flock(self, operation):
+        # private, like the leader's directory it defaults to
+        os.makedirs(
+            self.directory,
+            mode=SchedulerLeader.DIRECTORY_MODE,
+            exist_ok=True)
+        with open(self.get_path() + self.LOCK_SUFFIX, 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    # file layout
+
+    @classmethod
+    def _get_views(cls, buffer, samples, max_devices):
+        lengths = {
+            'header': cls.HEADER_FIELDS,
+            'max_devices': max_devices,
+            'samples': samples,
+            'cells': samples * max_devices,
+        }
+        memory = memoryview(buffer)
+        views = {}
+        offset = 0
+        for name, typecode, length_name in cls.SECTIONS:
+            size = array(typecode).itemsize * lengths[length_name]
+            views[name] = memory[offset:offset + size].cast(typecode)
+            offset += size
+        memory.release()
+        return views
+
+    @classmethod
+    def _release_views(cls, views):
+        for view in views.values():
+            view.release()
+
+    @classmethod
+    def _read_dimensions(cls, buffer):
+        if len(buffer) < cls.HEADER_BYTES:
+            return None
+        header = array('Q', bytes(buffer[:cls.HEADER_BYTES]))
+        if header[0] != cls.MAGIC or header[1] != cls.FORMAT_VERSION:
+            return None
+        samples, max_devices = header[2], header[3]
+        if len(buffer) != cls.get_file_bytes(samples, max_devices):
+            return None
+        return samples, max_devices
+
+    def _create_file(self):
+        path = self.get_path()
+        size = self.get_file_bytes(self.samples, self.max_devices)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                header = array('Q', [0] * self.HEADER_FIELDS)
+                header[0:4] = array('Q', [
+                    self.MAGIC,
+                    self.FORMAT_VERSION,
+                    self.samples,
+                    self.max_devices,
+                ])
+                f.write(header.tobytes())
+                # sparse, rows only take up disk once they are written
+                f.truncate(size)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        log.info(f'{self} created {path} ({size} bytes)')
+
+    def _close(self):
+        if self._views is not None:
+            self._release_views(self._views)
+        if self._mmap is not None:
+            self._mmap.close()
+        self._inode = None
+        self._mmap = None
+        self._views = None
+        self._slots = None
+        self._free_slots = None
+        self._slots_serial = None
+
+    def _open_for_writing(self):
+        """Maps the file, (re)creating it when its size does not match"""
+        path = self.get_path()
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode is not None and inode == self._inode:
+            return self._views
+        self._close()
+        for _ in range(2):
+            try:
+                with open(path, 'r+b') as f:
+                    mapped = mmap.mmap(f.fileno(), 0)
+                    inode = os.fstat(f.fileno()).st_ino
+            except (FileNotFoundError, ValueError):
+                # missing or empty
+                mapped = None
+            dimensions = None
+            if mapped is not None:
+                dimensions = self._read_dimensions(mapped)
+            if dimensions == (self.samples, self.max_devices):
+                break
+            if mapped is not None:
+                mapped.close()
+            self._create_file()
+        else:
+            e_m = f'{self} cannot open {path}'
+            log.error(e_m)
+            raise DeviceHistoryException(e_m)
+        self._inode = inode
+        self._mmap = mapped
+        self._views = self._get_views(mapped, self.samples, self.max_devices)
+        Metrics.ROUTER_DEVICE_HISTORY_BYTES.labels(
+            router_name=self.router_name,
+        ).set(len(mapped))
+        return self._views
+
+    # writing
+
+    def _load_slots(self, views, serial):
+        """`{mac value: slot}` of every slot handed out, scanned from the
+        file only when it changed since this writer's last row
+        """
+        if self._slots is not None and self._slots_serial == serial:
+            return self._slots
+        slots = {}
+        free_slots = []
+        for slot, stored in enumerate(views['slot_macs'].tolist()):
+            if stored & self.USED_SLOT:
+                slots[stored & self.MAC_MASK] = slot
+            else:
+                free_slots.append(slot)
+        # lowest first
+        free_slots.reverse()
+        self._slots = slots
+        self._free_slots = free_slots
+        return slots
+
+    def _take_slot(self, views, slots, mac_value, serial):
+        slot_macs = views['slot_macs']
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            # only scanned once every slot is taken
+            slot_seen = views['slot_seen']
+            slot = min(range(self.max_devices), key=slot_seen.__getitem__)
+            if slot_seen[slot] == serial:
+                # every slot is already taken by a device of this scrape
+                return None
+            slots.pop(slot_macs[slot] & self.MAC_MASK, None)
+        slot_macs[slot] = mac_value | self.USED_SLOT
+        views['slot_since'][slot] = serial
+        slots[mac_value] = slot
+        return slot
+
+    @classmethod
+    def _find_slot(cls, views, mac_value):
+        try:
+            return views['slot_macs'].tolist().index(
+                mac_value | cls.USED_SLOT)
+        except ValueError:
+            return None
+
+    @Metrics.DEVICE_HISTORY_APPEND_TIME.time()
+    def append(self, devices, now=None):
+        """Adds a row for one scrape of `devices`, the ones connected right
+        now. Known devices missing from it are recorded as disconnected.
+        """
+        if not self.is_enabled:
+            return
+        if now is None:
+            now = time.time()
+        with Metrics.DEVICE_HISTORY_APPEND_EXCEPTIONS.count_exceptions():
+            with self._flock(fcntl.LOCK_EX):
+                views = self._open_for_writing()
+                dropped = self._append_row(views, devices, now)
+            if dropped:
+                Metrics.ROUTER_DEVICE_HISTORY_DROPPED_TOTAL.labels(
+                    router_name=self.router_name,
+                ).inc(dropped)
+
+    def _append_row(self, views, devices, now):
+        max_devices = self.max_devices
+        serial = views['header'][self.NEXT_SERIAL]
+        row = serial % self.samples
+        start = row * max_devices
+        end = start + max_devices
+        sent = array('d', [math.nan]) * max_devices
+        received = array('d', [math.nan]) * max_devices
+        connected = bytearray(max_devices)
+        slots = self._load_slots(views, serial)
+        slot_seen = views['slot_seen']
+        dropped = 0
+        for device in devices:
+            mac_value = self.get_mac_value(device.macaddress)
+            slot = slots.get(mac_value)
+            if slot is None:
+                slot = self._take_slot(views, slots, mac_value, serial)
+                if slot is None:
+                    dropped += 1
+                    continue
+            slot_seen[slot] = serial
+            connected[slot] = 1
+            sent[slot] = device.packets_sent or 0
+            received[slot] = device.packets_received or 0
+        # the row is marked empty while it is being overwritten
+        views['row_serials'][row] = 0
+        views['packets_sent'][start:end] = memoryview(sent)
+        views['packets_received'][start:end] = memoryview(received)
+        views['connected'][start:end] = memoryview(connected)
+        views['row_timestamps'][row] = now
+        views['row_serials'][row] = serial + 1
+        views['header'][self.NEXT_SERIAL] = serial + 1
+        self._slots_serial = serial + 1
+        return dropped
+
+    # reading
+
+    def get_samples(self, mac_address):
+        """`DeviceHistorySample`s of one device, oldest first, `None` when
+        there is no history for the router or the device
+        """
+        mac_value = self.get_mac_value(mac_address)
+        path = self.get_path()
+        with self._flock(fcntl.LOCK_SH):
+            try:
+                with open(path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                return None
+            try:
+                return self._read_samples(mapped, mac_value)
+            finally:
+                mapped.close()
+
+    def _read_samples(self, mapped, mac_value):
+        dimensions = self._read_dimensions(mapped)
+        if dimensions is None:
+            return None
+        samples, max_devices = dimensions
+        views = self._get_views(mapped, samples, max_devices)
+        try:
+            slot = self._find_slot(views, mac_value)
+            if slot is None:
+                return None
+            next_serial = views['header'][self.NEXT_SERIAL]
+            first_serial = max(
+                views['slot_since'][slot],
+                next_serial - samples)
+            history = []
+            for serial in range(first_serial, next_serial):
+                row = serial % samples
+                if views['row_serials'][row] != serial + 1:
+                    continue
+                cell = row * max_devices + slot
+                if not views['connected'][cell]:
+                    history.append(DeviceHistorySample(
+                        views['row_timestamps'][row], 0, None, None))
+                    continue
+                history.append(DeviceHistorySample(
+                    views['row_timestamps'][row],
+                    1,
+                    int(views['packets_sent'][cell]),
+                    int(views['packets_received'][cell]),
+                ))
+            return history
+        finally:
+            self._release_views(views)
+
+    @classmethod
+    def downsample(cls, history, step_seconds):
+        """One sample per `step_seconds`, starting at the step boundary:
+        the share of samples the device was connected, and the last packet
+        counts it had
+        """
+        if not step_seconds:
+            return list(history)
+        buckets = {}
+        for sample in history:
+            start = math.floor(sample.timestamp / step_seconds) * step_seconds
+            buckets.setdefault(start, []).append(sample)
+        downsampled = []
+        for start, bucket in buckets.items():
+            seen = [s for s in bucket if s.connected]
+            downsampled.append(DeviceHistorySample(
+                start,
+                len(seen) / len(bucket),
+                seen[-1].packets_sent if seen else None,
+                seen[-1].packets_received if seen else None,
+            ))
+        return downsampled
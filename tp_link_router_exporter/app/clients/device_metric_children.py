@@ -0,0 +1,129 @@
+from flask import current_app as app
+from ..common.packet_actions import PacketActions
+from ..metrics import Metrics
+from ..utils import normalize_name
+from .series_write_cache import SeriesWriteCache
+
+
+log = app.logger
+
+
+class DeviceMetricChildrenException(Exception):
+    pass
+
+
+class BoundSeries(object):
+    """One gauge (or counter) series with its labels worked out once
+
+    `child` is bound on first use, snapshots only need the label values.
+    """
+    __slots__ = ('gauge', 'labels', 'labelnames', 'label_values', 'child',
+                 'key')
+
+    def __init__(self, gauge, **labels):
+        super().__init__()
+        self.gauge = gauge
+        self.labels = labels
+        self.labelnames = tuple(labels.keys())
+        self.label_values = tuple(str(v) for v in labels.values())
+        self.child = None
+        self.key = SeriesWriteCache.get_key(gauge, labels)
+
+    def __repr__(self):
+        return f'BoundSeries ({self.gauge}) => {self.label_values}'
+
+
+class DeviceMetricChildren(object):
+    """Every series recorded for one device under one set of labels"""
+    __slots__ = (
+        'device_type',
+        'hostname',
+        'ipaddress',
+        'mac_address',
+        'connected_status',
+        'packets',
+        'packet_counters',
+    )
+
+    def __init__(self, router_name, device):
+        super().__init__()
+        # kept as the router reports them, so `matches` needs no conversions
+        self.device_type = device.type
+        self.hostname = device.hostname
+        self.ipaddress = device.ipaddress
+        self.mac_address = str(device.macaddress)
+        labels = {
+            'router_name': router_name,
+            'device_type': normalize_name(device.type),
+            'hostname': device.hostname,
+            'ip_address': str(device.ipaddress),
+            'mac_address': self.mac_address,
+        }
+        self.connected_status = BoundSeries(
+            Metrics.ROUTER_DEVICE_CONNECTED_STATUS,
+            **labels)
+        self.packets = tuple(
+            (packet_action, BoundSeries(
+                Metrics.ROUTER_DEVICE_PACKETS_TOTAL,
+                **labels,
+                packet_action=packet_action.label_string))
+            for packet_action in PacketActions.metrics_actions_list()
+        )
+        self.packet_counters = tuple(
+            (packet_action,
+             BoundSeries(
+                 Metrics.ROUTER_DEVICE_PACKETS_MONOTONIC_TOTAL,
+                 **labels,
+                 packet_action=packet_action.label_string),
+             BoundSeries(
+                 Metrics.ROUTER_DEVICE_PACKETS_PER_SECOND,
+                 **labels,
+                 packet_action=packet_action.label_string))
+            for packet_action in PacketActions.metrics_actions_list()
+        )
+
+    def __repr__(self):
+        return (f'DeviceMetricChildren ({self.mac_address}) => '
+                f'{self.connected_status.label_values}')
+
+    def matches(self, device):
+        return bool(
+            self.device_type is device.type
+            and self.hostname == device.hostname
+            and self.ipaddress == device.ipaddress)
+
+
+class DeviceMetricChildrenCache(object):
+    """`DeviceMetricChildren` per device of one router
+
+    Keyed by the router's own MAC address object, hashing it is a lot
+    cheaper than turning it into a string on every scrape.
+    """
+    def __init__(self, router_name):
+        super().__init__()
+        self.router_name = router_name
+        self._children = {}
+        # mac address string => keys, for dropping evicted devices
+        self._keys_by_mac = {}
+
+    def __repr__(self):
+        return (f'DeviceMetricChildrenCache ({self.router_name}) '
+                f'=> {len(self._children)}')
+
+    def __len__(self):
+        return len(self._children)
+
+    def get(self, device):
+        key = device.macaddress
+        children = self._children.get(key)
+        if children is not None and children.matches(device):
+            return children
+        children = DeviceMetricChildren(self.router_name, device)
+        self._children[key] = children
+        keys = self._keys_by_mac.setdefault(children.mac_address, set())
+        keys.add(key)
+        return children
+
+    def pop_mac(self, mac_address):
+        for key in self._keys_by_mac.pop(mac_address, ()):
+            self._children.pop(key, None)
@@ -5,6 +5,136 @@ ROUTER_IP = os.environ.get('TP_LINK_ROUTER_IP')
 ROUTER_NAME = os.environ.get('TP_LINK_ROUTER_NAME', 'default')
 ROUTER_USERNAME = os.environ.get('TP_LINK_ROUTER_USERNAME')
 ROUTER_PASSWORD = os.environ.get('TP_LINK_ROUTER_PASSWORD')
+# `1` keeps the original behavior of scraping routers one after another
+DEFAULT_MAX_CONCURRENT_ROUTERS = 1
+MAX_CONCURRENT_ROUTERS = int(os.environ.get(
+    'MAX_CONCURRENT_ROUTERS',
+    DEFAULT_MAX_CONCURRENT_ROUTERS))
+# `sync` (default) or `async`
+DEFAULT_SCRAPE_ENGINE = 'sync'
+SCRAPE_ENGINE = os.environ.get('SCRAPE_ENGINE', DEFAULT_SCRAPE_ENGINE)
+# keep routers logged in between scrapes, off (`0`) by default
+DEFAULT_SESSION_REUSE = '0'
+SESSION_REUSE = os.environ.get('SESSION_REUSE', DEFAULT_SESSION_REUSE)
+DEFAULT_SESSION_TTL_SECONDS = 300
+SESSION_TTL_SECONDS = int(os.environ.get(
+    'SESSION_TTL_SECONDS',
+    DEFAULT_SESSION_TTL_SECONDS))
+DEFAULT_SESSION_IDLE_LOGOUT_SECONDS = 60
+SESSION_IDLE_LOGOUT_SECONDS = int(os.environ.get(
+    'SESSION_IDLE_LOGOUT_SECONDS',
+    DEFAULT_SESSION_IDLE_LOGOUT_SECONDS))
+# `gauges` (default) or `snapshot`
+DEFAULT_METRICS_RECORDING_MODE = 'gauges'
+METRICS_RECORDING_MODE = os.environ.get(
+    'METRICS_RECORDING_MODE',
+    DEFAULT_METRICS_RECORDING_MODE)
+# remove all series of a device gone this long (s), `0` keeps them forever
+DEFAULT_DEVICE_EVICTION_TTL_SECONDS = 0
+DEVICE_EVICTION_TTL_SECONDS = int(os.environ.get(
+    'DEVICE_EVICTION_TTL_SECONDS',
+    DEFAULT_DEVICE_EVICTION_TTL_SECONDS))
+# directory to keep each router's device cache in across restarts, `''` is off
+DEFAULT_DEVICE_CACHE_DIR = ''
+DEVICE_CACHE_DIR = os.environ.get('DEVICE_CACHE_DIR', DEFAULT_DEVICE_CACHE_DIR)
+# level of the per router scrape logs, `''` follows the app log level
+DEFAULT_SCRAPE_LOG_LEVEL = ''
+SCRAPE_LOG_LEVEL = os.environ.get('SCRAPE_LOG_LEVEL', DEFAULT_SCRAPE_LOG_LEVEL)
+# only log 1 in N per device/lease/reservation scrape debug messages
+DEFAULT_SCRAPE_LOG_SAMPLE_RATE = 1
+SCRAPE_LOG_SAMPLE_RATE = int(os.environ.get(
+    'SCRAPE_LOG_SAMPLE_RATE',
+    DEFAULT_SCRAPE_LOG_SAMPLE_RATE))
+# let a scrape of `/api/v1/metrics` scrape routers older than their TTL
+DEFAULT_ON_DEMAND_SCRAPES = '0'
+ON_DEMAND_SCRAPES = os.environ.get(
+    'ON_DEMAND_SCRAPES',
+    DEFAULT_ON_DEMAND_SCRAPES)
+DEFAULT_ON_DEMAND_TTL_SECONDS = 15
+ON_DEMAND_TTL_SECONDS = int(os.environ.get(
+    'ON_DEMAND_TTL_SECONDS',
+    DEFAULT_ON_DEMAND_TTL_SECONDS))
+# where the per router lock files live, `''` is the system temp directory
+DEFAULT_ROUTER_LOCK_DIR = ''
+ROUTER_LOCK_DIR = os.environ.get('ROUTER_LOCK_DIR', DEFAULT_ROUTER_LOCK_DIR)
+# how long (s) to wait for another scrape of the same router to finish
+DEFAULT_ROUTER_LOCK_TIMEOUT_SECONDS = 60
+ROUTER_LOCK_TIMEOUT_SECONDS = int(os.environ.get(
+    'ROUTER_LOCK_TIMEOUT_SECONDS',
+    DEFAULT_ROUTER_LOCK_TIMEOUT_SECONDS))
+# stop logging in to a router after this many failed logins in a row, `0` off
+DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get(
+    'CIRCUIT_BREAKER_FAILURE_THRESHOLD',
+    DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD))
+# first backoff (s) once open, doubled per failure up to the max
+DEFAULT_CIRCUIT_BREAKER_BASE_SECONDS = 30
+CIRCUIT_BREAKER_BASE_SECONDS = int(os.environ.get(
+    'CIRCUIT_BREAKER_BASE_SECONDS',
+    DEFAULT_CIRCUIT_BREAKER_BASE_SECONDS))
+DEFAULT_CIRCUIT_BREAKER_MAX_SECONDS = 900
+CIRCUIT_BREAKER_MAX_SECONDS = int(os.environ.get(
+    'CIRCUIT_BREAKER_MAX_SECONDS',
+    DEFAULT_CIRCUIT_BREAKER_MAX_SECONDS))
+# adapt each router's scrape interval to how much its data changes
+DEFAULT_ADAPTIVE_INTERVAL = '0'
+ADAPTIVE_INTERVAL = os.environ.get(
+    'ADAPTIVE_INTERVAL',
+    DEFAULT_ADAPTIVE_INTERVAL)
+DEFAULT_ADAPTIVE_INTERVAL_MIN_SECONDS = 10
+ADAPTIVE_INTERVAL_MIN_SECONDS = int(os.environ.get(
+    'ADAPTIVE_INTERVAL_MIN_SECONDS',
+    DEFAULT_ADAPTIVE_INTERVAL_MIN_SECONDS))
+DEFAULT_ADAPTIVE_INTERVAL_MAX_SECONDS = 300
+ADAPTIVE_INTERVAL_MAX_SECONDS = int(os.environ.get(
+    'ADAPTIVE_INTERVAL_MAX_SECONDS',
+    DEFAULT_ADAPTIVE_INTERVAL_MAX_SECONDS))
+# where workers elect the scheduler leader, `''` is the system temp directory
+DEFAULT_SCHEDULER_LEADER_DIR = ''
+SCHEDULER_LEADER_DIR = os.environ.get(
+    'SCHEDULER_LEADER_DIR',
+    DEFAULT_SCHEDULER_LEADER_DIR)
+# how long (s) a follower waits on the scrapes it asked the leader for
+DEFAULT_LEADER_REQUEST_TIMEOUT_SECONDS = 120
+LEADER_REQUEST_TIMEOUT_SECONDS = int(os.environ.get(
+    'LEADER_REQUEST_TIMEOUT_SECONDS',
+    DEFAULT_LEADER_REQUEST_TIMEOUT_SECONDS))
+# render `METRICS_PORT` pages once per scrape instead of once per pull
+DEFAULT_PRERENDERED_METRICS = '0'
+PRERENDERED_METRICS = os.environ.get(
+    'PRERENDERED_METRICS',
+    DEFAULT_PRERENDERED_METRICS)
+# scrapes finishing closer together than this (s) share one render
+DEFAULT_PRERENDERED_METRICS_MIN_INTERVAL_SECONDS = 5
+PRERENDERED_METRICS_MIN_INTERVAL_SECONDS = int(os.environ.get(
+    'PRERENDERED_METRICS_MIN_INTERVAL_SECONDS',
+    DEFAULT_PRERENDERED_METRICS_MIN_INTERVAL_SECONDS))
+# how often (s) the leader compacts the multiprocess files, `0` never
+DEFAULT_MULTIPROCESS_COMPACTION_INTERVAL_SECONDS = 3600
+MULTIPROCESS_COMPACTION_INTERVAL_SECONDS = int(os.environ.get(
+    'MULTIPROCESS_COMPACTION_INTERVAL_SECONDS',
+    DEFAULT_MULTIPROCESS_COMPACTION_INTERVAL_SECONDS))
+# scrapes of per device history kept per router, `0` keeps none
+DEFAULT_DEVICE_HISTORY_SAMPLES = 0
+DEVICE_HISTORY_SAMPLES = int(os.environ.get(
+    'DEVICE_HISTORY_SAMPLES',
+    DEFAULT_DEVICE_HISTORY_SAMPLES))
+# devices per router with a history, the ones seen longest ago make way
+DEFAULT_DEVICE_HISTORY_MAX_DEVICES = 256
+DEVICE_HISTORY_MAX_DEVICES = int(os.environ.get(
+    'DEVICE_HISTORY_MAX_DEVICES',
+    DEFAULT_DEVICE_HISTORY_MAX_DEVICES))
+# how often (s) each router endpoint is actually fetched, `0` is every scrape
+DEFAULT_REFRESH_SECONDS = {
+    'FIRMWARE_REFRESH_SECONDS': 3600,
+    'STATUS_REFRESH_SECONDS': 0,
+    'IPV4_RESERVATIONS_REFRESH_SECONDS': 600,
+    'IPV4_DHCP_LEASES_REFRESH_SECONDS': 0,
+}
+REFRESH_SECONDS = {
+    env_var: int(os.environ.get(env_var, default_value))
+    for env_var, default_value in DEFAULT_REFRESH_SECONDS.items()
+}
 
 
 class EnvVars(object):
@@ -24,6 +154,118 @@ class EnvVars(object):
     def get_default_router_password(cls):
         return ROUTER_PASSWORD
 
+    @classmethod
+    def get_default_max_concurrent_routers(cls):
+        return MAX_CONCURRENT_ROUTERS
+
+    @classmethod
+    def get_default_scrape_engine(cls):
+        return SCRAPE_ENGINE
+
+    @classmethod
+    def get_default_session_reuse(cls):
+        return SESSION_REUSE
+
+    @classmethod
+    def get_default_session_ttl_seconds(cls):
+        return SESSION_TTL_SECONDS
+
+    @classmethod
+    def get_default_session_idle_logout_seconds(cls):
+        return SESSION_IDLE_LOGOUT_SECONDS
+
+    @classmethod
+    def get_default_metrics_recording_mode(cls):
+        return METRICS_RECORDING_MODE
+
+    @classmethod
+    def get_default_device_eviction_ttl_seconds(cls):
+        return DEVICE_EVICTION_TTL_SECONDS
+
+    @classmethod
+    def get_default_device_cache_dir(cls):
+        return DEVICE_CACHE_DIR
+
+    @classmethod
+    def get_default_scrape_log_level(cls):
+        return SCRAPE_LOG_LEVEL
+
+    @classmethod
+    def get_default_scrape_log_sample_rate(cls):
+        return SCRAPE_LOG_SAMPLE_RATE
+
+    @classmethod
+    def get_default_on_demand_scrapes(cls):
+        return ON_DEMAND_SCRAPES
+
+    @classmethod
+    def get_default_on_demand_ttl_seconds(cls):
+        return ON_DEMAND_TTL_SECONDS
+
+    @classmethod
+    def get_default_router_lock_dir(cls):
+        return ROUTER_LOCK_DIR
+
+    @classmethod
+    def get_default_router_lock_timeout_seconds(cls):
+        return ROUTER_LOCK_TIMEOUT_SECONDS
+
+    @classmethod
+    def get_default_circuit_breaker_failure_threshold(cls):
+        return CIRCUIT_BREAKER_FAILURE_THRESHOLD
+
+    @classmethod
+    def get_default_circuit_breaker_base_seconds(cls):
+        return CIRCUIT_BREAKER_BASE_SECONDS
+
+    @classmethod
+    def get_default_circuit_breaker_max_seconds(cls):
+        return CIRCUIT_BREAKER_MAX_SECONDS
+
+    @classmethod
+    def get_default_adaptive_interval(cls):
+        return ADAPTIVE_INTERVAL
+
+    @classmethod
+    def get_default_adaptive_interval_min_seconds(cls):
+        return ADAPTIVE_INTERVAL_MIN_SECONDS
+
+    @classmethod
+    def get_default_adaptive_interval_max_seconds(cls):
+        return ADAPTIVE_INTERVAL_MAX_SECONDS
+
+    @classmethod
+    def get_default_scheduler_leader_dir(cls):
+        return SCHEDULER_LEADER_DIR
+
+    @classmethod
+    def get_default_leader_request_timeout_seconds(cls):
+        return LEADER_REQUEST_TIMEOUT_SECONDS
+
+    @classmethod
+    def get_default_prerendered_metrics(cls):
+        return PRERENDERED_METRICS
+
+    @classmethod
+    def get_default_prerendered_metrics_min_interval_seconds(cls):
+        return PRERENDERED_METRICS_MIN_INTERVAL_SECONDS
+
+    @classmethod
+    def get_default_multiprocess_compaction_interval_seconds(cls):
+        return MULTIPROCESS_COMPACTION_INTERVAL_SECONDS
+
+    @classmethod
+    def get_default_device_history_samples(cls):
+        return DEVICE_HISTORY_SAMPLES
+
+    @classmethod
+    def get_default_device_history_max_devices(cls):
+        return DEVICE_HISTORY_MAX_DEVICES
+
+    @classmethod
+    def get_default_refresh_seconds(cls, endpoint):
+        return REFRESH_SECONDS.get(endpoint.refresh_seconds_env_var, 0)
+
     @classmethod
     def has_router_config_env_vars(cls):
         router_ip = cls.get_default_router_ip()
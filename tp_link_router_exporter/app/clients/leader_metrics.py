@@ -0,0 +1,182 @@
+import os
+import marshal
+import tempfile
+import threading
+from datetime import datetime, timezone
+from flask import current_app as app
+from .lease_expiry import (
+    LeaseExpiry,
+    LeaseExpiryAnchors,
+    LeaseExpiryCollector,
+    lease_expiry_collector,
+)
+from .router_snapshot import (
+    RouterSnapshot,
+    RouterSnapshotCollector,
+    RouterSnapshotFamily,
+    router_snapshot_collector,
+)
+from .scheduler_leader import SchedulerLeader
+
+
+log = app.logger
+
+
+class LeaderMetricsException(Exception):
+    pass
+
+
+class LeaderMetricsCollector(object):
+    """Router snapshots and lease expiries of the scheduler leader, from any
+    worker
+
+    Both only live in the process that scraped the routers. The leader, which
+    runs every scrape, saves them to a file after each one and followers
+    serve them from there; the remaining lease time is still worked out per
+    collect. The file is written with `marshal` as flat tuples of builtins,
+    like `DeviceCacheStore` does, so loading it never runs any code.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, leader=None):
+        super().__init__()
+        self._leader = leader
+        # (mtime_ns, size) of the loaded file => its collectors
+        self._loaded_key = None
+        self._loaded = []
+        # scrapes finishing together must not replace a newer save
+        self._save_lock = threading.Lock()
+
+    def __repr__(self):
+        return f'LeaderMetricsCollector ({self.leader})'
+
+    @property
+    def leader(self):
+        if self._leader is None:
+            self._leader = SchedulerLeader.shared()
+        return self._leader
+
+    @classmethod
+    def get_local_collectors(cls):
+        return [router_snapshot_collector, lease_expiry_collector]
+
+    def save(self):
+        with self._save_lock:
+            self._save()
+
+    @classmethod
+    def _dump_date(cls, created_date):
+        return created_date.replace(tzinfo=timezone.utc).timestamp()
+
+    @classmethod
+    def _load_date(cls, timestamp):
+        dt = datetime.fromtimestamp(timestamp, timezone.utc)
+        return dt.replace(tzinfo=None)
+
+    @classmethod
+    def dumps(cls, snapshots, lease_anchors):
+        snapshot_records = [
+            (snapshot.router_name,
+             cls._dump_date(snapshot.created_date),
+             [(family.name,
+               family.documentation,
+               family.type,
+               tuple(family.labelnames),
+               tuple((tuple(label_values), value)
+                     for label_values, value in family.samples))
+              for family in snapshot.families])
+            for snapshot in snapshots.values()
+        ]
+        lease_records = [
+            (anchors.router_name,
+             [(expiry.hostname,
+               expiry.ip_address,
+               expiry.mac_address,
+               expiry.expires_at)
+              for expiry in anchors.expiries.values()])
+            for anchors in lease_anchors.values()
+        ]
+        return marshal.dumps((
+            cls.FORMAT_VERSION,
+            snapshot_records,
+            lease_records,
+        ))
+
+    @classmethod
+    def loads(cls, data):
+        """`[RouterSnapshotCollector, LeaseExpiryCollector]` of a saved
+        state
+        """
+        version, snapshot_records, lease_records = marshal.loads(data)
+        if version != cls.FORMAT_VERSION:
+            e_m = f'unsupported leader metrics format version: {version}'
+            raise LeaderMetricsException(e_m)
+        snapshot_collector = RouterSnapshotCollector()
+        for router_name, created_at, families in snapshot_records:
+            snapshot_collector.update(RouterSnapshot(
+                router_name,
+                cls._load_date(created_at),
+                [RouterSnapshotFamily(*family) for family in families]))
+        lease_collector = LeaseExpiryCollector()
+        for router_name, expiries in lease_records:
+            anchors = LeaseExpiryAnchors(router_name)
+            anchors.restore(LeaseExpiry(*expiry) for expiry in expiries)
+            lease_collector.update(anchors)
+        return [snapshot_collector, lease_collector]
+
+    def _save(self):
+        data = self.dumps(
+            router_snapshot_collector.snapshots,
+            lease_expiry_collector.anchors)
+        self.leader.ensure_directory()
+        path = self.leader.get_state_path()
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path),
+            suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # readers only ever see a whole file
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _load(self):
+        path = self.leader.get_state_path()
+        try:
+            self.leader.ensure_directory()
+            stat = os.stat(path)
+        except FileNotFoundError:
+            # the leader has not finished a scrape yet
+            return []
+        except Exception as unexp:
+            log.error(f'{self} cannot load {path}, got unexp: {unexp}')
+            return []
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._loaded_key:
+            return self._loaded
+        try:
+            with open(path, 'rb') as f:
+                loaded = self.loads(f.read())
+        except Exception as unexp:
+            log.error(f'{self} cannot load {path}, got unexp: {unexp}')
+            return self._loaded
+        self._loaded = loaded
+        self._loaded_key = key
+        return self._loaded
+
+    def get_collectors(self):
+        if self.leader.is_follower:
+            return self._load()
+        return self.get_local_collectors()
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for collector in self.get_collectors():
+            yield from collector.collect()
+
+
+leader_metrics_collector = LeaderMetricsCollector()
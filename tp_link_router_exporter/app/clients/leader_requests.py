@@ -0,0 +1,133 @@
+import os
+import socket
+import threading
+import socketserver
+from flask import current_app as app
+from ..common.leader_request_types import LeaderRequestTypes
+from ..metrics import Metrics
+from .env_vars import EnvVars
+from .scheduler_leader import SchedulerLeader, SchedulerLeaderException
+
+
+log = app.logger
+
+
+class LeaderRequestsException(Exception):
+    pass
+
+
+class LeaderRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline().strip().decode('utf-8', 'replace')
+        reply = self.server.leader_requests.handle(line)
+        self.wfile.write(reply + b'\n')
+
+
+class LeaderRequests(object):
+    """Scrapes the other gunicorn workers ask of the scheduler leader
+
+    Router snapshots and lease expiries only live in the leader, which saves
+    them for the others to serve, so a follower has the leader run its on
+    demand and update route scrapes instead of running them itself. Each
+    request is one line on a unix socket next to the leader's lock file,
+    answered once the scrapes finished.
+    """
+    FILE_NAME = 'tp_link_router_exporter_scheduler_leader.sock'
+    OK = b'ok'
+    FAILED = b'failed'
+
+    def __init__(self, leader=None, timeout_seconds=None):
+        super().__init__()
+        self.leader = leader or SchedulerLeader.shared()
+        if timeout_seconds is None:
+            timeout_seconds = (
+                EnvVars.get_default_leader_request_timeout_seconds())
+        self.timeout_seconds = float(timeout_seconds)
+        self._handlers = {}
+        self._server = None
+
+    def __repr__(self):
+        return f'LeaderRequests ({self.get_path()})'
+
+    def get_path(self):
+        return os.path.join(self.leader.directory, self.FILE_NAME)
+
+    def handle(self, line):
+        try:
+            request_type = LeaderRequestTypes(line)
+        except ValueError:
+            log.warning(f'{self} got unknown request: {line}')
+            return self.FAILED
+        handler = self._handlers.get(request_type)
+        if handler is None:
+            log.warning(f'{self} cannot handle request: {line}')
+            return self.FAILED
+        try:
+            with Metrics.LEADER_REQUEST_TIME.labels(
+                    leader_request_type=request_type.label_string).time():
+                handler()
+        except Exception as unexp:
+            log.error(f'{self} request: {line} got unexp: {unexp}')
+            return self.FAILED
+        return self.OK
+
+    def serve(self, handlers):
+        """Answers requests with `handlers`, by `LeaderRequestTypes`, from
+        a background thread. Only the leader serves.
+        """
+        if self._server is not None:
+            return
+        self._handlers = dict(handlers)
+        self.leader.ensure_directory()
+        path = self.get_path()
+        try:
+            # left behind by a leader that died
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        server = socketserver.ThreadingUnixStreamServer(
+            path,
+            LeaderRequestHandler)
+        # only this user's workers may ask for scrapes
+        os.chmod(path, 0o600)
+        server.daemon_threads = True
+        server.leader_requests = self
+        self._server = server
+        thread = threading.Thread(
+            target=server.serve_forever,
+            name='leader_requests',
+            daemon=True)
+        thread.start()
+        log.info(f'{self} serving in pid: {os.getpid()}')
+
+    def send(self, request_type):
+        """Whether the leader ran `request_type`, once it finished"""
+        request_label = request_type.label_string
+        try:
+            self.leader.ensure_directory()
+        except (OSError, SchedulerLeaderException) as unexp:
+            log.warning(f'{self} cannot send request: {request_label}, '
+                        f'got unexp: {unexp}')
+            return False
+        try:
+            with Metrics.LEADER_REQUEST_EXCEPTIONS.labels(
+                    leader_request_type=request_label).count_exceptions():
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                    s.settimeout(self.timeout_seconds)
+                    s.connect(self.get_path())
+                    s.sendall(request_label.encode('utf-8') + b'\n')
+                    with s.makefile('rb') as reply_file:
+                        reply = reply_file.readline().strip()
+        except OSError as os_error:
+            # nothing to do but serve what the leader saved last
+            s_m = (f'{self} cannot send request: {request_label}, '
+                   f'got os_error: {os_error}')
+            log.warning(s_m)
+            return False
+        if reply != self.OK:
+            log.warning(f'{self} request: {request_label} got: {reply}')
+            return False
+        return True
+
+
+leader_requests = LeaderRequests()
@@ -0,0 +1,186 @@
+import time
+from flask import current_app as app
+from prometheus_client.core import GaugeMetricFamily
+
+
+log = app.logger
+
+
+class LeaseExpiryException(Exception):
+    pass
+
+
+class InvalidLeaseTimeException(LeaseExpiryException):
+    pass
+
+
+class LeaseExpiry(object):
+    """Absolute expiry (unix time) of one IPv4 DHCP lease"""
+    __slots__ = ('hostname', 'ip_address', 'mac_address', 'expires_at')
+
+    def __init__(self, hostname, ip_address, mac_address, expires_at):
+        super().__init__()
+        self.hostname = hostname
+        self.ip_address = ip_address
+        self.mac_address = mac_address
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f'LeaseExpiry ({self.mac_address}) => {self.expires_at}'
+
+    def get_remaining_seconds(self, now):
+        return max(self.expires_at - now, 0.0)
+
+
+class LeaseExpiryAnchors(object):
+    """Lease expiries of one router, anchored when the leases are fetched
+
+    The router only reports the time left on each lease, which goes stale
+    right away. Turning it into an absolute expiry once per fetch lets the
+    remaining time be worked out whenever it is needed.
+    """
+    PERMANENT_LEASE = 'Permanent'
+    DAY_SECONDS = 86400
+    # right aligned multipliers for `[days:]hours:minutes:seconds`
+    CLOCK_MULTIPLIERS = (DAY_SECONDS, 3600, 60, 1)
+
+    def __init__(self, router_name):
+        super().__init__()
+        self.router_name = router_name
+        self._expiries = {}
+
+    def __repr__(self):
+        return (f'LeaseExpiryAnchors ({self.router_name}) '
+                f'=> {len(self._expiries)}')
+
+    @classmethod
+    def get_now(cls):
+        return time.time()
+
+    @property
+    def expiries(self):
+        return self._expiries
+
+    @classmethod
+    def is_permanent(cls, lease_time):
+        return bool(lease_time == cls.PERMANENT_LEASE)
+
+    @classmethod
+    def _parse_clock(cls, clock):
+        parts = clock.split(':')
+        if len(parts) > len(cls.CLOCK_MULTIPLIERS):
+            raise ValueError(f'too many fields in clock: {clock}')
+        multipliers = cls.CLOCK_MULTIPLIERS[-len(parts):]
+        return sum(int(p) * m for p, m in zip(parts, multipliers))
+
+    @classmethod
+    def parse_lease_seconds(cls, lease_time):
+        """Seconds left on a lease, e.g. `'01:02:03'`, `'26:00:00'`,
+        `'1 day 02:03:04'`, `'2 days, 03:04:05'`, `'3d 04:05:06'` or
+        `'1:02:03:04'`
+        """
+        if not lease_time:
+            return 0
+        try:
+            lease_time = lease_time.strip()
+            days = 0
+            day_part, _, clock = lease_time.rpartition(' ')
+            if day_part:
+                days = int(day_part.split(None, 1)[0].rstrip('dD,'))
+            return days * cls.DAY_SECONDS + cls._parse_clock(clock)
+        except (ValueError, AttributeError) as e:
+            e_m = f'cannot parse lease_time: {lease_time} got e: {e}'
+            raise InvalidLeaseTimeException(e_m)
+
+    def anchor(self, leases, now=None):
+        if now is None:
+            now = self.get_now()
+        expiries = {}
+        for lease in leases or []:
+            lease_time = lease.lease_time
+            if self.is_permanent(lease_time):
+                continue
+            try:
+                seconds = self.parse_lease_seconds(lease_time)
+            except InvalidLeaseTimeException as ilte:
+                log.warning(f'{self.router_name} => skipping lease: {ilte}')
+                continue
+            mac_address = str(lease.macaddress)
+            expiries[mac_address] = LeaseExpiry(
+                lease.hostname,
+                str(lease.ipaddress),
+                mac_address,
+                now + seconds)
+        # swapped in whole, `collect()` may be reading the old one
+        self._expiries = expiries
+        return expiries
+
+    def restore(self, expiries):
+        self._expiries = {expiry.mac_address: expiry for expiry in expiries}
+
+    def get_expiry(self, mac_address):
+        return self._expiries.get(mac_address)
+
+
+class LeaseExpiryCollector(object):
+    """Custom prometheus collector for the time left on every DHCP lease
+
+    Remaining seconds are worked out from the anchored expiries each time
+    prometheus scrapes, so they stay accurate no matter how rarely the
+    lease table itself is fetched.
+    """
+    NAME = 'tp_link_router_exporter_router_ipv4_dhcp_lease_remaining_seconds'
+    DOCUMENTATION = ('The time remaining (s) for an IPv4 DHCP lease, '
+                     'as of this scrape')
+    LABELNAMES = ['router_name', 'hostname', 'ip_address', 'mac_address']
+
+    def __init__(self):
+        super().__init__()
+        self._anchors = {}
+
+    def __repr__(self):
+        return f'LeaseExpiryCollector ({len(self._anchors)})'
+
+    @property
+    def anchors(self):
+        return self._anchors
+
+    def update(self, anchors):
+        updated = dict(self._anchors)
+        updated[anchors.router_name] = anchors
+        self._anchors = updated
+
+    def remove(self, router_name):
+        updated = dict(self._anchors)
+        updated.pop(router_name, None)
+        self._anchors = updated
+
+    def describe(self):
+        return []
+
+    def get_expiries(self):
+        """`(label values, LeaseExpiry)` of every anchored lease"""
+        for router_name, anchors in self._anchors.items():
+            for expiry in anchors.expiries.values():
+                label_values = [
+                    router_name,
+                    expiry.hostname,
+                    expiry.ip_address,
+                    expiry.mac_address,
+                ]
+                yield label_values, expiry
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            self.NAME,
+            self.DOCUMENTATION,
+            labels=self.LABELNAMES)
+        now = LeaseExpiryAnchors.get_now()
+        for label_values, expiry in self.get_expiries():
+            family.add_metric(
+                label_values,
+                expiry.get_remaining_seconds(now))
+        yield family
+
+
+lease_expiry_collector = LeaseExpiryCollector()
@@ -0,0 +1,149 @@
+import os
+import gzip
+import json
+import time
+import tempfile
+import threading
+from flask import current_app as app
+from prometheus_client import generate_latest
+from ..metrics import Metrics
+from ..utils import normalize_bool
+from .env_vars import EnvVars
+from .lease_expiry import LeaseExpiryCollector, lease_expiry_collector
+from .multiprocess_compactor import multiprocess_compactor
+from .scheduler_leader import SchedulerLeader
+
+
+log = app.logger
+
+
+class MetricsRendererException(Exception):
+    pass
+
+
+class MetricsRenderer(object):
+    """Renders the `METRICS_PORT` page once per scrape, in the scheduler
+    leader, for `metrics_server.py` to serve
+
+    Scrapes only mark the page stale. A background thread renders it,
+    plain and gzipped, at most once per `min_interval_seconds`, so routers
+    finishing close together share one render. The time left on each lease
+    is left out, only the expiries are written, for the server to work it
+    out on every pull.
+    """
+    # read by `metrics_server.py`, which cannot import the app
+    FILE_NAME = 'tp_link_router_exporter_metrics.prom'
+    GZIP_FILE_NAME = f'{FILE_NAME}.gz'
+    LEASES_FILE_NAME = 'tp_link_router_exporter_metrics_leases.json'
+    GZIP_LEVEL = 6
+
+    def __init__(self, get_registry, directory=None,
+                 min_interval_seconds=None):
+        super().__init__()
+        self.get_registry = get_registry
+        if not directory:
+            directory = SchedulerLeader.shared().directory
+        self.directory = directory or tempfile.gettempdir()
+        if min_interval_seconds is None:
+            min_interval_seconds = (
+                EnvVars.get_default_prerendered_metrics_min_interval_seconds())
+        self.min_interval_seconds = float(min_interval_seconds)
+        self._stale = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return f'MetricsRenderer ({self.directory})'
+
+    @classmethod
+    def is_enabled(cls):
+        return normalize_bool(EnvVars.get_default_prerendered_metrics())
+
+    def get_path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def _write(self, file_name, body):
+        path = self.get_path(file_name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def collect(self):
+        """Families of the page, `generate_latest()` takes the renderer in
+        place of a registry
+        """
+        for family in self.get_registry().collect():
+            if family.name != LeaseExpiryCollector.NAME:
+                yield family
+
+    @classmethod
+    def _get_label_text(cls, label_names, label_values):
+        labels = []
+        for name, value in zip(label_names, label_values):
+            value = (str(value).replace('\\', r'\\')
+                     .replace('\n', r'\n')
+                     .replace('"', r'\"'))
+            labels.append(f'{name}="{value}"')
+        return '{' + ','.join(labels) + '}'
+
+    @classmethod
+    def get_leases(cls, expiry_collector=None):
+        expiry_collector = expiry_collector or lease_expiry_collector
+        return {
+            'name': LeaseExpiryCollector.NAME,
+            'documentation': LeaseExpiryCollector.DOCUMENTATION,
+            'series': [
+                [
+                    cls._get_label_text(
+                        LeaseExpiryCollector.LABELNAMES,
+                        label_values),
+                    expiry.expires_at,
+                ]
+                for label_values, expiry in expiry_collector.get_expiries()
+            ],
+        }
+
+    @Metrics.METRICS_PRERENDER_TIME.time()
+    def render(self):
+        with Metrics.METRICS_PRERENDER_EXCEPTIONS.count_exceptions():
+            with multiprocess_compactor.reading():
+                plain = generate_latest(self)
+            compressed = gzip.compress(plain, compresslevel=self.GZIP_LEVEL)
+            leases = json.dumps(self.get_leases()).encode('utf-8')
+            # the server re-reads all of them whenever one changes
+            self._write(self.LEASES_FILE_NAME, leases)
+            self._write(self.GZIP_FILE_NAME, compressed)
+            self._write(self.FILE_NAME, plain)
+            Metrics.METRICS_PRERENDER_BYTES.labels(
+                content_encoding='identity').set(len(plain))
+            Metrics.METRICS_PRERENDER_BYTES.labels(
+                content_encoding='gzip').set(len(compressed))
+            r_m = (f'{self} rendered {len(plain)} bytes '
+                   f'({len(compressed)} gzipped)')
+            log.debug(r_m)
+
+    def mark_stale(self):
+        self._stale.set()
+
+    def _run(self):
+        while True:
+            self._stale.wait()
+            self._stale.clear()
+            try:
+                self.render()
+            except Exception as unexp:
+                log.error(f'{self} cannot render, got unexp: {unexp}')
+            time.sleep(self.min_interval_seconds)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name='metrics_renderer',
+            daemon=True)
+        self._thread.start()
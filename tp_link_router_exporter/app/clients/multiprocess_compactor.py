@@ -0,0 +1,373 @@
+import os
+import glob
+import fcntl
+import struct
+import threading
+from contextlib import contextmanager
+from importlib.metadata import version, PackageNotFoundError
+from flask import current_app as app
+from prometheus_client import values as prometheus_values
+from prometheus_client.mmap_dict import MmapedDict
+from ..metrics import Metrics
+from .env_vars import EnvVars
+
+
+log = app.logger
+
+
+class MultiprocessCompactorException(Exception):
+    pass
+
+
+class MultiprocessCompactor(object):
+    """Keeps the `PROMETHEUS_MULTIPROC_DIR` files from only ever growing
+
+    `prometheus_client` appends an entry per label set to the `.db` file of
+    the process writing it and never takes one out, `.remove()` only drops
+    the series from the process, and the files of dead processes stay
+    around. A compaction pass:
+
+    - rewrites this process' own files with only the series it still has
+    - folds the counters, histograms and summaries of dead processes into
+      one `<type>_archive.db` each, so their totals never go backwards
+    - deletes the (per pid) `all` gauges of dead processes, the `live*` ones
+      are already gone (`mark_process_dead()` in gunicorn's `child_exit`)
+
+    Renders take `reading()`, so they never see a half done pass. Rewriting
+    its own files swaps the mmaps under the live values of this process,
+    which needs the internals of exactly `PROMETHEUS_CLIENT_VERSION`. With
+    any other version, or if they don't look as expected, only the files of
+    dead processes are compacted.
+    """
+    ARCHIVE_PID = 'archive'
+    LOCK_FILE_NAME = 'tp_link_router_exporter_compaction.lock'
+    TMP_SUFFIX = '.compacting'
+    PROMETHEUS_CLIENT_VERSION = '0.15.0'
+    # closed over by the methods of the class `MultiProcessValue` returns
+    VALUE_STATE_NAMES = frozenset(['files', 'values', 'lock', 'pid'])
+    VALUE_ATTRIBUTES = ('_file', '_key', '_value')
+    # keeping the values of dead processes makes no sense for these, the
+    # rest is folded into the archive (`gauge_min` / `gauge_max` by min / max)
+    DROPPED_PREFIXES = ('gauge_all',)
+    # deleted by `mark_process_dead()`, never touched here
+    LIVE_PREFIXES = ('gauge_liveall', 'gauge_livesum', 'gauge_livemin',
+                     'gauge_livemax', 'gauge_livemostrecent')
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self._directory = directory
+        self._removed = []
+        self._removed_lock = threading.Lock()
+        self._value_state = None
+        self._value_state_checked = False
+
+    def __repr__(self):
+        return f'MultiprocessCompactor ({self.directory})'
+
+    @property
+    def directory(self):
+        if self._directory:
+            return self._directory
+        return (os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+                or os.environ.get('prometheus_multiproc_dir'))
+
+    @property
+    def is_enabled(self):
+        return bool(self.directory and self.is_multiprocess())
+
+    @classmethod
+    def is_multiprocess(cls, value_class=None):
+        if value_class is None:
+            value_class = prometheus_values.ValueClass
+        return bool(getattr(value_class, '_multiprocess', False))
+
+    @classmethod
+    def get_interval_seconds(cls):
+        return EnvVars.get_default_multiprocess_compaction_interval_seconds()
+
+    @classmethod
+    def get_prometheus_client_version(cls):
+        try:
+            return version('prometheus_client')
+        except PackageNotFoundError:
+            return None
+
+    @classmethod
+    def get_value_state(cls, value_class=None):
+        """`files`, `values`, `lock` and `pid` shared by every multiprocess
+        value of this process, `None` when not in multiprocess mode or not
+        laid out like `PROMETHEUS_CLIENT_VERSION` does
+        """
+        if value_class is None:
+            value_class = prometheus_values.ValueClass
+        if not cls.is_multiprocess(value_class):
+            return None
+        if cls.get_prometheus_client_version() != (
+                cls.PROMETHEUS_CLIENT_VERSION):
+            return None
+        state = {}
+        for method in vars(value_class).values():
+            closure = getattr(method, '__closure__', None) or ()
+            freevars = getattr(getattr(method, '__code__', None),
+                               'co_freevars', ())
+            for name, cell in zip(freevars, closure):
+                state[name] = cell.cell_contents
+        if not cls.VALUE_STATE_NAMES <= state.keys():
+            return None
+        if not (isinstance(state['files'], dict)
+                and isinstance(state['values'], list)
+                and isinstance(state['pid'], dict)
+                and 'value' in state['pid']
+                and hasattr(state['lock'], 'acquire')):
+            return None
+        return state
+
+    @property
+    def value_state(self):
+        """`get_value_state()` of this process, `None` when its own files
+        cannot be compacted
+        """
+        if not self._value_state_checked:
+            self._value_state = self.get_value_state()
+            self._value_state_checked = True
+            if self._value_state is None and self.is_multiprocess():
+                w_m = (f'{self} only compacts files of dead processes, '
+                       f'needs prometheus_client '
+                       f'{self.PROMETHEUS_CLIENT_VERSION}, found: '
+                       f'{self.get_prometheus_client_version()}')
+                log.warning(w_m)
+        return self._value_state
+
+    def get_lock_path(self):
+        return os.path.join(self.directory, self.LOCK_FILE_NAME)
+
+    @contextmanager
+    def _flock(self, operation):
+        directory = self.directory
+        if not directory:
+            yield
+            return
+        with open(self.get_lock_path(), 'a') as lock_file:
+            fcntl.flock(lock_file, operation)
+            yield
+
+    def reading(self):
+        return self._flock(fcntl.LOCK_SH)
+
+    # removed series
+
+    @classmethod
+    def get_child_values(cls, child):
+        child_values = []
+        for value in vars(child).values():
+            candidates = value if isinstance(value, list) else [value]
+            for candidate in candidates:
+                if getattr(candidate, '_multiprocess', False):
+                    child_values.append(candidate)
+        return child_values
+
+    def mark_removed(self, metric, label_values):
+        """Call right before `metric.remove(*label_values)`, so the next
+        pass drops the series from the file too
+        """
+        if self.value_state is None:
+            # nothing would ever take them out again
+            return
+        label_values = tuple(str(v) for v in label_values)
+        child = getattr(metric, '_metrics', {}).get(label_values)
+        if child is None:
+            return
+        with self._removed_lock:
+            self._removed.extend(self.get_child_values(child))
+
+    def _pop_removed(self):
+        with self._removed_lock:
+            removed = self._removed
+            self._removed = []
+            return removed
+
+    # files
+
+    @classmethod
+    def parse_file_name(cls, path):
+        """`(prefix, pid)`, e.g. `('gauge_all', '123')` for
+        `gauge_all_123.db`
+        """
+        prefix, _, pid = os.path.basename(path)[:-len('.db')].rpartition('_')
+        return prefix, pid
+
+    @classmethod
+    def is_pid_alive(cls, pid):
+        try:
+            os.kill(int(pid), 0)
+        except ValueError:
+            # not a pid, e.g. the archive
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def get_files(self):
+        return sorted(glob.glob(os.path.join(self.directory, '*.db')))
+
+    @classmethod
+    def read_entries(cls, path):
+        try:
+            return [
+                (key, value)
+                for key, value, _ in MmapedDict.read_all_values_from_file(path)
+            ]
+        except FileNotFoundError:
+            return []
+
+    def _write_file(self, path, entries):
+        tmp_path = path + self.TMP_SUFFIX
+        mmaped = MmapedDict(tmp_path)
+        try:
+            for key, value in entries:
+                mmaped.write_value(key, value)
+        except Exception:
+            mmaped.close()
+            os.unlink(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        # still open on the same inode, now at `path`
+        mmaped._fname = path
+        return mmaped
+
+    @classmethod
+    def has_value_attributes(cls, values):
+        return all(
+            hasattr(value, name)
+            for value in values
+            for name in cls.VALUE_ATTRIBUTES)
+
+    def _compact_own_files(self, state):
+        """Returns the number of entries dropped"""
+        pid = state['pid']['value']
+        if pid != os.getpid():
+            # forked and not reset yet, the files are not ours
+            return 0
+        removed = {id(v) for v in self._pop_removed()}
+        with state['lock']:
+            files = state['files']
+            values = state['values']
+            if not self.has_value_attributes(values):
+                log.warning(f'{self} values are not laid out as expected, '
+                            f'not compacting own files')
+                return 0
+            live_values = [v for v in values if id(v) not in removed]
+            dropped = 0
+            for prefix, mmaped in list(files.items()):
+                file_values = [v for v in live_values if v._file is mmaped]
+                entries = {v._key: v._value for v in file_values}
+                used_entries = sum(1 for _ in mmaped.read_all_values())
+                if used_entries == len(entries):
+                    continue
+                compacted = self._write_file(mmaped._fname, entries.items())
+                for value in file_values:
+                    value._file = compacted
+                files[prefix] = compacted
+                mmaped.close()
+                dropped += used_entries - len(entries)
+            # the removed values would otherwise live as long as the process
+            values[:] = live_values
+        return dropped
+
+    @classmethod
+    def _merge_entries(cls, prefix, merged, entries):
+        for key, value in entries:
+            if key not in merged:
+                merged[key] = value
+            elif prefix == 'gauge_min':
+                merged[key] = min(merged[key], value)
+            elif prefix == 'gauge_max':
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+
+    def _compact_dead_files(self):
+        """Returns the number of entries dropped"""
+        dead_files = {}
+        for path in self.get_files():
+            prefix, pid = self.parse_file_name(path)
+            if prefix in self.LIVE_PREFIXES:
+                continue
+            if not self.is_pid_alive(pid):
+                dead_files.setdefault(prefix, []).append(path)
+        dropped = 0
+        for prefix, paths in dead_files.items():
+            if prefix in self.DROPPED_PREFIXES:
+                for path in paths:
+                    dropped += len(self.read_entries(path))
+                    os.unlink(path)
+                continue
+            archive_path = os.path.join(
+                self.directory,
+                f'{prefix}_{self.ARCHIVE_PID}.db')
+            merged = dict(self.read_entries(archive_path))
+            entries_count = len(merged)
+            for path in paths:
+                entries = self.read_entries(path)
+                entries_count += len(entries)
+                self._merge_entries(prefix, merged, entries)
+            self._write_file(archive_path, merged.items()).close()
+            for path in paths:
+                os.unlink(path)
+            dropped += entries_count - len(merged)
+        return dropped
+
+    @classmethod
+    def get_used_bytes(cls, path):
+        # files are preallocated, the header says how much is written
+        with open(path, 'rb') as f:
+            header = f.read(4)
+        if len(header) < 4:
+            return 0
+        return struct.unpack('i', header)[0]
+
+    def get_file_stats(self):
+        """`(files, used bytes, entries)` over every file"""
+        files = 0
+        used_bytes = 0
+        entries = 0
+        for path in self.get_files():
+            try:
+                used_bytes += self.get_used_bytes(path)
+            except FileNotFoundError:
+                continue
+            files += 1
+            entries += len(self.read_entries(path))
+        return files, used_bytes, entries
+
+    def _record_file_stats(self):
+        files, used_bytes, entries = self.get_file_stats()
+        Metrics.MULTIPROCESS_FILES.set(files)
+        Metrics.MULTIPROCESS_FILES_BYTES.set(used_bytes)
+        Metrics.MULTIPROCESS_FILES_ENTRIES.set(entries)
+        return files, used_bytes, entries
+
+    @Metrics.MULTIPROCESS_COMPACTION_TIME.time()
+    def compact(self):
+        """One compaction pass, returns the number of entries dropped"""
+        if not self.is_enabled:
+            log.debug(f'{self} not in multiprocess mode, skipping')
+            return 0
+        state = self.value_state
+        with Metrics.MULTIPROCESS_COMPACTION_EXCEPTIONS.count_exceptions():
+            with self._flock(fcntl.LOCK_EX):
+                dropped = 0
+                if state is not None:
+                    dropped += self._compact_own_files(state)
+                dropped += self._compact_dead_files()
+            Metrics.MULTIPROCESS_COMPACTION_DROPPED_ENTRIES_TOTAL.inc(dropped)
+            files, used_bytes, entries = self._record_file_stats()
+            c_m = (f'{self} dropped {dropped} entries, left {entries} '
+                   f'entries in {files} files ({used_bytes} bytes)')
+            log.info(c_m)
+            return dropped
+
+
+multiprocess_compactor = MultiprocessCompactor()
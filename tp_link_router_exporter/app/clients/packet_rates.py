@@ -0,0 +1,74 @@
+class PacketRatesException(Exception):
+    pass
+
+
+class PacketRate(object):
+    """Last packet count of one device and action, and what it added up to"""
+    __slots__ = ('packets', 'observed_at', 'total', 'per_second')
+
+    def __init__(self, packets, observed_at):
+        super().__init__()
+        self.packets = packets
+        # `None` once the device left, it has no rate until seen twice again
+        self.observed_at = observed_at
+        self.total = 0
+        self.per_second = None
+
+    def __repr__(self):
+        return (f'PacketRate ({self.packets}) => total: {self.total}, '
+                f'per second: {self.per_second}')
+
+
+class PacketRates(object):
+    """Turns the packet counts a router reports into a total that only ever
+    goes up and a per second rate, by MAC address and packet action
+
+    The router's counts start over whenever it reboots or a device
+    reconnects. A count lower than the one before is taken as such a reset,
+    with the whole new count sent since. Totals start at `0` when a device
+    is first seen, so an exporter restart is just another counter reset.
+    """
+    def __init__(self):
+        super().__init__()
+        # mac address => {packet action: PacketRate}
+        self._rates = {}
+
+    def __repr__(self):
+        return f'PacketRates => {len(self._rates)}'
+
+    def __len__(self):
+        return len(self._rates)
+
+    def get(self, mac_address, packet_action):
+        return self._rates.get(mac_address, {}).get(packet_action)
+
+    def observe(self, mac_address, packet_action, packets, now):
+        """`(increase, reset)` of the total, `now` is a monotonic time"""
+        rates = self._rates.setdefault(mac_address, {})
+        rate = rates.get(packet_action)
+        if rate is None:
+            rates[packet_action] = PacketRate(packets, now)
+            return 0, False
+        reset = bool(packets < rate.packets)
+        increase = packets if reset else packets - rate.packets
+        elapsed = None
+        if rate.observed_at is not None:
+            elapsed = now - rate.observed_at
+        rate.per_second = None
+        if elapsed and elapsed > 0:
+            rate.per_second = increase / elapsed
+        rate.packets = packets
+        rate.observed_at = now
+        rate.total += increase
+        return increase, reset
+
+    def mark_disconnected(self, mac_address):
+        """The `PacketRate`s of a device that left, now at `0` per second"""
+        rates = self._rates.get(mac_address, {})
+        for rate in rates.values():
+            rate.observed_at = None
+            rate.per_second = 0.0
+        return rates
+
+    def pop_mac(self, mac_address):
+        self._rates.pop(mac_address, None)
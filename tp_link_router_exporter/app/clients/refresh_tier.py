@@ -0,0 +1,52 @@
+import time
+
+
+class RefreshTierException(Exception):
+    pass
+
+
+class RefreshTier(object):
+    """Last result fetched from one router endpoint and how long it lasts
+
+    A `refresh_seconds` of `0` means the endpoint is fetched every scrape.
+    """
+    # scheduler ticks jitter a little, don't skip a refresh because of it
+    REFRESH_SLACK_SECONDS = 1.0
+
+    def __init__(self, endpoint, refresh_seconds):
+        super().__init__()
+        self.endpoint = endpoint
+        self.refresh_seconds = float(refresh_seconds or 0)
+        self._result = None
+        self._fetched_at = None
+
+    def __repr__(self):
+        return (f'RefreshTier ({self.endpoint.label_string}) '
+                f'every {self.refresh_seconds}s => {self._fetched_at}')
+
+    @classmethod
+    def get_now(cls):
+        return time.monotonic()
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def has_result(self):
+        return bool(self._fetched_at is not None)
+
+    def is_due(self, now=None):
+        if not self.has_result or self.refresh_seconds <= 0:
+            return True
+        if now is None:
+            now = self.get_now()
+        elapsed = now - self._fetched_at
+        return bool(elapsed + self.REFRESH_SLACK_SECONDS
+                    >= self.refresh_seconds)
+
+    def update(self, result, now=None):
+        if now is None:
+            now = self.get_now()
+        self._result = result
+        self._fetched_at = now
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from flask import current_app as app
+from .env_vars import EnvVars
+
+
+log = app.logger
+
+
+class RouterLockException(Exception):
+    pass
+
+
+class RouterLockTimeoutException(RouterLockException):
+    pass
+
+
+class RouterLock(object):
+    """One caller at a time per router, across threads and gunicorn workers
+
+    The TP-Link web interface only allows one logged in session, so two
+    callers talking to the same router kick each other out. A thread lock per
+    `router_ip` queues up callers within the process, and an `flock` on a
+    file per `router_ip` in `directory` queues up the other processes. The
+    file lock goes away with the process, so a crashed worker never leaves a
+    router locked.
+    """
+    FILE_SUFFIX = '.lock'
+    # `flock` cannot time out on its own, so a non-blocking one is retried
+    POLL_SECONDS = 0.05
+    _thread_locks = {}
+    _thread_locks_lock = threading.Lock()
+
+    def __init__(self, router_ip, directory=None, timeout_seconds=None):
+        super().__init__()
+        self.router_ip = router_ip
+        if not directory:
+            directory = EnvVars.get_default_router_lock_dir()
+        self.directory = directory or tempfile.gettempdir()
+        if timeout_seconds is None:
+            timeout_seconds = EnvVars.get_default_router_lock_timeout_seconds()
+        self.timeout_seconds = float(timeout_seconds)
+        self._thread_lock = self._get_thread_lock(router_ip)
+        self._file = None
+
+    def __repr__(self):
+        return f'RouterLock ({self.router_ip}) => {self.get_path()}'
+
+    @classmethod
+    def get_lock(cls, router_ip, **kwargs):
+        return cls(router_ip, **kwargs)
+
+    @classmethod
+    def _get_thread_lock(cls, router_ip):
+        with cls._thread_locks_lock:
+            thread_lock = cls._thread_locks.get(router_ip)
+            if thread_lock is None:
+                thread_lock = threading.Lock()
+                cls._thread_locks[router_ip] = thread_lock
+            return thread_lock
+
+    @classmethod
+    def get_now(cls):
+        return time.monotonic()
+
+    def get_path(self):
+        file_name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(self.router_ip))
+        return os.path.join(
+            self.directory,
+            f'tp_link_router_{file_name}{self.FILE_SUFFIX}')
+
+    def _open_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return open(self.get_path(), 'a')
+
+    def _try_flock(self, lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _acquire_file(self, deadline):
+        lock_file = self._open_file()
+        try:
+            while not self._try_flock(lock_file):
+                if self.get_now() >= deadline:
+                    lock_file.close()
+                    return False
+                time.sleep(self.POLL_SECONDS)
+        except Exception:
+            lock_file.close()
+            raise
+        self._file = lock_file
+        return True
+
+    def acquire(self, timeout_seconds=None):
+        if timeout_seconds is None:
+            timeout_seconds = self.timeout_seconds
+        deadline = self.get_now() + timeout_seconds
+        if not self._thread_lock.acquire(timeout=max(timeout_seconds, 0)):
+            return False
+        try:
+            acquired = self._acquire_file(deadline)
+        except Exception:
+            self._thread_lock.release()
+            raise
+        if not acquired:
+            self._thread_lock.release()
+        return acquired
+
+    def release(self):
+        lock_file = self._file
+        self._file = None
+        try:
+            if lock_file:
+                # closing the file drops the `flock`
+                lock_file.close()
+        finally:
+            self._thread_lock.release()
+
+    @contextmanager
+    def hold(self, timeout_seconds=None):
+        """Yields whether the lock was acquired, callers decide what to do"""
+        acquired = self.acquire(timeout_seconds)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+    @contextmanager
+    def hold_or_raise(self, timeout_seconds=None):
+        if timeout_seconds is None:
+            timeout_seconds = self.timeout_seconds
+        with self.hold(timeout_seconds) as acquired:
+            if not acquired:
+                raise RouterLockTimeoutException(
+                    f'{self.router_ip} still busy after waiting '
+                    f'{timeout_seconds}s')
+            yield
@@ -0,0 +1,127 @@
+from collections import namedtuple
+from flask import current_app as app
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from ..utils import global_get_now
+
+
+log = app.logger
+
+
+RouterSnapshotFamily = namedtuple(
+    'RouterSnapshotFamily',
+    ['name', 'documentation', 'type', 'labelnames', 'samples'])
+
+
+class RouterSnapshotException(Exception):
+    pass
+
+
+class RouterSnapshot(object):
+    """Immutable set of every gauge and counter value recorded in one router
+    scrape
+    """
+    __slots__ = ('router_name', 'created_date', 'families')
+
+    def __init__(self, router_name, created_date, families):
+        super().__init__()
+        self.router_name = router_name
+        self.created_date = created_date
+        self.families = tuple(families)
+
+    def __repr__(self):
+        samples_count = sum(len(f.samples) for f in self.families)
+        return (f'RouterSnapshot ({self.router_name}) '
+                f'({self.created_date}) => {samples_count} samples')
+
+
+class RouterSnapshotBuilder(object):
+    def __init__(self, router_name):
+        super().__init__()
+        self.router_name = router_name
+        # gauge => (labelnames, {label values: value})
+        self._families = {}
+
+    def add(self, gauge, value, **labels):
+        self.add_values(
+            gauge,
+            tuple(labels.keys()),
+            tuple(str(v) for v in labels.values()),
+            value)
+
+    def add_values(self, gauge, labelnames, label_values, value):
+        family = self._families.get(gauge)
+        if family is None:
+            family = (labelnames, {})
+            self._families[gauge] = family
+        # same labels twice in one scrape keeps the last, like `.set()` does
+        family[1][label_values] = float(value)
+
+    def build(self):
+        families = []
+        for gauge, (labelnames, samples) in self._families.items():
+            described = gauge.describe()[0]
+            families.append(RouterSnapshotFamily(
+                described.name,
+                described.documentation,
+                described.type,
+                labelnames,
+                tuple(samples.items())))
+        return RouterSnapshot(self.router_name, global_get_now(), families)
+
+
+class RouterSnapshotCollector(object):
+    """Custom prometheus collector over the latest snapshot of every router
+
+    Metric families are only produced when prometheus scrapes, recording a
+    router scrape is a single swap of its snapshot.
+    """
+    def __init__(self):
+        super().__init__()
+        self._snapshots = {}
+
+    def __repr__(self):
+        return f'RouterSnapshotCollector ({len(self._snapshots)})'
+
+    @property
+    def snapshots(self):
+        return self._snapshots
+
+    def get_snapshot(self, router_name):
+        return self._snapshots.get(router_name)
+
+    def update(self, snapshot):
+        # copy and swap, readers always see a complete dict
+        snapshots = dict(self._snapshots)
+        snapshots[snapshot.router_name] = snapshot
+        self._snapshots = snapshots
+        log.debug(f'updated snapshot: {snapshot}')
+
+    def remove(self, router_name):
+        snapshots = dict(self._snapshots)
+        snapshots.pop(router_name, None)
+        self._snapshots = snapshots
+
+    def describe(self):
+        # keeps `CollectorRegistry.register` from calling `collect`
+        return []
+
+    def collect(self):
+        metric_families = {}
+        for snapshot in self._snapshots.values():
+            for family in snapshot.families:
+                metric_family = metric_families.get(family.name)
+                if metric_family is None:
+                    family_class = GaugeMetricFamily
+                    if family.type == 'counter':
+                        family_class = CounterMetricFamily
+                    metric_family = family_class(
+                        family.name,
+                        family.documentation,
+                        labels=family.labelnames)
+                    metric_families[family.name] = metric_family
+                for label_values, value in family.samples:
+                    metric_family.add_metric(label_values, value)
+        return list(metric_families.values())
+
+
+router_snapshot_collector = RouterSnapshotCollector()
@@ -0,0 +1,174 @@
+import os
+import fcntl
+import tempfile
+import threading
+from flask import current_app as app
+from .env_vars import EnvVars
+
+
+log = app.logger
+
+
+class SchedulerLeaderException(Exception):
+    pass
+
+
+class SchedulerLeaderDirectoryException(SchedulerLeaderException):
+    pass
+
+
+class SchedulerLeader(object):
+    """Elects the one process (gunicorn worker) that scrapes on a schedule
+
+    Every worker builds the whole app, so without this each would run its
+    own scheduler and scrape every router in parallel. The worker holding an
+    `flock` on `FILE_NAME` is the leader and schedules the scrapes, the
+    others only serve requests. Followers wait on the same `flock` in a
+    background thread: it is dropped the moment the leader dies, so one of
+    them takes over right away.
+
+    Gunicorn must not preload the app, the master would otherwise take
+    (and its forked workers share) the leadership.
+
+    The leader's state, its request socket and this lock all live in
+    `directory`, which must be private to the user running the workers.
+    """
+    FILE_NAME = 'tp_link_router_exporter_scheduler_leader.lock'
+    STATE_FILE_NAME = 'tp_link_router_exporter_scheduler_leader.state'
+    DIRECTORY_PREFIX = 'tp_link_router_exporter_'
+    DIRECTORY_MODE = 0o700
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, directory=None):
+        super().__init__()
+        if not directory:
+            directory = EnvVars.get_default_scheduler_leader_dir()
+        self.directory = directory or self.get_default_directory()
+        self._directory_checked = False
+        self._file = None
+        self._started = False
+
+    def __repr__(self):
+        return f'SchedulerLeader ({self.get_path()}) => {self.is_leader}'
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def get_default_directory(cls):
+        # one per user, the system temp directory itself is shared
+        return os.path.join(
+            tempfile.gettempdir(),
+            f'{cls.DIRECTORY_PREFIX}{os.getuid()}')
+
+    def ensure_directory(self):
+        """Creates `directory` if needed, refusing one that is not owned by
+        this user or that anyone else can write to
+        """
+        if self._directory_checked:
+            return self.directory
+        os.makedirs(self.directory, mode=self.DIRECTORY_MODE, exist_ok=True)
+        stat = os.stat(self.directory)
+        if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+            e_m = (f'{self} directory: {self.directory} must be owned by '
+                   f'uid: {os.getuid()} and not writable by group or others, '
+                   f'found uid: {stat.st_uid} with mode: '
+                   f'{oct(stat.st_mode & 0o777)}')
+            log.error(e_m)
+            raise SchedulerLeaderDirectoryException(e_m)
+        self._directory_checked = True
+        return self.directory
+
+    def get_path(self):
+        return os.path.join(self.directory, self.FILE_NAME)
+
+    def get_state_path(self):
+        return os.path.join(self.directory, self.STATE_FILE_NAME)
+
+    @property
+    def is_leader(self):
+        return bool(self._file is not None)
+
+    @property
+    def is_follower(self):
+        # without an election (no scheduled scrapes) every process is alone
+        return bool(self._started and not self.is_leader)
+
+    def get_leader_pid(self):
+        try:
+            with open(self.get_path()) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _open_file(self):
+        self.ensure_directory()
+        fd = os.open(self.get_path(), os.O_RDWR | os.O_CREAT, 0o600)
+        return open(fd, 'a+')
+
+    def _lock_file(self, lock_file, blocking):
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file, flags)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _become_leader(self, lock_file):
+        # kept open for the life of the process, closing it steps down
+        self._file = lock_file
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+
+    def _wait_for_leadership(self, on_elected):
+        lock_file = self._open_file()
+        try:
+            # releases the GIL, blocks until the leader goes away
+            self._lock_file(lock_file, blocking=True)
+        except Exception as unexp:
+            lock_file.close()
+            log.error(f'{self} stopped waiting for leadership: {unexp}')
+            return
+        previous_pid = self.get_leader_pid()
+        self._become_leader(lock_file)
+        t_m = (f'{self} took over scheduling in pid: {os.getpid()} '
+               f'from dead leader pid: {previous_pid}')
+        log.warning(t_m)
+        try:
+            on_elected()
+        except Exception as unexp:
+            log.error(f'{self} could not schedule after taking over: {unexp}')
+
+    def start(self, on_elected):
+        """Calls `on_elected` once this process leads, right away or after
+        the current leader dies. Returns whether it leads right away.
+        """
+        if self._started:
+            raise SchedulerLeaderException(f'{self} already started')
+        self._started = True
+        lock_file = self._open_file()
+        if self._lock_file(lock_file, blocking=False):
+            self._become_leader(lock_file)
+            log.info(f'{self} elected pid: {os.getpid()}')
+            on_elected()
+            return True
+        lock_file.close()
+        l_m = (f'{self} following leader pid: {self.get_leader_pid()} '
+               f'from pid: {os.getpid()}')
+        log.info(l_m)
+        thread = threading.Thread(
+            target=self._wait_for_leadership,
+            args=(on_elected,),
+            name='scheduler_leader_election',
+            daemon=True)
+        thread.start()
+        return False
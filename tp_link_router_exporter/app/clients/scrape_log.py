@@ -0,0 +1,84 @@
+import re
+import logging
+from flask import current_app as app
+from ..metrics import Metrics
+
+
+log = app.logger
+
+
+class ScrapeLogException(Exception):
+    pass
+
+
+class ScrapeLog(object):
+    """Debug logging for one router's scrape pipeline
+
+    Messages take `%` style args, so nothing is formatted unless a record is
+    actually emitted. Each router logs through its own child of the app
+    logger, so its level can be raised or lowered on its own. Per record
+    messages (one per device, lease, reservation, ...) go through
+    `sampled_debug`, which only lets 1 in `sample_rate` of them through per
+    key and counts the rest as suppressed.
+    """
+    LOGGER_PREFIX = 'routers'
+
+    def __init__(self, router_name, level=None, sample_rate=1):
+        super().__init__()
+        self.router_name = router_name
+        self.logger = log.getChild(
+            f'{self.LOGGER_PREFIX}.{self.get_logger_suffix(router_name)}')
+        self.set_level(level)
+        self.sample_rate = max(int(sample_rate or 1), 1)
+        self._sample_counts = {}
+        self._suppressed = Metrics.SCRAPE_LOG_SUPPRESSED_TOTAL.labels(
+            router_name=router_name)
+
+    def __repr__(self):
+        return (f'ScrapeLog ({self.router_name}) => '
+                f'level: {logging.getLevelName(self.logger.level)}, '
+                f'sample_rate: {self.sample_rate}')
+
+    @classmethod
+    def get_logger_suffix(cls, router_name):
+        # dots would nest the router under another router's logger
+        return re.sub(r'[^A-Za-z0-9_-]', '_', str(router_name))
+
+    def set_level(self, level):
+        if not level:
+            self.logger.setLevel(logging.NOTSET)
+            return
+        try:
+            self.logger.setLevel(str(level).strip().upper())
+        except ValueError:
+            log.error(f'{self.router_name} => unknown log level: {level}, '
+                      f'using the app log level')
+            self.logger.setLevel(logging.NOTSET)
+
+    @property
+    def is_debug(self):
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, msg, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self.logger.debug(
+            '%s => ' + msg,
+            self.router_name,
+            *args,
+            stacklevel=2)
+
+    def sampled_debug(self, key, msg, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._sample_counts.get(key, 0)
+        self._sample_counts[key] = count + 1
+        if count % self.sample_rate:
+            self._suppressed.inc()
+            return
+        self.logger.debug(
+            '%s => (1 in %s) ' + msg,
+            self.router_name,
+            self.sample_rate,
+            *args,
+            stacklevel=2)
@@ -0,0 +1,65 @@
+from flask import current_app as app
+from ..common.series_writes import SeriesWrites
+
+
+log = app.logger
+
+
+class SeriesWriteCacheException(Exception):
+    pass
+
+
+class SeriesWriteCache(object):
+    """Last value written to every series one collector owns
+
+    Most of what a router reports is the same scrape after scrape, so a
+    write is only let through when the value differs from the last one.
+    Keys are `(gauge, label values)`, label values as strings in the order
+    the gauge declares them, the same way `.remove()` takes them.
+    """
+    def __init__(self):
+        super().__init__()
+        # (gauge, label values) => value
+        self._values = {}
+        self._counts = dict.fromkeys(SeriesWrites, 0)
+
+    def __repr__(self):
+        return f'SeriesWriteCache => {len(self._values)}'
+
+    def __len__(self):
+        return len(self._values)
+
+    @classmethod
+    def get_key(cls, gauge, labels):
+        return (
+            gauge,
+            tuple(str(labels[name]) for name in gauge._labelnames))
+
+    @classmethod
+    def get_removal_key(cls, gauge, label_values):
+        return (gauge, tuple(str(v) for v in label_values))
+
+    def should_write(self, key, value):
+        """Remembers `value` and whether it needs writing"""
+        values = self._values
+        if key not in values:
+            self._counts[SeriesWrites.ADDED] += 1
+        elif values[key] == value:
+            self._counts[SeriesWrites.UNCHANGED] += 1
+            return False
+        else:
+            self._counts[SeriesWrites.CHANGED] += 1
+        values[key] = value
+        return True
+
+    def forget(self, key):
+        """A removed series is written again the next time it shows up"""
+        if key not in self._values:
+            return
+        del self._values[key]
+        self._counts[SeriesWrites.REMOVED] += 1
+
+    def pop_counts(self):
+        counts = self._counts
+        self._counts = dict.fromkeys(SeriesWrites, 0)
+        return counts
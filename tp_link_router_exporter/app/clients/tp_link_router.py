@@ -1,4 +1,6 @@
 import os
+import re
+import time
 from tplinkrouterc6u import TplinkRouter
 from flask import current_app as app
 from .env_vars import EnvVars
@@ -20,7 +22,30 @@ class TPLinkRouterException(Exception):
     pass
 
 
+class TPLinkRouterDecryptException(TPLinkRouterException):
+    pass
+
+
+class SessionTplinkRouter(TplinkRouter):
+    """`TplinkRouter` whose responses that cannot be decrypted (sent with
+    the key of another session) can be told apart from other errors
+    """
+    DECRYPT_ERROR = 'cannot decrypt response'
+
+    def _decrypt_response(self, data):
+        try:
+            return super()._decrypt_response(data)
+        except Exception as e:
+            # only its message makes it into the `ClientError`
+            raise TPLinkRouterDecryptException(f'{self.DECRYPT_ERROR}: {e}')
+
+
 class TPLinkRouter(object):
+    # what the router answers on a session it no longer knows, e.g.
+    # `{'success': False, 'errorcode': 'timeout'}`
+    SESSION_ERROR_PATTERN = re.compile(
+        r'errorcode[\'"]?\s*:\s*[\'"]timeout[\'"]')
+
     @classmethod
     def get_client(cls, **kwargs):
         return cls(**kwargs)
@@ -53,19 +78,59 @@ class TPLinkRouter(object):
         i_m = (f'creating client for router_ip: {router_ip}')
         log.debug(i_m)
         self._router = None
+        self._authorized_at = None
+        self._last_used_at = None
 
     @property
     def router(self):
         if self._router:
             return self._router
-        self._router = TplinkRouter(
+        self._router = SessionTplinkRouter(
             self.router_ip,
             self.router_password,
             timeout=TP_LINK_ROUTER_TIMEOUT)
         return self._router
 
+    @classmethod
+    def get_now(cls):
+        return time.monotonic()
+
+    @classmethod
+    def is_session_error(cls, exc):
+        """Whether a failed request (`ClientError`) was turned away because
+        of its session, rather than the router failing it
+        """
+        message = str(exc)
+        if SessionTplinkRouter.DECRYPT_ERROR in message:
+            return True
+        return bool(cls.SESSION_ERROR_PATTERN.search(message))
+
+    @property
+    def is_authorized(self):
+        return bool(self._authorized_at is not None)
+
+    @property
+    def session_age_seconds(self):
+        if not self.is_authorized:
+            return None
+        return self.get_now() - self._authorized_at
+
+    @property
+    def session_idle_seconds(self):
+        if not self._last_used_at:
+            return None
+        return self.get_now() - self._last_used_at
+
+    def mark_used(self):
+        self._last_used_at = self.get_now()
+
+    def invalidate_session(self):
+        self._authorized_at = None
+
     def authorize(self):
         self.router.authorize()
+        self._authorized_at = self.get_now()
+        self.mark_used()
 
     def get_firmware(self):
         # Get firmware info - returns Firmware
@@ -95,4 +160,7 @@ class TPLinkRouter(object):
         return ipv4_dhcp_leases
 
     def logout(self):
-        self.router.logout()
+        try:
+            self.router.logout()
+        finally:
+            self.invalidate_session()
@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+class CircuitBreakerStates(Enum):
+    # the router is scraped as usual
+    CLOSED = 'closed'
+    # the router kept failing, it is skipped until the backoff is over
+    OPEN = 'open'
+    # the backoff is over, the next scrape decides whether to close or reopen
+    HALF_OPEN = 'half_open'
+
+    @property
+    def label_string(self):
+        return self.value
+
+    @classmethod
+    def metrics_states_list(cls):
+        return list([
+            cls.CLOSED,
+            cls.OPEN,
+            cls.HALF_OPEN,
+        ])
@@ -6,7 +6,58 @@ class ConfigKeys(Enum):
     ROUTER_NAME = 'router_name'
     ROUTER_IP = 'router_ip'
     ROUTER_PASSWORD = 'router_password'
+    INTERVAL_SECONDS = 'interval_seconds'
+    OFFSET_SECONDS = 'offset_seconds'
+    SESSION_REUSE = 'session_reuse'
+    SESSION_TTL_SECONDS = 'session_ttl_seconds'
+    SESSION_IDLE_LOGOUT_SECONDS = 'session_idle_logout_seconds'
+    DEVICE_EVICTION_TTL_SECONDS = 'device_eviction_ttl_seconds'
+    DEVICE_HISTORY_SAMPLES = 'device_history_samples'
+    DEVICE_HISTORY_MAX_DEVICES = 'device_history_max_devices'
+    LOG_LEVEL = 'log_level'
+    ON_DEMAND_TTL_SECONDS = 'on_demand_ttl_seconds'
+    LOG_SAMPLE_RATE = 'log_sample_rate'
+    ROUTER_LOCK_TIMEOUT_SECONDS = 'router_lock_timeout_seconds'
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = 'circuit_breaker_failure_threshold'
+    CIRCUIT_BREAKER_BASE_SECONDS = 'circuit_breaker_base_seconds'
+    CIRCUIT_BREAKER_MAX_SECONDS = 'circuit_breaker_max_seconds'
+    ADAPTIVE_INTERVAL = 'adaptive_interval'
+    ADAPTIVE_INTERVAL_MIN_SECONDS = 'adaptive_interval_min_seconds'
+    ADAPTIVE_INTERVAL_MAX_SECONDS = 'adaptive_interval_max_seconds'
+    FIRMWARE_REFRESH_SECONDS = 'firmware_refresh_seconds'
+    STATUS_REFRESH_SECONDS = 'status_refresh_seconds'
+    IPV4_RESERVATIONS_REFRESH_SECONDS = 'ipv4_reservations_refresh_seconds'
+    IPV4_DHCP_LEASES_REFRESH_SECONDS = 'ipv4_dhcp_leases_refresh_seconds'
+    MAX_CONCURRENT_ROUTERS = 'max_concurrent_routers'
+    SCRAPE_ENGINE = 'scrape_engine'
 
     @property
     def key_name(self):
         return self.value
+
+    @classmethod
+    def router_option_keys(cls):
+        return list([
+            cls.INTERVAL_SECONDS,
+            cls.OFFSET_SECONDS,
+            cls.SESSION_REUSE,
+            cls.SESSION_TTL_SECONDS,
+            cls.SESSION_IDLE_LOGOUT_SECONDS,
+            cls.DEVICE_EVICTION_TTL_SECONDS,
+            cls.DEVICE_HISTORY_SAMPLES,
+            cls.DEVICE_HISTORY_MAX_DEVICES,
+            cls.LOG_LEVEL,
+            cls.LOG_SAMPLE_RATE,
+            cls.ON_DEMAND_TTL_SECONDS,
+            cls.ROUTER_LOCK_TIMEOUT_SECONDS,
+            cls.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            cls.CIRCUIT_BREAKER_BASE_SECONDS,
+            cls.CIRCUIT_BREAKER_MAX_SECONDS,
+            cls.ADAPTIVE_INTERVAL,
+            cls.ADAPTIVE_INTERVAL_MIN_SECONDS,
+            cls.ADAPTIVE_INTERVAL_MAX_SECONDS,
+            cls.FIRMWARE_REFRESH_SECONDS,
+            cls.STATUS_REFRESH_SECONDS,
+            cls.IPV4_RESERVATIONS_REFRESH_SECONDS,
+            cls.IPV4_DHCP_LEASES_REFRESH_SECONDS,
+        ])
@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class LeaderRequestTypes(Enum):
+    UPDATE_ALL = 'update_all'
+    UPDATE_STALE = 'update_stale'
+    UPDATE_SIMPLE = 'update_simple'
+
+    @property
+    def label_string(self):
+        return self.value
@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class MetricsRecordingModes(Enum):
+    # every value is set on a prometheus `Gauge` child as it is scraped
+    GAUGES = 'gauges'
+    # values are collected into one immutable snapshot per router scrape
+    SNAPSHOT = 'snapshot'
+
+    DEFAULT = GAUGES
+
+    @property
+    def label_string(self):
+        return self.value
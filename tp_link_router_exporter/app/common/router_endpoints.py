@@ -0,0 +1,29 @@
+from enum import Enum
+
+
+class RouterEndpoints(Enum):
+    FIRMWARE = 'firmware'
+    STATUS = 'status'
+    IPV4_RESERVATIONS = 'ipv4_reservations'
+    IPV4_DHCP_LEASES = 'ipv4_dhcp_leases'
+
+    @property
+    def label_string(self):
+        return self.value
+
+    @property
+    def refresh_seconds_key_name(self):
+        return f'{self.value}_refresh_seconds'
+
+    @property
+    def refresh_seconds_env_var(self):
+        return self.refresh_seconds_key_name.upper()
+
+    @classmethod
+    def metrics_endpoints_list(cls):
+        return list([
+            cls.FIRMWARE,
+            cls.STATUS,
+            cls.IPV4_RESERVATIONS,
+            cls.IPV4_DHCP_LEASES,
+        ])
@@ -0,0 +1,12 @@
+from enum import Enum
+
+
+class ScrapeEngines(Enum):
+    SYNC = 'sync'
+    ASYNC = 'async'
+
+    DEFAULT = SYNC
+
+    @property
+    def label_string(self):
+        return self.value
@@ -21,6 +21,23 @@ class ScrapeEvents(Enum):
         'attempt_device_cached_router_metrics'
     RECORD_MISSING_DEVICES = 'record_missing_devices'
     DROP_ALL_STALE_DEVICES = 'drop_all_stale_devices'
+    EVICT_DEPARTED_DEVICES = 'evict_departed_devices'
+    SAVE_DEVICE_CACHE = 'save_device_cache'
+    SESSION_REUSED = 'session_reused'
+    SESSION_EXPIRED = 'session_expired'
+    SESSION_REAUTHORIZE = 'session_reauthorize'
+    SESSION_IDLE_LOGOUT = 'session_idle_logout'
+    RECORD_CACHED_RESULT = 'record_cached_result'
+    RECORD_CACHED_ROUTER_METRICS = 'record_cached_router_metrics'
+    PUBLISH_SNAPSHOT = 'publish_snapshot'
+    ON_DEMAND_SCRAPE = 'on_demand_scrape'
+    ON_DEMAND_FRESH = 'on_demand_fresh'
+    SKIP_IN_FLIGHT_SCRAPE = 'skip_in_flight_scrape'
+    ROUTER_LOCK_WAIT = 'router_lock_wait'
+    ROUTER_LOCK_TIMEOUT = 'router_lock_timeout'
+    AUTHORIZE_ERROR = 'authorize_error'
+    SKIP_LOGOUT = 'skip_logout'
+    CIRCUIT_BREAKER_SKIP = 'circuit_breaker_skip'
     SUCCESS = 'success'
     ERROR = 'error'
 
@@ -0,0 +1,43 @@
+from enum import Enum
+from .router_endpoints import RouterEndpoints
+
+
+class ScrapePhases(Enum):
+    # the whole scrape, from taking the router lock to releasing it
+    SCRAPE = 'scrape'
+    AUTHORIZE = 'authorize'
+    GET_FIRMWARE = 'get_firmware'
+    GET_STATUS = 'get_status'
+    GET_IPV4_RESERVATIONS = 'get_ipv4_reservations'
+    GET_IPV4_DHCP_LEASES = 'get_ipv4_dhcp_leases'
+    RECORD_FIRMWARE = 'record_firmware'
+    # includes `record_devices`
+    RECORD_STATUS_AND_DEVICES = 'record_status_and_devices'
+    RECORD_DEVICES = 'record_devices'
+    RECORD_IPV4_RESERVATIONS = 'record_ipv4_reservations'
+    RECORD_IPV4_DHCP_LEASES = 'record_ipv4_dhcp_leases'
+    LOGOUT = 'logout'
+    STALE_DEVICE_SWEEP = 'stale_device_sweep'
+    SAVE_DEVICE_CACHE = 'save_device_cache'
+
+    @property
+    def label_string(self):
+        return self.value
+
+    @classmethod
+    def get_fetch_phase(cls, endpoint):
+        return {
+            RouterEndpoints.FIRMWARE: cls.GET_FIRMWARE,
+            RouterEndpoints.STATUS: cls.GET_STATUS,
+            RouterEndpoints.IPV4_RESERVATIONS: cls.GET_IPV4_RESERVATIONS,
+            RouterEndpoints.IPV4_DHCP_LEASES: cls.GET_IPV4_DHCP_LEASES,
+        }[endpoint]
+
+    @classmethod
+    def get_record_phase(cls, endpoint):
+        return {
+            RouterEndpoints.FIRMWARE: cls.RECORD_FIRMWARE,
+            RouterEndpoints.STATUS: cls.RECORD_STATUS_AND_DEVICES,
+            RouterEndpoints.IPV4_RESERVATIONS: cls.RECORD_IPV4_RESERVATIONS,
+            RouterEndpoints.IPV4_DHCP_LEASES: cls.RECORD_IPV4_DHCP_LEASES,
+        }[endpoint]
@@ -0,0 +1,23 @@
+from enum import Enum
+
+
+class SeriesWrites(Enum):
+    # first write of a series, or after it was removed
+    ADDED = 'added'
+    CHANGED = 'changed'
+    # same value as last time, the `.set()` was skipped
+    UNCHANGED = 'unchanged'
+    REMOVED = 'removed'
+
+    @property
+    def label_string(self):
+        return self.value
+
+    @classmethod
+    def metrics_writes_list(cls):
+        return list([
+            cls.ADDED,
+            cls.CHANGED,
+            cls.UNCHANGED,
+            cls.REMOVED,
+        ])
@@ -81,6 +81,16 @@ class base_config(object):
 
     # Flask-APScheduler
     SCHEDULER_API_ENABLED = True
+    # every router gets its own scrape job and they all share this pool
+    DEFAULT_SCHEDULER_MAX_WORKERS = 10
+    SCHEDULER_EXECUTORS = {
+        'default': {
+            'type': 'threadpool',
+            'max_workers': int(os.getenv(
+                "SCHEDULER_MAX_WORKERS",
+                default=DEFAULT_SCHEDULER_MAX_WORKERS)),
+        },
+    }
 
     # metrics check configuration
     DEFAULT_METRICS_INTERVAL_SECONDS = 30
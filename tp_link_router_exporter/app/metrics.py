@@ -1,11 +1,12 @@
 from enum import Enum
 from prometheus_flask_exporter.multiprocess import GunicornPrometheusMetrics
-from prometheus_flask_exporter import Counter, Summary, Gauge
+from prometheus_flask_exporter import Counter, Summary, Gauge, Histogram
 
 
 class Labels(Enum):
     DEVICE = 'device'
     SCRAPE_EVENT = 'scrape_event'
+    SCRAPE_PHASE = 'scrape_phase'
     ROUTER_NAME = 'router_name'
     CONNECTION_TYPE = 'connection_type'
     DEVICE_TYPE = 'device_type'
@@ -19,6 +20,10 @@ class Labels(Enum):
     MODEL = 'model'
     FIRMWARE_VERSION = 'firmware_version'
     LEASE_TIME = 'lease_time'
+    CIRCUIT_BREAKER_STATE = 'circuit_breaker_state'
+    CONTENT_ENCODING = 'content_encoding'
+    SERIES_WRITE = 'series_write'
+    LEADER_REQUEST_TYPE = 'leader_request_type'
 
     @classmethod
     def labels(cls):
@@ -84,6 +89,13 @@ class Labels(Enum):
         ])
         return list(final_labels)
 
+    @classmethod
+    def circuit_breaker_state_labels(cls):
+        return list([
+            cls.ROUTER_NAME.value,
+            cls.CIRCUIT_BREAKER_STATE.value,
+        ])
+
     @classmethod
     def scrape_event_labels(cls):
         return list([
@@ -91,6 +103,39 @@ class Labels(Enum):
             cls.SCRAPE_EVENT.value,
         ])
 
+    @classmethod
+    def scrape_phase_labels(cls):
+        return list([
+            cls.ROUTER_NAME.value,
+            cls.SCRAPE_PHASE.value,
+        ])
+
+    @classmethod
+    def series_write_labels(cls):
+        return list([
+            cls.ROUTER_NAME.value,
+            cls.SERIES_WRITE.value,
+        ])
+
+    @classmethod
+    def content_encoding_labels(cls):
+        return list([
+            cls.CONTENT_ENCODING.value,
+        ])
+
+    @classmethod
+    def leader_request_labels(cls):
+        return list([
+            cls.LEADER_REQUEST_TYPE.value,
+        ])
+
+
+# from LAN round-trips of a few ms up to the 20s default router timeout
+SCRAPE_PHASE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, float('inf'),
+)
+
 
 class Metrics(object):
     DEBUG_ROUTE_TIME = Summary(
@@ -125,12 +170,126 @@ class Metrics(object):
         'tp_link_router_exporter_collector_metrics_update_route_exceptions',
         'Exceptions while attempting collector metrics update route request')
 
+    COLLECTOR_ROUTER_METRICS_UPDATE_TIME = Summary(
+        'tp_link_router_exporter_collector_router_metrics_update_time',
+        'Time spent to handle a scheduled metrics update for one router')
+
+    COLLECTOR_ROUTER_METRICS_UPDATE_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_collector_router_metrics_update_exceptions',
+        'Exceptions while attempting a scheduled metrics update for a router')
+
+    METRICS_ROUTE_TIME = Summary(
+        'tp_link_router_exporter_metrics_route_time',
+        'Time spent to render the metrics route (including router snapshots)')
+
+    METRICS_ROUTE_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_metrics_route_exceptions',
+        'Exceptions while attempting to render the metrics route')
+
+    DEVICE_HISTORY_ROUTE_TIME = Summary(
+        'tp_link_router_exporter_device_history_route_time',
+        'Time spent to handle device history route request')
+
+    DEVICE_HISTORY_ROUTE_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_device_history_route_exceptions',
+        'Exceptions while attempting to handle device history route request')
+
+    DEVICE_HISTORY_APPEND_TIME = Summary(
+        'tp_link_router_exporter_device_history_append_time',
+        'Time spent to append a scrape to the device history of a router')
+
+    DEVICE_HISTORY_APPEND_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_device_history_append_exceptions',
+        'Exceptions while attempting to append to the device history')
+
+    METRICS_PRERENDER_TIME = Summary(
+        'tp_link_router_exporter_metrics_prerender_time',
+        'Time spent to pre-render the metrics page for the metrics server')
+
+    METRICS_PRERENDER_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_metrics_prerender_exceptions',
+        'Exceptions while attempting to pre-render the metrics page')
+
+    METRICS_PRERENDER_BYTES = Gauge(
+        'tp_link_router_exporter_metrics_prerender_bytes',
+        'The size (bytes) of the last pre-rendered metrics page, '
+        'by content encoding',
+        Labels.content_encoding_labels())
+
+    LEADER_REQUEST_TIME = Summary(
+        'tp_link_router_exporter_leader_request_time',
+        'Time spent by the scheduler leader on scrapes another worker '
+        'asked for, by leader request type',
+        Labels.leader_request_labels())
+
+    LEADER_REQUEST_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_leader_request_exceptions',
+        'Exceptions while asking the scheduler leader for scrapes, '
+        'by leader request type',
+        Labels.leader_request_labels())
+
+    MULTIPROCESS_COMPACTION_TIME = Summary(
+        'tp_link_router_exporter_multiprocess_compaction_time',
+        'Time spent to compact the multiprocess metric files')
+
+    MULTIPROCESS_COMPACTION_EXCEPTIONS = Counter(
+        'tp_link_router_exporter_multiprocess_compaction_exceptions',
+        'Exceptions while attempting to compact the multiprocess metric files')
+
+    MULTIPROCESS_COMPACTION_DROPPED_ENTRIES_TOTAL = Counter(
+        'tp_link_router_exporter_multiprocess_compaction_dropped_entries',
+        'The number of removed or dead process series dropped from the '
+        'multiprocess metric files')
+
+    MULTIPROCESS_FILES = Gauge(
+        'tp_link_router_exporter_multiprocess_files',
+        'The number of multiprocess metric files, as of the last compaction')
+
+    MULTIPROCESS_FILES_BYTES = Gauge(
+        'tp_link_router_exporter_multiprocess_files_bytes',
+        'The bytes in use across the multiprocess metric files, as of the '
+        'last compaction')
+
+    MULTIPROCESS_FILES_ENTRIES = Gauge(
+        'tp_link_router_exporter_multiprocess_files_entries',
+        'The number of entries (series) across the multiprocess metric '
+        'files, as of the last compaction')
+
     ROUTER_SCRAPE_EVENT_COLLECTOR_COUNTER = Counter(
         'tp_link_router_exporter_scrape_event_collector_count',
         'The count of events related to scraping a router by collector',
         Labels.scrape_event_labels()
     )
 
+    ROUTER_SCRAPE_PHASE_SECONDS = Histogram(
+        'tp_link_router_exporter_scrape_phase_seconds',
+        'Time spent (s) in each phase of scraping a router',
+        Labels.scrape_phase_labels(),
+        buckets=SCRAPE_PHASE_BUCKETS)
+
+    # circuit breaker
+
+    ROUTER_CIRCUIT_BREAKER_STATE = Gauge(
+        'tp_link_router_exporter_router_circuit_breaker_state',
+        'This is set to 1 for the current circuit breaker state of a router',
+        Labels.circuit_breaker_state_labels())
+
+    ROUTER_CIRCUIT_BREAKER_CONSECUTIVE_FAILURES = Gauge(
+        'tp_link_router_exporter_router_circuit_breaker_consecutive_failures',
+        'The number of failed logins in a row to a router',
+        Labels.basic_router_labels())
+
+    ROUTER_CIRCUIT_BREAKER_NEXT_ATTEMPT_TIMESTAMP_SECONDS = Gauge(
+        'tp_link_router_exporter_router_circuit_breaker_next_attempt_timestamp_seconds',  # noqa: E501
+        'The time (unix) an open circuit breaker lets a router be tried '
+        'again, 0 while closed',
+        Labels.basic_router_labels())
+
+    ROUTER_SCRAPE_INTERVAL_SECONDS = Gauge(
+        'tp_link_router_exporter_router_scrape_interval_seconds',
+        'The interval (s) a router is currently scheduled to be scraped at',
+        Labels.basic_router_labels())
+
     # router specific stats
 
     ROUTER_CONNECTED_CLIENTS_TOTAL = Gauge(
@@ -167,11 +326,60 @@ class Metrics(object):
         'The number of packets sent or received by device on router',
         Labels.device_packets_labels())
 
+    ROUTER_DEVICE_PACKETS_MONOTONIC_TOTAL = Counter(
+        'tp_link_router_exporter_device_packets_monotonic',
+        'The number of packets sent or received by device on router, '
+        'carried on across router counter resets',
+        Labels.device_packets_labels())
+
+    ROUTER_DEVICE_PACKETS_PER_SECOND = Gauge(
+        'tp_link_router_exporter_device_packets_per_second',
+        'The packets per second sent or received by device on router, '
+        'between its last two scrapes',
+        Labels.device_packets_labels())
+
+    ROUTER_DEVICE_PACKET_COUNTER_RESETS_TOTAL = Counter(
+        'tp_link_router_exporter_device_packet_counter_resets',
+        'The number of device packet counter resets seen on router',
+        Labels.basic_router_labels())
+
     ROUTER_DEVICE_CONNECTED_STATUS = Gauge(
         'tp_link_router_exporter_device_connected_status',
         'This is set to 1 when a device is connected to this router',
         Labels.default_device_labels())
 
+    SCRAPE_LOG_SUPPRESSED_TOTAL = Counter(
+        'tp_link_router_exporter_scrape_log_suppressed',
+        'The number of scrape debug log messages left out by sampling',
+        Labels.basic_router_labels())
+
+    ROUTER_DEVICE_EVICTIONS_TOTAL = Counter(
+        'tp_link_router_exporter_device_evictions',
+        'The number of departed devices evicted after the eviction TTL',
+        Labels.basic_router_labels())
+
+    ROUTER_DEVICE_SERIES_EVICTIONS_TOTAL = Counter(
+        'tp_link_router_exporter_device_series_evictions',
+        'The number of metric series removed for evicted departed devices',
+        Labels.basic_router_labels())
+
+    ROUTER_DEVICE_HISTORY_BYTES = Gauge(
+        'tp_link_router_exporter_device_history_bytes',
+        'The fixed size (bytes) of the device history ring buffer of router',
+        Labels.basic_router_labels())
+
+    ROUTER_DEVICE_HISTORY_DROPPED_TOTAL = Counter(
+        'tp_link_router_exporter_device_history_dropped',
+        'The number of device samples left out of the device history, '
+        'because every slot was taken by the same scrape',
+        Labels.basic_router_labels())
+
+    ROUTER_SERIES_WRITES_TOTAL = Counter(
+        'tp_link_router_exporter_series_writes',
+        'The number of series added, changed, left unchanged or removed '
+        'by scrapes',
+        Labels.series_write_labels())
+
     # IPv4
 
     ROUTER_IPV4_RESERVATION_ENABLED = Gauge(
@@ -179,9 +387,19 @@ class Metrics(object):
         'This is the enabled state of an IPv4 reservation',
         Labels.default_ipv4_reservation_labels())
 
+    # deprecated, only as fresh as the last lease fetch, see
+    # `LeaseExpiryCollector` for the time left as of each scrape
     ROUTER_IPV4_DHCP_LEASE_TIME_SECONDS = Gauge(
         'tp_link_router_exporter_router_ipv4_dhcp_lease_time_seconds',
-        'This is the time remaining (s) for an IPv4 DHCP lease',
+        'Deprecated, use '
+        'tp_link_router_exporter_router_ipv4_dhcp_lease_remaining_seconds. '
+        'This is the time remaining (s) for an IPv4 DHCP lease, as of the '
+        'last lease fetch',
+        Labels.default_ipv4_dhcp_lease_labels())
+
+    ROUTER_IPV4_DHCP_LEASE_EXPIRY_TIMESTAMP_SECONDS = Gauge(
+        'tp_link_router_exporter_router_ipv4_dhcp_lease_expiry_timestamp_seconds',  # noqa: E501
+        'This is the time (unix) an IPv4 DHCP lease expires at',
         Labels.default_ipv4_dhcp_lease_labels())
 
     ROUTER_IPV4_DHCP_PERMANENT_LEASE_INFO = Gauge(
@@ -1,9 +1,18 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import current_app as app
+from ..clients.async_scrape_loop import AsyncScrapeLoop
 from ..clients.config_parser import ConfigParser
 from ..clients.env_vars import EnvVars
+from ..clients.leader_requests import leader_requests
+from ..clients.scheduler_leader import SchedulerLeader
+from ..common.leader_request_types import LeaderRequestTypes
 from ..common.config_keys import ConfigKeys
+from ..common.scrape_engines import ScrapeEngines
 from ..clients.collector import Collector
+from ..clients.async_collector import AsyncCollector
 from ..metrics import Metrics
+from ..utils import normalize_bool
 from .router import Router, RouterException
 
 
@@ -15,11 +24,27 @@ class CollectorRouterException(RouterException):
 
 
 class CollectorRouter(Router):
+    _shared = None
+    _shared_lock = threading.Lock()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._config = None
         self.collector = Collector.get_collector()
         self._collectors = None
+        self._simple_collector = None
+        self._collectors_lock = threading.Lock()
+        self._scrape_listeners = []
+        self._async_scrape_loop = None
+
+    @classmethod
+    def shared(cls):
+        # one set of collectors per process, so scheduled, update route
+        # and on demand scrapes all share the same router state
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
 
     @property
     def config(self):
@@ -29,34 +54,113 @@ class CollectorRouter(Router):
 
     @property
     def collectors(self):
-        if not self._collectors:
-            collectors = self._create_collectors()
-            self._collectors = list(collectors)
-        return self._collectors
+        with self._collectors_lock:
+            if not self._collectors:
+                collectors = self._create_collectors()
+                self._collectors = list(collectors)
+            return self._collectors
+
+    @property
+    def simple_collector(self):
+        # the env var router, the scheduled one when there is no config
+        # file, so its session, caches and history are never built twice
+        if not self.should_use_config_file():
+            return self.collectors[0]
+        with self._collectors_lock:
+            if self._simple_collector is None:
+                self._simple_collector = self._create_env_var_collector()
+            return self._simple_collector
+
+    @property
+    def async_scrape_loop(self):
+        with self._collectors_lock:
+            if self._async_scrape_loop is None:
+                self._async_scrape_loop = AsyncScrapeLoop(
+                    self.max_concurrent_routers,
+                    app._get_current_object())
+            return self._async_scrape_loop
+
+    def add_scrape_listener(self, listener):
+        """Calls `listener()` after every scrape this process runs"""
+        self._scrape_listeners.append(listener)
+
+    def _notify_scrape_listeners(self):
+        for listener in self._scrape_listeners:
+            try:
+                listener()
+            except Exception as unexp:
+                log.error(f'scrape listener: {listener} got unexp: {unexp}')
+
+    def _run_scrapes(self, request_type, update_func):
+        # a follower's scrapes would only reach the multiprocess files,
+        # the leader runs them and saves everything for the others
+        if SchedulerLeader.shared().is_follower:
+            return leader_requests.send(request_type)
+        try:
+            return update_func()
+        finally:
+            self._notify_scrape_listeners()
 
     @classmethod
-    def _create_collector(cls, ip, name, password):
-        return Collector.get_collector(
+    def on_demand_scrapes(cls):
+        return normalize_bool(EnvVars.get_default_on_demand_scrapes())
+
+    @property
+    def scrape_engine(self):
+        default_engine = EnvVars.get_default_scrape_engine()
+        engine = default_engine
+        if self.should_use_config_file():
+            try:
+                engine = ConfigParser.get_scrape_engine(
+                    self.config,
+                    default=default_engine)
+            except (AttributeError, TypeError) as engine_exc:
+                log.error(f'Invalid scrape engine config, falling '
+                          f'back to default: {default_engine} '
+                          f'(engine_exc: {engine_exc})')
+        try:
+            return ScrapeEngines(engine)
+        except ValueError:
+            log.error(f'Unknown scrape engine: {engine}, falling back '
+                      f'to: {ScrapeEngines.DEFAULT.label_string}')
+            return ScrapeEngines.DEFAULT
+
+    @property
+    def is_async_scrape_engine(self):
+        return bool(self.scrape_engine == ScrapeEngines.ASYNC)
+
+    @property
+    def collector_class(self):
+        if self.is_async_scrape_engine:
+            return AsyncCollector
+        return Collector
+
+    def _create_collector(self, ip, name, password, **options):
+        return self.collector_class.get_collector(
             router_ip=ip,
             router_password=password,
-            router_name=name)
+            router_name=name,
+            **options)
 
-    @classmethod
-    def _create_env_var_collector(cls):
+    def _create_env_var_collector(self):
         router_name = EnvVars.get_default_router_name()
         router_ip = EnvVars.get_default_router_ip()
         router_password = EnvVars.get_default_router_password()
-        return cls._create_collector(router_ip, router_name, router_password)
+        return self._create_collector(
+            router_ip,
+            router_name,
+            router_password)
 
-    @classmethod
-    def _create_collector_from_config(cls, router_config):
+    def _create_collector_from_config(self, router_config):
         router_name = router_config[ConfigKeys.ROUTER_NAME.key_name]
         router_ip = router_config[ConfigKeys.ROUTER_IP.key_name]
         router_password = router_config[ConfigKeys.ROUTER_PASSWORD.key_name]
-        collector = cls._create_collector(
+        router_options = ConfigParser.get_router_options(router_config)
+        collector = self._create_collector(
             router_ip,
             router_name,
-            router_password)
+            router_password,
+            **router_options)
         return collector
 
     @classmethod
@@ -78,6 +182,21 @@ class CollectorRouter(Router):
             # Return empty array to prevent exceptions
             return []
 
+    @property
+    def max_concurrent_routers(self):
+        default_max = EnvVars.get_default_max_concurrent_routers()
+        if not self.should_use_config_file():
+            return default_max
+        try:
+            return ConfigParser.get_max_concurrent_routers(
+                self.config,
+                default=default_max)
+        except (AttributeError, TypeError, ValueError) as max_exc:
+            log.error(f'Invalid max concurrent routers config, falling '
+                      f'back to default: {default_max} '
+                      f'(max_exc: {max_exc})')
+            return default_max
+
     def _create_collectors(self):
         collectors = []
         if self.should_use_config_file():
@@ -108,20 +227,175 @@ class CollectorRouter(Router):
             p_m = 'handle simple collector route'
             log.debug(p_m)
             final_response = self.base_response('simple')
-            collector = self._create_env_var_collector()
-            result = collector.get_router_metrics()
-            r_m = f'self.collector: {self.collector} got result: {result}'
-            log.debug(r_m)
+            self.update_simple_collector_metrics()
             return final_response
 
+    def _update_simple_collector_metrics(self):
+        collector = self.simple_collector
+        # goes through the router lock, like the scheduled scrapes
+        result = collector.update_router_metrics()
+        r_m = f'collector: {collector} got result: {result}'
+        log.debug(r_m)
+        return result
+
+    def update_simple_collector_metrics(self):
+        return self._run_scrapes(
+            LeaderRequestTypes.UPDATE_SIMPLE,
+            self._update_simple_collector_metrics)
+
     @Metrics.COLLECTOR_METRICS_UPDATE_ROUTE_TIME.time()
     def handle_collector_metrics_update_route_response(self):
         with Metrics.COLLECTOR_METRICS_UPDATE_ROUTE_EXCEPTIONS.count_exceptions():  # noqa: E501
             p_m = 'handle collector metrics update route'
             log.debug(p_m)
             final_response = self.base_response('metrics_update')
-            for collector in self.collectors:
-                result = collector.update_router_metrics()
-                r_m = f'self.collector: {self.collector} got result: {result}'
-                log.debug(r_m)
+            self.update_all_collectors_metrics()
             return final_response
+
+    @Metrics.COLLECTOR_ROUTER_METRICS_UPDATE_TIME.time()
+    def handle_collector_router_metrics_update(self, collector):
+        with Metrics.COLLECTOR_ROUTER_METRICS_UPDATE_EXCEPTIONS.count_exceptions():  # noqa: E501
+            log.debug(f'handle collector metrics update for: {collector}')
+            try:
+                return self._update_collector_metrics(collector)
+            finally:
+                self._notify_scrape_listeners()
+
+    @classmethod
+    def _update_collector_metrics(cls, collector):
+        result = collector.update_router_metrics()
+        r_m = f'collector: {collector} got result: {result}'
+        log.debug(r_m)
+        return result
+
+    @classmethod
+    def _update_stale_collector_metrics(cls, collector):
+        result = collector.update_router_metrics_if_stale()
+        r_m = f'collector: {collector} on demand got result: {result}'
+        log.debug(r_m)
+        return result
+
+    def _update_collectors_metrics_sequentially(self, collectors,
+                                                update_func=None):
+        update_func = update_func or self._update_collector_metrics
+        for collector in collectors:
+            update_func(collector)
+
+    def _update_collectors_metrics_concurrently(self, collectors, max_workers,
+                                                update_func=None):
+        update_func = update_func or self._update_collector_metrics
+        log.debug(f'Collector => scraping {len(collectors)} routers with '
+                  f'max_workers: {max_workers}')
+        with ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='collector') as executor:
+            futures = {
+                executor.submit(update_func, collector): collector
+                for collector in collectors
+            }
+            for future in as_completed(futures):
+                collector = futures[future]
+                try:
+                    future.result()
+                except Exception as unexp:
+                    # one failing router should never take down the others
+                    u_m = (f'collector: {collector} concurrent update '
+                           f'got unexp: {unexp}')
+                    log.error(u_m)
+
+    @classmethod
+    async def _async_update_collector_metrics(cls, collector):
+        with Metrics.COLLECTOR_ROUTER_METRICS_UPDATE_EXCEPTIONS.count_exceptions():  # noqa: E501
+            with Metrics.COLLECTOR_ROUTER_METRICS_UPDATE_TIME.time():
+                result = await collector.async_update_router_metrics()
+        r_m = f'collector: {collector} got result: {result}'
+        log.debug(r_m)
+        return result
+
+    def submit_collector_router_metrics_update(self, collector,
+                                               on_done=None):
+        """Async engine only, the scheduled scrape of `collector` on the
+        shared event loop. Returns without waiting for it, `on_done()` is
+        called once it finished.
+        """
+        def handle_done(future):
+            try:
+                future.result()
+            except Exception as unexp:
+                u_m = (f'collector: {collector} async update '
+                       f'got unexp: {unexp}')
+                log.error(u_m)
+            self._notify_scrape_listeners()
+            if on_done is not None:
+                on_done()
+
+        future = self.async_scrape_loop.submit(
+            lambda: self._async_update_collector_metrics(collector))
+        future.add_done_callback(handle_done)
+        return future
+
+    def _update_async_collectors_metrics(self, collectors):
+        log.debug(f'Collector => scraping {len(collectors)} routers on '
+                  f'the shared event loop')
+        futures = [
+            self.async_scrape_loop.submit(
+                collector.async_update_router_metrics)
+            for collector in collectors
+        ]
+        for collector, future in zip(collectors, futures):
+            try:
+                result = future.result()
+                r_m = f'collector: {collector} got result: {result}'
+                log.debug(r_m)
+            except Exception as unexp:
+                u_m = (f'collector: {collector} async update '
+                       f'got unexp: {unexp}')
+                log.error(u_m)
+
+    def _update_all_collectors_metrics(self):
+        collectors = self.collectors
+        if not collectors:
+            return
+        if self.is_async_scrape_engine:
+            return self._update_async_collectors_metrics(collectors)
+        max_workers = min(self.max_concurrent_routers, len(collectors))
+        if max_workers <= 1:
+            return self._update_collectors_metrics_sequentially(collectors)
+        return self._update_collectors_metrics_concurrently(
+            collectors,
+            max_workers)
+
+    def update_all_collectors_metrics(self):
+        return self._run_scrapes(
+            LeaderRequestTypes.UPDATE_ALL,
+            self._update_all_collectors_metrics)
+
+    def _update_stale_collectors_metrics(self):
+        # on demand scrapes always use threads, an async collector runs
+        # its own event loop in each of them
+        collectors = self.collectors
+        if not collectors:
+            return
+        max_workers = min(self.max_concurrent_routers, len(collectors))
+        if max_workers <= 1:
+            return self._update_collectors_metrics_sequentially(
+                collectors,
+                self._update_stale_collector_metrics)
+        return self._update_collectors_metrics_concurrently(
+            collectors,
+            max_workers,
+            self._update_stale_collector_metrics)
+
+    def update_stale_collectors_metrics(self):
+        return self._run_scrapes(
+            LeaderRequestTypes.UPDATE_STALE,
+            self._update_stale_collectors_metrics)
+
+    def get_leader_request_handlers(self):
+        return {
+            LeaderRequestTypes.UPDATE_ALL: self.update_all_collectors_metrics,
+            LeaderRequestTypes.UPDATE_STALE: (
+                self.update_stale_collectors_metrics),
+            LeaderRequestTypes.UPDATE_SIMPLE: (
+                self.update_simple_collector_metrics),
+        }
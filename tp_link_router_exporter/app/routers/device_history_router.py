@@ -0,0 +1,96 @@
+import math
+import time
+from flask import request, current_app as app
+from ..clients.device_history import DeviceHistory
+from ..metrics import Metrics
+from .router import Router, RouterException
+
+
+log = app.logger
+
+
+class DeviceHistoryRouterException(RouterException):
+    pass
+
+
+class DeviceHistoryRouter(Router):
+    # query arguments, all optional
+    SECONDS_ARG = 'seconds'
+    STEP_SECONDS_ARG = 'step_seconds'
+    MAX_POINTS_ARG = 'max_points'
+
+    @property
+    def service(self):
+        return 'device_history'
+
+    @classmethod
+    def get_now(cls):
+        return time.time()
+
+    @classmethod
+    def _get_number_arg(cls, name):
+        value = request.args.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            number = float(value)
+        except ValueError:
+            number = math.nan
+        if not math.isfinite(number) or number < 0:
+            raise DeviceHistoryRouterException(
+                f'{name} must be a number >= 0, got: {value}')
+        return number
+
+    @classmethod
+    def get_step_seconds(cls, history, step_seconds, max_points):
+        """`step_seconds`, made coarser when `history` would still have
+        more than `max_points` samples
+        """
+        step_seconds = step_seconds or 0
+        if not max_points or len(history) <= max_points:
+            return step_seconds
+        span = history[-1].timestamp - history[0].timestamp
+        # one more step, the first bucket rarely starts on a boundary
+        return max(step_seconds, math.ceil(span / max(max_points - 1, 1)))
+
+    def _error_response(self, message, status):
+        response = self.base_response('history')
+        response['message'] = message
+        return response, status
+
+    @Metrics.DEVICE_HISTORY_ROUTE_TIME.time()
+    def handle_device_history_route_response(self, router_name, mac_address):
+        with Metrics.DEVICE_HISTORY_ROUTE_EXCEPTIONS.count_exceptions():
+            log.debug(f'handle device history route for: {router_name} '
+                      f'{mac_address}')
+            try:
+                seconds = self._get_number_arg(self.SECONDS_ARG)
+                step_seconds = self._get_number_arg(self.STEP_SECONDS_ARG)
+                max_points = self._get_number_arg(self.MAX_POINTS_ARG)
+                mac_value = DeviceHistory.get_mac_value(mac_address)
+            except (DeviceHistoryRouterException, ValueError) as arg_exc:
+                return self._error_response(str(arg_exc), 400)
+            device_history = DeviceHistory(router_name)
+            history = device_history.get_samples(mac_value)
+            if history is None:
+                return self._error_response('no history found', 404)
+            if seconds is not None:
+                since = self.get_now() - seconds
+                history = [s for s in history if s.timestamp >= since]
+            step_seconds = self.get_step_seconds(
+                history,
+                step_seconds,
+                int(max_points or 0))
+            final_response = self.base_response('history')
+            final_response.update({
+                'router_name': router_name,
+                'mac_address': str(DeviceHistory.to_mac_address(mac_value)),
+                'step_seconds': step_seconds,
+                'samples': [
+                    sample._asdict()
+                    for sample in DeviceHistory.downsample(
+                        history,
+                        step_seconds)
+                ],
+            })
+            return final_response
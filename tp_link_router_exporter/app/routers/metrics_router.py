@@ -0,0 +1,67 @@
+import os
+from flask import current_app as app
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+from prometheus_client.multiprocess import MultiProcessCollector
+from ..clients.leader_metrics import leader_metrics_collector
+from ..clients.multiprocess_compactor import multiprocess_compactor
+from ..metrics import Metrics
+from .collector_router import CollectorRouter
+from .router import Router, RouterException
+
+
+log = app.logger
+
+
+class MetricsRouterException(RouterException):
+    pass
+
+
+class MetricsRouter(Router):
+    MULTIPROC_DIR_ENV_VARS = [
+        'PROMETHEUS_MULTIPROC_DIR',
+        'prometheus_multiproc_dir',
+    ]
+
+    _registry = None
+
+    @classmethod
+    def is_multiprocess(cls):
+        return any(key in os.environ for key in cls.MULTIPROC_DIR_ENV_VARS)
+
+    @classmethod
+    def get_registry(cls):
+        if cls._registry:
+            return cls._registry
+        # the same multiprocess files as the `METRICS_PORT` server,
+        # plus the router snapshots and lease expiries that only live
+        # in the scheduler leader
+        registry = CollectorRegistry()
+        if cls.is_multiprocess():
+            MultiProcessCollector(registry)
+        registry.register(leader_metrics_collector)
+        cls._registry = registry
+        return registry
+
+    @property
+    def service(self):
+        return 'metrics'
+
+    @classmethod
+    def _update_stale_collectors_metrics(cls):
+        if not CollectorRouter.on_demand_scrapes():
+            return
+        try:
+            CollectorRouter.shared().update_stale_collectors_metrics()
+        except Exception as unexp:
+            # still serve whatever we have
+            log.error(f'on demand scrape got unexp: {unexp}')
+
+    @Metrics.METRICS_ROUTE_TIME.time()
+    def handle_metrics_route_response(self):
+        with Metrics.METRICS_ROUTE_EXCEPTIONS.count_exceptions():
+            log.debug('handle metrics route')
+            self._update_stale_collectors_metrics()
+            with multiprocess_compactor.reading():
+                output = generate_latest(self.get_registry())
+            return output, 200, {'Content-Type': CONTENT_TYPE_LATEST}
@@ -1,4 +1,5 @@
 from flask import current_app as app
+from ..clients.router_lock import RouterLock
 from ..clients.tp_link_router import TPLinkRouter
 from ..metrics import Metrics
 from .router import Router, RouterException
@@ -15,6 +16,7 @@ class TPLinkRouterRouter(Router):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.router_client = TPLinkRouter.get_client()
+        self.router_lock = RouterLock.get_lock(self.router_client.router_ip)
 
     @property
     def service(self):
@@ -26,6 +28,8 @@ class TPLinkRouterRouter(Router):
             p_m = 'test for router'
             log.debug(p_m)
             final_response = self.base_response('test_router')
-            result = self.router_client.get_firmware()
+            # waits for any scrape of the same router to finish first
+            with self.router_lock.hold_or_raise():
+                result = self.router_client.get_firmware()
             log.debug(f'result: {result}')
             return final_response
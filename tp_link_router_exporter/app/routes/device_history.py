@@ -0,0 +1,13 @@
+from flask import current_app as app
+from ..routers.device_history_router import DeviceHistoryRouter
+
+
+log = app.logger
+
+
+@app.route('/api/v1/routers/<router_name>/devices/<mac_address>/history')
+def handle_device_history_route(router_name, mac_address):
+    router = DeviceHistoryRouter()
+    return router.handle_device_history_route_response(
+        router_name,
+        mac_address)
@@ -0,0 +1,11 @@
+from flask import current_app as app
+from ..routers.metrics_router import MetricsRouter
+
+
+log = app.logger
+
+
+@app.route('/api/v1/metrics')
+def handle_metrics_route():
+    router = MetricsRouter()
+    return router.handle_metrics_route_response()
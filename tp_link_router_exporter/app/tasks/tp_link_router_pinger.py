@@ -1,12 +1,16 @@
 import os
+from datetime import datetime, timedelta
 from flask import current_app as app
 from ..config import base_config
+from ..utils import normalize_name
 
 
 log = app.logger
 
 
 class TPLinkRouterPinger(object):
+    JOB_ID_PREFIX = 'tp_link_router_metrics_update'
+
     # FIXME: doesn't work normally because of app context
     @classmethod
     def get_metrics_interval_seconds(cls):
@@ -14,7 +18,8 @@ class TPLinkRouterPinger(object):
         #     app.config.get('METRICS_INTERVAL_SECONDS'))
         # return METRICS_INTERVAL_SECONDS
         default_interval = base_config.DEFAULT_METRICS_INTERVAL_SECONDS
-        return os.environ.get('METRICS_INTERVAL_SECONDS', default_interval)
+        return int(os.environ.get('METRICS_INTERVAL_SECONDS',
+                                  default_interval))
 
     @classmethod
     def should_schedule_router_metrics_updates(cls):
@@ -23,3 +28,35 @@ class TPLinkRouterPinger(object):
         c_m = f'for {key} => {config_value}'
         log.debug(c_m)
         return bool(str(config_value) == "1")
+
+    @classmethod
+    def get_job_id(cls, collector):
+        # router names are only labels, two routers could share one
+        router_name = normalize_name(collector.router_name)
+        router_ip = normalize_name(collector.router_ip)
+        return f'{cls.JOB_ID_PREFIX}_{router_name}_{router_ip}'
+
+    @classmethod
+    def get_collector_interval_seconds(cls, collector):
+        if collector.interval_seconds:
+            return float(collector.interval_seconds)
+        return float(cls.get_metrics_interval_seconds())
+
+    @classmethod
+    def get_collector_offset_seconds(cls, collector, index, total):
+        if collector.offset_seconds is not None:
+            return float(collector.offset_seconds)
+        # without an explicit offset, spread the router logins
+        # evenly across its interval so they don't all hit at once
+        interval_seconds = cls.get_collector_interval_seconds(collector)
+        return interval_seconds * index / max(total, 1)
+
+    @classmethod
+    def get_collector_start_date(cls, collector, index, total, now=None):
+        if not now:
+            now = datetime.now()
+        offset_seconds = cls.get_collector_offset_seconds(
+            collector,
+            index,
+            total)
+        return now + timedelta(seconds=offset_seconds)
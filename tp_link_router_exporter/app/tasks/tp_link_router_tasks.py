@@ -1,33 +1,173 @@
 from flask import current_app as app
+from ..clients.leader_metrics import leader_metrics_collector
+from ..clients.leader_requests import leader_requests
+from ..clients.metrics_renderer import MetricsRenderer
+from ..clients.multiprocess_compactor import multiprocess_compactor
+from ..clients.scheduler_leader import SchedulerLeader
 from ..extensions import scheduler
 from ..routers.collector_router import CollectorRouter
+from ..routers.metrics_router import MetricsRouter
 from .tp_link_router_pinger import TPLinkRouterPinger
 
 
 log = app.logger
 
 
-router = CollectorRouter()
+router = CollectorRouter.shared()
+metrics_renderer = MetricsRenderer(MetricsRouter.get_registry)
 
 
-# TODO: make this configurable and turn and off as well
-@scheduler.task(
-    "interval",
-    id="tp_link_router_metrics_update",
-    seconds=TPLinkRouterPinger.get_metrics_interval_seconds(),
-    max_instances=1,
-    start_date="2000-01-01 12:19:00",
-)
-def perform_router_metrics_update():
+def perform_router_metrics_update(collector):
     """Router metrics update
 
-    Added when app starts.
+    One of these jobs is added per collector when app starts.
     """
-    pu_m = "running tp_link_router_metrics_update!"
+    pu_m = f"running tp_link_router_metrics_update for {collector}!"
     log.debug(pu_m)
 
     with scheduler.app.app_context():
-        response = router.handle_collector_metrics_update_route_response()
+        if router.is_async_scrape_engine:
+            # the scrape runs on the shared event loop, not on this thread
+            router.submit_collector_router_metrics_update(
+                collector,
+                lambda: reschedule_router_metrics_update(collector))
+            return
+        response = router.handle_collector_router_metrics_update(collector)
         r_m = (f'scheduled tp link router metrics '
                f'update got response: {response}')
         log.debug(r_m)
+    reschedule_router_metrics_update(collector)
+
+
+def handle_leader_scrapes():
+    """Runs in the leader after each of its scrapes, scheduled, on demand
+    or asked for by another worker
+    """
+    # so the other workers serve what only lives in this one
+    try:
+        leader_metrics_collector.save()
+    except Exception as unexp:
+        log.error(f'cannot save leader metrics, got unexp: {unexp}')
+    if MetricsRenderer.is_enabled():
+        metrics_renderer.mark_stale()
+
+
+def reschedule_router_metrics_update(collector):
+    """Moves the job to the collector's adapted interval, if it changed"""
+    interval_seconds = collector.adaptive_interval.interval_seconds
+    if not collector.adaptive_interval.is_enabled or not interval_seconds:
+        return
+    job_id = TPLinkRouterPinger.get_job_id(collector)
+    job = scheduler.get_job(job_id)
+    if not job:
+        return
+    if job.trigger.interval.total_seconds() == interval_seconds:
+        return
+    r_m = f'rescheduling job_id: {job_id} every {interval_seconds}s'
+    log.debug(r_m)
+    scheduler.modify_job(
+        job_id,
+        trigger='interval',
+        seconds=interval_seconds)
+
+
+def _get_collectors():
+    try:
+        return router.collectors
+    except Exception as unexp:
+        u_m = (f'cannot create collectors to schedule '
+               f'router metrics updates, got unexp: {unexp}')
+        log.error(u_m)
+        return []
+
+
+def schedule_router_metrics_updates():
+    collectors = _get_collectors()
+    total = len(collectors)
+    job_ids = set()
+    for index, collector in enumerate(collectors):
+        job_id = TPLinkRouterPinger.get_job_id(collector)
+        if job_id in job_ids:
+            # `replace_existing` would silently drop the earlier router
+            d_m = (f'not scheduling duplicate job_id: {job_id}, '
+                   f'router_name: {collector.router_name} with router_ip: '
+                   f'{collector.router_ip} is configured more than once')
+            log.error(d_m)
+            continue
+        job_ids.add(job_id)
+        interval_seconds = collector.start_interval(
+            TPLinkRouterPinger.get_collector_interval_seconds(collector))
+        start_date = TPLinkRouterPinger.get_collector_start_date(
+            collector,
+            index,
+            total)
+        s_m = (f'scheduling job_id: {job_id} every {interval_seconds}s '
+               f'starting at {start_date}')
+        log.debug(s_m)
+        scheduler.add_job(
+            job_id,
+            perform_router_metrics_update,
+            args=[collector],
+            trigger='interval',
+            seconds=interval_seconds,
+            start_date=start_date,
+            next_run_time=start_date,
+            max_instances=1,
+            replace_existing=True,
+        )
+
+
+def perform_multiprocess_compaction():
+    with scheduler.app.app_context():
+        try:
+            multiprocess_compactor.compact()
+        except Exception as unexp:
+            log.error(f'cannot compact multiprocess files, got unexp: {unexp}')
+
+
+def schedule_multiprocess_compaction():
+    interval_seconds = multiprocess_compactor.get_interval_seconds()
+    if not interval_seconds or not multiprocess_compactor.is_enabled:
+        return
+    s_m = f'scheduling multiprocess compaction every {interval_seconds}s'
+    log.debug(s_m)
+    scheduler.add_job(
+        'multiprocess_compaction',
+        perform_multiprocess_compaction,
+        trigger='interval',
+        seconds=interval_seconds,
+        max_instances=1,
+        replace_existing=True,
+    )
+
+
+def elect_scheduler_leader():
+    # leadership can also be taken over later, from a background thread
+    flask_app = app._get_current_object()
+
+    def handle_leader_request(handler):
+        def handle():
+            with flask_app.app_context():
+                return handler()
+        return handle
+
+    def on_elected():
+        router.add_scrape_listener(handle_leader_scrapes)
+        with flask_app.app_context():
+            schedule_router_metrics_updates()
+            schedule_multiprocess_compaction()
+        handlers = router.get_leader_request_handlers()
+        try:
+            leader_requests.serve({
+                request_type: handle_leader_request(handler)
+                for request_type, handler in handlers.items()
+            })
+        except OSError as os_error:
+            log.error(f'cannot serve leader requests, got: {os_error}')
+        if MetricsRenderer.is_enabled():
+            metrics_renderer.start()
+
+    SchedulerLeader.shared().start(on_elected)
+
+
+elect_scheduler_leader()
@@ -0,0 +1,13 @@
+import unittest
+from flask import Flask
+
+
+class AppContextTestCase(unittest.TestCase):
+    """Pushes a bare app context, which is all the clients need for
+    `current_app.logger`. Import them in `setUp()`, after `super().setUp()`.
+    """
+    def setUp(self):
+        super().setUp()
+        app_context = Flask(__name__).app_context()
+        app_context.push()
+        self.addCleanup(app_context.pop)
@@ -0,0 +1,55 @@
+import unittest
+from tp_link_router_exporter.app.clients.adaptive_interval import (
+    AdaptiveInterval,
+    ScrapeSummary,
+)
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+    def setUp(self):
+        self.adaptive_interval = AdaptiveInterval(True, 10, 120)
+        self.adaptive_interval.start(30)
+
+    def observe(self, device_keys, client_counts, packets_total, taken_at,
+                scrape_seconds=1):
+        summary = ScrapeSummary(
+            device_keys,
+            client_counts,
+            packets_total,
+            taken_at)
+        return self.adaptive_interval.observe(summary, scrape_seconds)
+
+    def test_start_is_clamped(self):
+        self.assertEqual(self.adaptive_interval.start(5), 10)
+        self.assertEqual(self.adaptive_interval.start(600), 120)
+
+    def test_stretches_while_nothing_changes(self):
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 100, 0), 30)
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 200, 30), 45)
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 350, 75), 67.5)
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 575, 142.5), 101.25)
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 900, 243.75), 120)
+
+    def test_tightens_when_devices_join_or_leave(self):
+        self.observe(['a'], [1, 0, 0, 1], 100, 0)
+        self.assertEqual(self.observe(['a', 'b'], [2, 0, 0, 2], 200, 30), 15)
+        self.assertEqual(self.observe(['b'], [1, 0, 0, 1], 300, 45), 10)
+
+    def test_tightens_when_packet_rate_jumps(self):
+        self.observe(['a'], [1, 0, 0, 1], 0, 0)
+        self.observe(['a'], [1, 0, 0, 1], 300, 30)
+        self.assertEqual(self.observe(['a'], [1, 0, 0, 1], 3000, 75), 22.5)
+
+    def test_backs_off_from_slow_scrapes(self):
+        interval = self.adaptive_interval.observe(None, 25)
+        self.assertEqual(interval, 50)
+        interval = self.adaptive_interval.observe(None, 100)
+        self.assertEqual(interval, 120)
+
+    def test_disabled_keeps_interval(self):
+        adaptive_interval = AdaptiveInterval(False, 10, 120)
+        self.assertIsNone(adaptive_interval.observe(None, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
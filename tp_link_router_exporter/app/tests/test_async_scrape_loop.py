@@ -0,0 +1,76 @@
+import time
+import asyncio
+import threading
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class FakeAsyncCollector(object):
+    def __init__(self, name, scrapes):
+        self.name = name
+        self.scrapes = scrapes
+
+    async def async_update_router_metrics(self):
+        self.scrapes.append((self.name, threading.get_ident()))
+        await asyncio.sleep(0.01)
+        return self.name
+
+
+class TestAsyncScrapeLoop(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.async_scrape_loop import (
+            AsyncScrapeLoop,
+        )
+        self.scrape_loop = AsyncScrapeLoop(max_tasks=2)
+        self.running = 0
+        self.max_running = 0
+
+    async def scrape(self):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.02)
+        self.running -= 1
+        return threading.get_ident()
+
+    def test_scrapes_share_one_bounded_loop(self):
+        futures = [self.scrape_loop.submit(self.scrape) for _ in range(6)]
+        thread_ids = {future.result(5) for future in futures}
+        self.assertEqual(len(thread_ids), 1)
+        self.assertNotIn(threading.get_ident(), thread_ids)
+        self.assertEqual(self.max_running, 2)
+        # the same loop keeps running for later scrapes
+        loop = self.scrape_loop.loop
+        self.assertEqual(
+            self.scrape_loop.submit(self.scrape).result(5),
+            thread_ids.pop())
+        self.assertIs(self.scrape_loop.loop, loop)
+        self.assertTrue(loop.is_running())
+
+    def test_scheduled_scrapes_return_right_away(self):
+        from tp_link_router_exporter.app.routers.collector_router import (
+            CollectorRouter,
+        )
+        router = CollectorRouter()
+        router._async_scrape_loop = self.scrape_loop
+        scrapes = []
+        done = []
+        listened = []
+        router.add_scrape_listener(lambda: listened.append(True))
+        futures = [
+            router.submit_collector_router_metrics_update(
+                FakeAsyncCollector(name, scrapes),
+                lambda name=name: done.append(name))
+            for name in ['a', 'b', 'c']
+        ]
+        for future in futures:
+            future.result(5)
+        # done callbacks run right after the result is set
+        for _ in range(100):
+            if len(done) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(sorted(done), ['a', 'b', 'c'])
+        self.assertEqual(len(listened), 3)
+        self.assertEqual(len({thread_id for _, thread_id in scrapes}), 1)
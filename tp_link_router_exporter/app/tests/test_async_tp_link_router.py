@@ -0,0 +1,165 @@
+import os
+import json
+import asyncio
+import binascii
+from urllib.parse import parse_qs
+from Crypto.Cipher import PKCS1_v1_5
+from Crypto.PublicKey import RSA
+from tplinkrouterc6u.encryption import EncryptionWrapper
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+REQUIREMENTS_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'requirements.txt')
+FIRMWARE = {
+    'hardware_version': 'Archer C6 v3.0',
+    'model': 'Archer C6',
+    'firmware_version': '1.0.0 Build 1',
+}
+
+
+class FakeResponse(object):
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def text(self):
+        return self.body
+
+
+class FakeRouterSession(object):
+    """Stands in for `aiohttp.ClientSession`, answering like a router's
+    encrypted web API
+    """
+    STOK = 'fake_stok'
+    SYSAUTH = 'fake_sysauth'
+
+    def __init__(self, password, rejected_logins=0):
+        self.password = password
+        self.rejected_logins = rejected_logins
+        self.rsa_key = RSA.generate(1024)
+        self.encryption = None
+        self.paths = []
+
+    def post(self, url, ssl=None, params=None, data=None, headers=None,
+             cookies=None):
+        path = url.split('/', 6)[-1]
+        self.paths.append(path)
+        if 'stok=/login?form=keys' in url or 'stok=/login?form=auth' in url:
+            return self._keys(path)
+        if 'stok=/login?form=login' in url:
+            return self._login(data)
+        if f';stok={self.STOK}/' not in url:
+            return FakeResponse(403, 'forbidden')
+        if cookies != {'sysauth': self.SYSAUTH}:
+            return FakeResponse(403, 'forbidden')
+        return self._request(path, data)
+
+    def _keys(self, path):
+        public_key = [
+            format(self.rsa_key.n, 'x'),
+            format(self.rsa_key.e, 'x'),
+        ]
+        data = {'password': public_key}
+        if 'form=auth' in path:
+            data = {'seq': 100, 'key': public_key}
+        return FakeResponse(200, json.dumps({'success': True, 'data': data}))
+
+    def _rsa_decrypt(self, hex_text):
+        cipher = PKCS1_v1_5.new(self.rsa_key)
+        chunk_size = self.rsa_key.size_in_bytes() * 2
+        return ''.join(
+            cipher.decrypt(binascii.a2b_hex(hex_text[i:i + chunk_size]), b'')
+            .decode()
+            for i in range(0, len(hex_text), chunk_size))
+
+    def _decrypt(self, data):
+        return parse_qs(self.encryption.aes_decrypt(data['data']))
+
+    def _encrypt(self, payload):
+        data = self.encryption.aes_encrypt(json.dumps(payload))
+        return json.dumps({'data': data})
+
+    def _login(self, data):
+        if self.rejected_logins:
+            self.rejected_logins -= 1
+            return FakeResponse(403, 'session kicked out')
+        sign = parse_qs(self._rsa_decrypt(data['sign']))
+        self.encryption = EncryptionWrapper()
+        self.encryption._key = sign['k'][0].encode()
+        self.encryption._iv = sign['i'][0].encode()
+        password = self._rsa_decrypt(self._decrypt(data)['password'][0])
+        if password != self.password:
+            return FakeResponse(200, self._encrypt({'success': False}))
+        return FakeResponse(
+            200,
+            self._encrypt({'success': True, 'data': {'stok': self.STOK}}),
+            {'set-cookie': f'sysauth={self.SYSAUTH}; path=/'})
+
+    def _request(self, path, data):
+        operation = self._decrypt(data)['operation'][0]
+        if path.startswith('admin/firmware') and operation == 'read':
+            return FakeResponse(
+                200,
+                self._encrypt({'success': True, 'data': FIRMWARE}))
+        return FakeResponse(200, self._encrypt({'success': True, 'data': {}}))
+
+
+class TestAsyncTPLinkRouter(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients import async_tp_link_router
+        self.async_tp_link_router = async_tp_link_router
+
+    def get_client(self, session):
+        client = self.async_tp_link_router.AsyncTPLinkRouter(
+            router_ip='http://10.0.0.5',
+            router_password='password')
+        client._session = session
+        return client
+
+    def test_login_and_replayed_firmware(self):
+        session = FakeRouterSession('password')
+        client = self.get_client(session)
+
+        async def scrape():
+            await client.authorize()
+            firmware = await client.get_firmware()
+            await client.logout()
+            return firmware
+
+        firmware = asyncio.run(scrape())
+        for field, value in FIRMWARE.items():
+            self.assertEqual(getattr(firmware, field), value)
+        self.assertEqual(client.router._responses, {})
+        self.assertFalse(client.router._logged)
+        self.assertEqual(session.paths[:3], [
+            'login?form=keys',
+            'login?form=auth',
+            'login?form=login',
+        ])
+
+    def test_rejected_login_fetches_keys_again(self):
+        session = FakeRouterSession('password', rejected_logins=1)
+        client = self.get_client(session)
+        asyncio.run(client.authorize())
+        self.assertTrue(client.router._logged)
+        self.assertEqual(session.paths.count('login?form=keys'), 2)
+        self.assertEqual(session.paths.count('login?form=login'), 2)
+
+    def test_tplinkrouterc6u_pinned_to_replayed_version(self):
+        with open(REQUIREMENTS_PATH) as f:
+            pins = [line.strip() for line in f]
+        self.assertIn(
+            f'tplinkrouterc6u=='
+            f'{self.async_tp_link_router.TPLINKROUTERC6U_VERSION}',
+            pins)
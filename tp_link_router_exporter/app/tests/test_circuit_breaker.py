@@ -0,0 +1,70 @@
+import unittest
+from tp_link_router_exporter.app.clients.circuit_breaker import CircuitBreaker
+from tp_link_router_exporter.app.common.circuit_breaker_states import (
+    CircuitBreakerStates,
+)
+
+
+class NoJitterCircuitBreaker(CircuitBreaker):
+    @classmethod
+    def get_random(cls):
+        return 0.0
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def get_breaker(self, failure_threshold=3):
+        return NoJitterCircuitBreaker(failure_threshold, 30, 120)
+
+    def test_opens_after_threshold(self):
+        breaker = self.get_breaker()
+        breaker.record_failure(now=0)
+        breaker.record_failure(now=0)
+        self.assertIs(breaker.state, CircuitBreakerStates.CLOSED)
+        self.assertTrue(breaker.allow_request(now=0))
+        breaker.record_failure(now=0)
+        self.assertIs(breaker.state, CircuitBreakerStates.OPEN)
+        self.assertEqual(breaker.next_attempt_at, 30)
+        self.assertFalse(breaker.allow_request(now=29))
+
+    def test_half_open_backs_off_exponentially(self):
+        breaker = self.get_breaker(failure_threshold=1)
+        breaker.record_failure(now=0)
+        expected_backoffs = [60, 120, 120]
+        now = breaker.next_attempt_at
+        for backoff in expected_backoffs:
+            self.assertTrue(breaker.allow_request(now=now))
+            self.assertIs(breaker.state, CircuitBreakerStates.HALF_OPEN)
+            breaker.record_failure(now=now)
+            self.assertIs(breaker.state, CircuitBreakerStates.OPEN)
+            self.assertEqual(breaker.next_attempt_at, now + backoff)
+            now = breaker.next_attempt_at
+
+    def test_success_closes(self):
+        breaker = self.get_breaker(failure_threshold=1)
+        breaker.record_failure(now=0)
+        self.assertTrue(breaker.allow_request(now=30))
+        breaker.record_success()
+        self.assertIs(breaker.state, CircuitBreakerStates.CLOSED)
+        self.assertEqual(breaker.consecutive_failures, 0)
+        self.assertIsNone(breaker.next_attempt_at)
+
+    def test_jitter_shortens_backoff(self):
+        class FullJitterCircuitBreaker(CircuitBreaker):
+            @classmethod
+            def get_random(cls):
+                return 1.0
+
+        breaker = FullJitterCircuitBreaker(1, 30, 120, jitter=0.5)
+        breaker.record_failure(now=0)
+        self.assertEqual(breaker.next_attempt_at, 15)
+
+    def test_disabled_never_opens(self):
+        breaker = self.get_breaker(failure_threshold=0)
+        for _ in range(10):
+            breaker.record_failure(now=0)
+        self.assertIs(breaker.state, CircuitBreakerStates.CLOSED)
+        self.assertTrue(breaker.allow_request(now=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import time
+import threading
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class FakeCollector(object):
+    def __init__(self, name, scrapes, fail=False):
+        self.name = name
+        self.scrapes = scrapes
+        self.fail = fail
+
+    def __repr__(self):
+        return f'FakeCollector ({self.name})'
+
+    def update_router_metrics(self):
+        self.scrapes.start()
+        try:
+            time.sleep(0.05)
+            if self.fail:
+                raise ValueError(f'{self.name} is down')
+            self.scrapes.recorded.append(self.name)
+            return self.name
+        finally:
+            self.scrapes.stop()
+
+
+class Scrapes(object):
+    """Counts the scrapes running at the same time"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.recorded = []
+
+    def start(self):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def stop(self):
+        with self.lock:
+            self.running -= 1
+
+
+class TestCollectorRouter(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.routers.collector_router import (
+            CollectorRouter,
+        )
+
+        class FakeCollectorRouter(CollectorRouter):
+            # instead of the env vars or config file
+            max_concurrent_routers = 1
+            is_async_scrape_engine = False
+
+        self.router_class = FakeCollectorRouter
+        self.scrapes = Scrapes()
+
+    def get_router(self, max_concurrent_routers, names, failing=()):
+        router = self.router_class()
+        router.max_concurrent_routers = max_concurrent_routers
+        router._collectors = [
+            FakeCollector(name, self.scrapes, fail=name in failing)
+            for name in names
+        ]
+        return router
+
+    def test_routers_are_scraped_concurrently(self):
+        router = self.get_router(3, ['a', 'b', 'c'])
+        router.update_all_collectors_metrics()
+        self.assertEqual(self.scrapes.max_running, 3)
+        self.assertEqual(sorted(self.scrapes.recorded), ['a', 'b', 'c'])
+
+    def test_max_concurrent_routers_is_respected(self):
+        router = self.get_router(2, ['a', 'b', 'c', 'd', 'e'])
+        router.update_all_collectors_metrics()
+        self.assertEqual(self.scrapes.max_running, 2)
+        self.assertEqual(len(self.scrapes.recorded), 5)
+        # one at a time, in order
+        self.scrapes = Scrapes()
+        router = self.get_router(1, ['f', 'g'])
+        router.update_all_collectors_metrics()
+        self.assertEqual(self.scrapes.max_running, 1)
+        self.assertEqual(self.scrapes.recorded, ['f', 'g'])
+
+    def test_failing_router_does_not_stop_the_others(self):
+        router = self.get_router(2, ['a', 'b', 'c'], failing=['b'])
+        listened = []
+        router.add_scrape_listener(lambda: listened.append(True))
+        router.update_all_collectors_metrics()
+        self.assertEqual(sorted(self.scrapes.recorded), ['a', 'c'])
+        self.assertEqual(listened, [True])
@@ -0,0 +1,112 @@
+import time
+import tempfile
+from tplinkrouterc6u.encryption import EncryptionWrapper
+from tplinkrouterc6u.exception import ClientError
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+SESSION_ERROR = ClientError(
+    "TplinkRouter - TplinkRouter - An unknown response - Router didn't "
+    "respond with JSON; Request admin/firmware?form=upgrade - Response "
+    "{'success': False, 'errorcode': 'timeout'}")
+ROUTER_ERROR = ClientError(
+    "TplinkRouter - TplinkRouter - Response with error; Request "
+    "admin/firmware?form=upgrade - Response {'success': False}")
+
+
+class FakeTplinkRouter(object):
+    def __init__(self, fetch_errors=None):
+        self.fetch_errors = list(fetch_errors or [])
+        self.authorize_calls = 0
+        self.fetch_calls = 0
+        self.logout_calls = 0
+
+    def authorize(self):
+        self.authorize_calls += 1
+
+    def get_firmware(self):
+        self.fetch_calls += 1
+        if self.fetch_errors:
+            raise self.fetch_errors.pop(0)
+        return 'firmware'
+
+    def logout(self):
+        self.logout_calls += 1
+
+
+class TestCollectorSession(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import Collector
+        from tp_link_router_exporter.app.clients import tp_link_router
+        self.collector_class = Collector
+        self.tp_link_router = tp_link_router
+        self.lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.lock_dir.cleanup)
+
+    def get_collector(self, fake_router, **kwargs):
+        router_client = self.tp_link_router.TPLinkRouter(
+            router_ip='http://10.0.0.1',
+            router_password='password')
+        router_client._router = fake_router
+        collector = self.collector_class.get_collector(
+            router_client=router_client,
+            router_name='session_test',
+            session_reuse=1,
+            **kwargs)
+        collector.router_lock.directory = self.lock_dir.name
+        self.addCleanup(collector._cancel_idle_logout)
+        return collector
+
+    def test_reauthorizes_once_on_session_error(self):
+        fake_router = FakeTplinkRouter([SESSION_ERROR])
+        collector = self.get_collector(fake_router)
+        collector._authorize()
+        result = collector._call_with_session(
+            collector.router_client.get_firmware)
+        self.assertEqual(result, 'firmware')
+        self.assertEqual(fake_router.authorize_calls, 2)
+        self.assertEqual(fake_router.fetch_calls, 2)
+
+    def test_router_errors_are_not_retried(self):
+        fake_router = FakeTplinkRouter([ROUTER_ERROR])
+        collector = self.get_collector(fake_router)
+        collector._authorize()
+        with self.assertRaises(ClientError):
+            collector._call_with_session(
+                collector.router_client.get_firmware)
+        self.assertEqual(fake_router.authorize_calls, 1)
+        self.assertEqual(fake_router.fetch_calls, 1)
+        self.assertTrue(collector.router_client.is_authorized)
+
+    def test_undecryptable_response_is_session_error(self):
+        router = self.tp_link_router.SessionTplinkRouter(
+            'http://10.0.0.1',
+            'password')
+        router._encryption = EncryptionWrapper()
+        other_session = EncryptionWrapper()
+        data = {'data': other_session.aes_encrypt('{"success": true}')}
+        with self.assertRaises(
+                self.tp_link_router.TPLinkRouterDecryptException) as raised:
+            router._decrypt_response(data)
+        error = ClientError(
+            f'TplinkRouter - An unknown response - {raised.exception}')
+        self.assertTrue(self.tp_link_router.TPLinkRouter.is_session_error(
+            error))
+        self.assertFalse(self.tp_link_router.TPLinkRouter.is_session_error(
+            ROUTER_ERROR))
+
+    def test_idle_session_is_logged_out(self):
+        fake_router = FakeTplinkRouter()
+        collector = self.get_collector(
+            fake_router,
+            session_idle_logout_seconds=0.05)
+        collector._authorize()
+        collector._schedule_idle_logout()
+        deadline = time.monotonic() + 5
+        while fake_router.logout_calls == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(fake_router.logout_calls, 1)
+        self.assertFalse(collector.router_client.is_authorized)
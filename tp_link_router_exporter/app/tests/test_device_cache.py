@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+from collections import namedtuple
+from tplinkrouterc6u.enum import Wifi
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+FakeDevice = namedtuple(
+    'FakeDevice',
+    ['macaddress', 'ipaddress', 'type', 'hostname',
+     'packets_sent', 'packets_received'],
+    defaults=[Wifi.WIFI_5G, 'phone', 10, None])
+
+
+class TestDeviceCache(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.device_cache import (
+            DeviceCache,
+        )
+        from tp_link_router_exporter.app.clients.device_cache_store import (
+            DeviceCacheStore,
+        )
+        self.device_cache = DeviceCache()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.device_cache_store = DeviceCacheStore(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def scrape(self, *macs):
+        self.device_cache.start_generation()
+        for mac in macs:
+            device = FakeDevice(mac, f'10.0.0.{mac}')
+            self.device_cache.add_or_update_device(device)
+
+    def test_only_departed_devices_are_stale(self):
+        self.scrape(1, 2, 3)
+        self.assertEqual(self.device_cache.get_stale_devices_map(), {})
+        self.scrape(3, 1)
+        stale = self.device_cache.get_stale_devices_map()
+        self.assertEqual(list(stale), ['2'])
+        self.assertEqual(self.device_cache.drop_all_stale_devices(), 1)
+        self.assertEqual(list(self.device_cache.devices), ['3', '1'])
+
+    def test_returning_device_is_fresh_again(self):
+        self.scrape(1, 2)
+        self.scrape(1)
+        self.device_cache.drop_all_stale_devices()
+        self.scrape(2, 1)
+        self.assertEqual(self.device_cache.get_stale_devices_map(), {})
+        self.assertTrue(self.device_cache.has_device(FakeDevice(2, None)))
+
+    def test_store_round_trip_keeps_departures(self):
+        self.assertIsNone(self.device_cache_store.load('router 1'))
+        self.scrape(1, 2, 3)
+        self.device_cache_store.save('router 1', self.device_cache)
+        self.device_cache = self.device_cache_store.load('router 1')
+        self.assertEqual(list(self.device_cache.devices), ['1', '2', '3'])
+        device = self.device_cache.devices['2'].device
+        self.assertEqual(device.type, Wifi.WIFI_5G)
+        self.assertEqual(device.ipaddress, '10.0.0.2')
+        self.assertEqual(device.packets_sent, 10)
+        self.scrape(1, 3)
+        stale = self.device_cache.get_stale_devices_map()
+        self.assertEqual(list(stale), ['2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import tempfile
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.tests.test_collector_session import (
+    FakeTplinkRouter,
+)
+from tp_link_router_exporter.app.tests.test_device_cache import FakeDevice
+
+
+class TestDeviceEviction(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import Collector
+        from tp_link_router_exporter.app.clients import tp_link_router
+        from tp_link_router_exporter.app.metrics import Metrics
+        self.collector_class = Collector
+        self.tp_link_router = tp_link_router
+        self.gauge = Metrics.ROUTER_DEVICE_CONNECTED_STATUS
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def get_collector(self, **kwargs):
+        router_client = self.tp_link_router.TPLinkRouter(
+            router_ip='http://10.0.0.4',
+            router_password='password')
+        router_client._router = FakeTplinkRouter()
+        return self.collector_class.get_collector(
+            router_client=router_client,
+            router_name=f'eviction_test_{self.id()}',
+            device_cache_dir=self.directory.name,
+            **kwargs)
+
+    def scrape(self, collector, *macs):
+        collector._update_last_update_date()
+        for mac in macs:
+            device = FakeDevice(mac, f'10.0.0.{mac}')
+            collector.add_or_update_device(device)
+            collector.device_eviction.mark_present(mac)
+            # the same series a connected device would get, set to `0`
+            collector._record_disconnected_device(device)
+        collector._record_missing_and_drop_stale_devices()
+
+    def has_series(self, collector, mac):
+        return any(
+            labels[-1] == mac and labels[0] == collector.router_name
+            for labels in self.gauge._metrics)
+
+    def test_series_are_removed_after_ttl(self):
+        collector = self.get_collector(device_eviction_ttl_seconds=60)
+        eviction = collector.device_eviction
+        self.scrape(collector, '1', '2')
+        self.scrape(collector, '1')
+        self.assertIn('2', eviction.departed_devices)
+        self.assertTrue(self.has_series(collector, '2'))
+        eviction.departed_devices['2'].departed_at -= 61
+        self.scrape(collector, '1')
+        self.assertEqual(eviction.departed_devices, {})
+        self.assertFalse(self.has_series(collector, '2'))
+        self.assertTrue(self.has_series(collector, '1'))
+
+    def test_returning_device_is_not_departed(self):
+        collector = self.get_collector(device_eviction_ttl_seconds=60)
+        eviction = collector.device_eviction
+        self.scrape(collector, '1', '2')
+        self.scrape(collector, '1')
+        self.scrape(collector, '1', '2')
+        self.assertEqual(eviction.departed_devices, {})
+        self.assertEqual(eviction.pop_expired(eviction.get_now() + 120), [])
+        self.assertTrue(self.has_series(collector, '2'))
+
+    def test_departures_are_not_kept_without_ttl(self):
+        collector = self.get_collector(
+            device_eviction_ttl_seconds=0,
+            metrics_recording_mode='snapshot')
+        self.scrape(collector, '1', '2')
+        self.scrape(collector, '1')
+        self.assertEqual(collector.device_eviction.departed_devices, {})
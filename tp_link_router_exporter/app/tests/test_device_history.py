@@ -0,0 +1,96 @@
+import os
+import tempfile
+from collections import namedtuple
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+FakeDevice = namedtuple(
+    'FakeDevice',
+    ['macaddress', 'packets_sent', 'packets_received'])
+
+
+class TestDeviceHistory(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.device_history import (
+            DeviceHistory,
+        )
+        self.history_class = DeviceHistory
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = DeviceHistory(
+            'router/one',
+            samples=3,
+            max_devices=2,
+            directory=self.directory.name)
+
+    def tearDown(self):
+        self.history._close()
+        self.directory.cleanup()
+
+    def get_values(self, mac):
+        return [
+            (s.timestamp, s.connected, s.packets_sent)
+            for s in self.history.get_samples(mac)
+        ]
+
+    def test_fixed_file_size(self):
+        self.history.append([FakeDevice('aa:00:00:00:00:01', 1, 2)], now=1)
+        self.assertEqual(
+            os.path.getsize(self.history.get_path()),
+            self.history_class.get_file_bytes(3, 2))
+        self.assertEqual(
+            self.history_class.get_file_bytes(3, 2),
+            64 + 3 * 16 + 2 * (24 + 3 * 17))
+
+    def test_ring_wraps_and_records_departures(self):
+        device = FakeDevice('aa:00:00:00:00:01', 1, 2)
+        for now in range(1, 5):
+            devices = [] if now == 3 else [device._replace(packets_sent=now)]
+            self.history.append(devices, now=now)
+        self.assertEqual(
+            self.get_values('AA-00-00-00-00-01'),
+            [(2, 1, 2), (3, 0, None), (4, 1, 4)])
+        self.assertIsNone(self.history.get_samples('aa:00:00:00:00:09'))
+
+    def test_least_recently_seen_slot_is_handed_over(self):
+        first = FakeDevice('aa:00:00:00:00:01', 1, 1)
+        second = FakeDevice('aa:00:00:00:00:02', 2, 2)
+        third = FakeDevice('aa:00:00:00:00:03', 3, 3)
+        self.history.append([first, second], now=1)
+        self.history.append([second], now=2)
+        self.history.append([second, third], now=3)
+        self.assertIsNone(self.history.get_samples(first.macaddress))
+        self.assertEqual(self.get_values(third.macaddress), [(3, 1, 3)])
+        self.assertEqual(len(self.get_values(second.macaddress)), 3)
+
+    def test_slots_read_again_after_another_writer(self):
+        other = self.history_class(
+            'router/one',
+            samples=3,
+            max_devices=2,
+            directory=self.directory.name)
+        first = FakeDevice('aa:00:00:00:00:01', 1, 1)
+        second = FakeDevice('aa:00:00:00:00:02', 2, 2)
+        self.history.append([first], now=1)
+        other.append([first, second], now=2)
+        other._close()
+        self.history.append([first, second], now=3)
+        self.assertEqual(
+            self.get_values(second.macaddress),
+            [(2, 1, 2), (3, 1, 2)])
+
+    def test_downsample(self):
+        sample = self.history_class.downsample
+        Sample = namedtuple(
+            'Sample',
+            ['timestamp', 'connected', 'packets_sent', 'packets_received'])
+        history = [
+            Sample(10, 1, 5, 6),
+            Sample(20, 0, None, None),
+            Sample(30, 1, 7, 8),
+        ]
+        self.assertEqual(
+            [tuple(s) for s in sample(history, 20)],
+            [(0, 1.0, 5, 6), (20, 0.5, 7, 8)])
@@ -0,0 +1,59 @@
+import macaddress
+from ipaddress import IPv4Address
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.tests.test_device_cache import FakeDevice
+
+
+class TestDeviceMetricChildrenCache(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.device_metric_children import (  # noqa: E501
+            DeviceMetricChildrenCache,
+        )
+        self.cache = DeviceMetricChildrenCache('children_test')
+        self.mac = macaddress.EUI48('AA-BB-CC-DD-EE-FF')
+        self.device = FakeDevice(self.mac, IPv4Address('10.0.0.2'))
+
+    def get_label_values(self, children):
+        return dict(zip(
+            children.connected_status.labelnames,
+            children.connected_status.label_values))
+
+    def test_unchanged_device_is_a_hit(self):
+        children = self.cache.get(self.device)
+        # the router hands out new but equal objects every scrape
+        same_device = FakeDevice(
+            macaddress.EUI48(str(self.mac)),
+            IPv4Address('10.0.0.2'))
+        self.assertIs(self.cache.get(same_device), children)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_changed_hostname_or_ip_rebinds(self):
+        children = self.cache.get(self.device)
+        renamed = self.device._replace(hostname='laptop')
+        renamed_children = self.cache.get(renamed)
+        self.assertIsNot(renamed_children, children)
+        self.assertEqual(
+            self.get_label_values(renamed_children)['hostname'],
+            'laptop')
+        moved = renamed._replace(ipaddress=IPv4Address('10.0.0.3'))
+        moved_children = self.cache.get(moved)
+        self.assertIsNot(moved_children, renamed_children)
+        self.assertEqual(
+            self.get_label_values(moved_children)['ip_address'],
+            '10.0.0.3')
+        # still one device, the old labels are replaced
+        self.assertEqual(len(self.cache), 1)
+
+    def test_pop_mac_by_string(self):
+        self.cache.get(self.device)
+        # the same device reported with a string MAC is another key
+        self.cache.get(self.device._replace(macaddress=str(self.mac)))
+        self.assertEqual(len(self.cache), 2)
+        # only the string form is looked up, an `EUI48` finds nothing
+        self.cache.pop_mac(self.mac)
+        self.assertEqual(len(self.cache), 2)
+        self.cache.pop_mac(str(self.mac))
+        self.assertEqual(len(self.cache), 0)
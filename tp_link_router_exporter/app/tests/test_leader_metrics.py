@@ -0,0 +1,75 @@
+import os
+import tempfile
+from datetime import datetime
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class TestLeaderMetrics(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients import leader_metrics
+        from tp_link_router_exporter.app.clients import scheduler_leader
+        from tp_link_router_exporter.app.clients.lease_expiry import (
+            LeaseExpiry,
+            LeaseExpiryAnchors,
+        )
+        from tp_link_router_exporter.app.clients.router_snapshot import (
+            RouterSnapshot,
+            RouterSnapshotFamily,
+        )
+        self.leader_metrics = leader_metrics
+        self.scheduler_leader = scheduler_leader
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.family = RouterSnapshotFamily(
+            'tp_link_router_exporter_device_connected_status',
+            'This is set to 1 when a device is connected to this router',
+            'gauge',
+            ('router_name', 'mac_address'),
+            ((('router 1', 'AA-BB'), 1.0), (('router 1', 'CC-DD'), 0.0)))
+        self.snapshot = RouterSnapshot(
+            'router 1',
+            datetime(2026, 1, 2, 3, 4, 5),
+            [self.family])
+        self.anchors = LeaseExpiryAnchors('router 1')
+        self.anchors.restore([
+            LeaseExpiry('phone', '10.0.0.2', 'AA-BB', 1000.5),
+            LeaseExpiry(None, '10.0.0.3', 'CC-DD', 2000.0),
+        ])
+
+    def get_leader(self, directory):
+        return self.scheduler_leader.SchedulerLeader(directory)
+
+    def test_state_round_trip(self):
+        collector_class = self.leader_metrics.LeaderMetricsCollector
+        data = collector_class.dumps(
+            {'router 1': self.snapshot},
+            {'router 1': self.anchors})
+        snapshots, leases = collector_class.loads(data)
+        snapshot = snapshots.get_snapshot('router 1')
+        self.assertEqual(snapshot.created_date, self.snapshot.created_date)
+        self.assertEqual(snapshot.families, (self.family,))
+        anchors = leases.anchors['router 1']
+        self.assertEqual(
+            [(e.hostname, e.ip_address, e.expires_at)
+             for e in anchors.expiries.values()],
+            [('phone', '10.0.0.2', 1000.5), (None, '10.0.0.3', 2000.0)])
+
+    def test_creates_private_directory(self):
+        directory = os.path.join(self.tmp_dir.name, 'leader')
+        leader = self.get_leader(directory)
+        self.assertEqual(leader.ensure_directory(), directory)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_refuses_directory_others_can_write(self):
+        directory = os.path.join(self.tmp_dir.name, 'shared')
+        os.mkdir(directory)
+        os.chmod(directory, 0o777)
+        leader = self.get_leader(directory)
+        with self.assertRaises(
+                self.scheduler_leader.SchedulerLeaderDirectoryException):
+            leader.ensure_directory()
+        collector = self.leader_metrics.LeaderMetricsCollector(leader)
+        self.assertEqual(collector._load(), [])
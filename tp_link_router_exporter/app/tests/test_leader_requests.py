@@ -0,0 +1,61 @@
+import tempfile
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class TestLeaderRequests(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.leader_requests import (
+            LeaderRequests,
+        )
+        from tp_link_router_exporter.app.clients.scheduler_leader import (
+            SchedulerLeader,
+        )
+        from tp_link_router_exporter.app.common.leader_request_types import (
+            LeaderRequestTypes,
+        )
+        self.request_types = LeaderRequestTypes
+        self.directory = tempfile.TemporaryDirectory()
+        leader = SchedulerLeader(self.directory.name)
+        self.leader_requests = LeaderRequests(leader, timeout_seconds=5)
+        self.follower_requests = LeaderRequests(leader, timeout_seconds=5)
+
+    def tearDown(self):
+        server = self.leader_requests._server
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        self.directory.cleanup()
+
+    def test_send_runs_handler_in_leader(self):
+        calls = []
+        self.leader_requests.serve({
+            self.request_types.UPDATE_STALE: lambda: calls.append('stale'),
+        })
+        sent = self.follower_requests.send(self.request_types.UPDATE_STALE)
+        self.assertTrue(sent)
+        self.assertEqual(calls, ['stale'])
+
+    def test_send_fails_without_handler_or_on_error(self):
+        def fail():
+            raise ValueError('router down')
+
+        self.leader_requests.serve({self.request_types.UPDATE_ALL: fail})
+        send = self.follower_requests.send
+        self.assertFalse(send(self.request_types.UPDATE_ALL))
+        self.assertFalse(send(self.request_types.UPDATE_SIMPLE))
+
+    def test_send_fails_without_leader(self):
+        sent = self.follower_requests.send(self.request_types.UPDATE_STALE)
+        self.assertFalse(sent)
+
+    def test_serve_replaces_socket_of_dead_leader(self):
+        with open(self.leader_requests.get_path(), 'w') as f:
+            f.write('')
+        self.leader_requests.serve({
+            self.request_types.UPDATE_ALL: lambda: None,
+        })
+        self.assertTrue(
+            self.follower_requests.send(self.request_types.UPDATE_ALL))
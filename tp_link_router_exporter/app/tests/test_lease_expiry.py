@@ -0,0 +1,49 @@
+import unittest
+from collections import namedtuple
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+FakeLease = namedtuple(
+    'FakeLease',
+    ['macaddress', 'ipaddress', 'hostname', 'lease_time'])
+
+
+class TestLeaseExpiry(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.lease_expiry import (
+            LeaseExpiryAnchors,
+            InvalidLeaseTimeException,
+        )
+        self.anchors_class = LeaseExpiryAnchors
+        self.invalid_exception = InvalidLeaseTimeException
+
+    def test_parse_lease_seconds(self):
+        parse = self.anchors_class.parse_lease_seconds
+        self.assertEqual(parse('01:02:03'), 3723)
+        self.assertEqual(parse('26:00:00'), 93600)
+        self.assertEqual(parse('1 day 02:03:04'), 93784)
+        self.assertEqual(parse('2 days, 03:04:05'), 183845)
+        self.assertEqual(parse('3d 04:05:06'), 273906)
+        self.assertEqual(parse('1:02:03:04'), 93784)
+        self.assertEqual(parse(''), 0)
+        with self.assertRaises(self.invalid_exception):
+            parse('soon')
+
+    def test_anchor_skips_permanent_leases(self):
+        anchors = self.anchors_class('router')
+        anchors.anchor([
+            FakeLease('aa', '10.0.0.2', 'phone', '00:10:00'),
+            FakeLease('bb', '10.0.0.3', 'nas', 'Permanent'),
+        ], now=1000.0)
+        self.assertEqual(list(anchors.expiries), ['aa'])
+        expiry = anchors.get_expiry('aa')
+        self.assertEqual(expiry.expires_at, 1600.0)
+        self.assertEqual(expiry.get_remaining_seconds(1100.0), 500.0)
+        self.assertEqual(expiry.get_remaining_seconds(2000.0), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import gzip
+import json
+import marshal
+import tempfile
+import unittest
+from tp_link_router_exporter.metrics_server import (
+    FILE_NAME,
+    GZIP_FILE_NAME,
+    LEASE_NAME,
+    LEASES_FILE_NAME,
+    STATE_FILE_NAME,
+    LeaderStateCollector,
+    PrerenderedMetrics,
+    accepts_gzip,
+)
+
+
+class TestAcceptsGzip(unittest.TestCase):
+    def test_accept_encoding(self):
+        self.assertTrue(accepts_gzip('gzip'))
+        self.assertTrue(accepts_gzip('deflate, GZIP;q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip(None))
+        self.assertFalse(accepts_gzip('identity'))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('*, gzip;q=0'))
+
+
+class TestPrerenderedMetrics(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.metrics = PrerenderedMetrics(
+            self.directory.name,
+            started_at_ns=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_pages(self, plain, compressed, series=None):
+        leases = json.dumps({
+            'name': 'lease_remaining_seconds',
+            'documentation': 'Time left',
+            'series': series or [],
+        }).encode('utf-8')
+        for file_name, body in [(LEASES_FILE_NAME, leases),
+                                (FILE_NAME, plain),
+                                (GZIP_FILE_NAME, compressed)]:
+            with open(os.path.join(self.directory.name, file_name), 'wb') as f:
+                f.write(body)
+
+    def test_no_pages_yet(self):
+        self.assertEqual(self.metrics.get_pages(), (None, None))
+
+    def test_ignores_pages_of_earlier_run(self):
+        self.write_pages(b'plain', b'gz')
+        for file_name in [FILE_NAME, GZIP_FILE_NAME, LEASES_FILE_NAME]:
+            path = os.path.join(self.directory.name, file_name)
+            os.utime(path, ns=(1, 1))
+        self.metrics.started_at_ns = 2
+        self.assertEqual(self.metrics.get_pages(), (None, None))
+
+    def test_lease_remaining_at_pull_time(self):
+        lines = b'up 1.0\n'
+        self.write_pages(
+            lines,
+            gzip.compress(lines),
+            [['{mac_address="aa"}', 100.0]])
+        lease_line = b'lease_remaining_seconds{mac_address="aa"} '
+        _, body = self.metrics.get_page(None, now=40.0)
+        self.assertTrue(body.startswith(lines))
+        self.assertIn(lease_line + b'60.0\n', body)
+        _, body = self.metrics.get_page('gzip', now=150.0)
+        self.assertIn(lease_line + b'0.0\n', gzip.decompress(body))
+
+    def test_negotiates_and_reloads(self):
+        self.write_pages(b'plain', b'gz')
+        self.assertEqual(self.metrics.get_page('gzip'), ('gzip', b'gz'))
+        self.assertEqual(self.metrics.get_page(None), ('identity', b'plain'))
+        self.write_pages(b'plain again', b'gz again')
+        self.assertEqual(
+            self.metrics.get_page('gzip'),
+            ('gzip', b'gz again'))
+
+
+class TestLeaderStateCollector(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.chmod(self.directory.name, 0o700)
+        self.collector = LeaderStateCollector(self.directory.name)
+        # as `LeaderMetricsCollector.dumps` writes it
+        state = (1, [
+            ('router 1', 0.0, [
+                ('connected', 'Connected', 'gauge', ('mac_address',),
+                 ((('AA-BB',), 1.0),)),
+                ('logins', 'Logins', 'counter', ('router_name',),
+                 ((('router 1',), 3.0),)),
+            ]),
+        ], [
+            ('router 1', [('phone', '10.0.0.2', 'AA-BB', 100.0)]),
+        ])
+        path = os.path.join(self.directory.name, STATE_FILE_NAME)
+        with open(path, 'wb') as f:
+            f.write(marshal.dumps(state))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_samples(self, now, name=LEASE_NAME):
+        return [
+            (sample.labels, sample.value)
+            for family in self.collector.collect(now=now)
+            for sample in family.samples
+            if family.name == name
+        ]
+
+    def test_snapshot_families(self):
+        families = {
+            family.name: family
+            for family in self.collector.collect(now=40.0)
+        }
+        self.assertEqual(families['connected'].type, 'gauge')
+        self.assertEqual(
+            self.get_samples(40.0, 'connected'),
+            [({'mac_address': 'AA-BB'}, 1.0)])
+        self.assertEqual(families['logins'].type, 'counter')
+        self.assertEqual(
+            [(s.name, s.value) for s in families['logins'].samples],
+            [('logins_total', 3.0)])
+
+    def test_lease_remaining_at_collect_time(self):
+        labels = {
+            'router_name': 'router 1',
+            'hostname': 'phone',
+            'ip_address': '10.0.0.2',
+            'mac_address': 'AA-BB',
+        }
+        self.assertEqual(self.get_samples(40.0), [(labels, 60.0)])
+        self.assertEqual(self.get_samples(150.0), [(labels, 0.0)])
+
+    def test_ignores_directory_others_can_write(self):
+        os.chmod(self.directory.name, 0o777)
+        self.assertEqual(self.get_samples(40.0), [])
+        self.assertEqual(self.get_samples(40.0, 'connected'), [])
@@ -0,0 +1,145 @@
+import os
+import tempfile
+from unittest import mock
+from prometheus_client import values as prometheus_values
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+# far above any real `pid_max`, so never alive
+DEAD_PID = 2 ** 31 - 1
+
+
+class FakeChild(object):
+    def __init__(self, value):
+        self._value = value
+
+
+class PlainValue(object):
+    _multiprocess = True
+
+    def inc(self, amount):
+        pass
+
+
+class FakeMetric(object):
+    def __init__(self, children):
+        self._metrics = children
+
+
+class TestMultiprocessCompactor(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients import (
+            multiprocess_compactor,
+        )
+        self.compactor_class = multiprocess_compactor.MultiprocessCompactor
+        self.directory = tempfile.TemporaryDirectory()
+        self.compactor = multiprocess_compactor.MultiprocessCompactor(
+            self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, file_name, values):
+        mmaped = MmapedDict(os.path.join(self.directory.name, file_name))
+        for label, value in values.items():
+            mmaped.write_value(self.get_key(label), value)
+        mmaped.close()
+
+    @classmethod
+    def get_key(cls, label):
+        return mmap_key('events', 'events_total', ['event'], [label])
+
+    def read_file(self, file_name):
+        path = os.path.join(self.directory.name, file_name)
+        return dict(self.compactor.read_entries(path))
+
+    def test_parse_file_name(self):
+        self.assertEqual(
+            self.compactor.parse_file_name('/tmp/gauge_all_123.db'),
+            ('gauge_all', '123'))
+        self.assertEqual(
+            self.compactor.parse_file_name('counter_archive.db'),
+            ('counter', 'archive'))
+
+    def test_folds_dead_counters_into_archive(self):
+        self.write_file('counter_archive.db', {'a': 1.0})
+        self.write_file(f'counter_{DEAD_PID}.db', {'a': 2.0, 'b': 3.0})
+        self.write_file(f'counter_{os.getpid()}.db', {'a': 4.0})
+        dropped = self.compactor._compact_dead_files()
+        self.assertEqual(dropped, 1)
+        self.assertEqual(
+            self.read_file('counter_archive.db'),
+            {self.get_key('a'): 3.0, self.get_key('b'): 3.0})
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            sorted(['counter_archive.db', f'counter_{os.getpid()}.db']))
+
+    def test_drops_dead_gauges(self):
+        self.write_file(f'gauge_all_{DEAD_PID}.db', {'a': 1.0})
+        self.write_file(f'gauge_max_{DEAD_PID}.db', {'a': 1.0})
+        self.write_file('gauge_max_archive.db', {'a': 5.0})
+        # left to `mark_process_dead()`
+        self.write_file(f'gauge_livesum_{DEAD_PID}.db', {'a': 1.0})
+        self.compactor._compact_dead_files()
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ['gauge_livesum_2147483647.db', 'gauge_max_archive.db'])
+        self.assertEqual(
+            self.read_file('gauge_max_archive.db'),
+            {self.get_key('a'): 5.0})
+
+    def get_value_class(self):
+        with mock.patch.dict(
+                os.environ,
+                {'PROMETHEUS_MULTIPROC_DIR': self.directory.name}):
+            value_class = prometheus_values.MultiProcessValue()
+            values = {
+                label: value_class(
+                    'counter', 'events', 'events_total', ['event'], [label])
+                for label in 'abc'
+            }
+        for value in values.values():
+            value.inc(1.0)
+        return value_class, values
+
+    def test_compacts_own_files_and_keeps_writing(self):
+        value_class, values = self.get_value_class()
+        state = self.compactor_class.get_value_state(value_class)
+        self.assertIsNotNone(state)
+        self.compactor._value_state = state
+        self.compactor._value_state_checked = True
+        self.compactor.mark_removed(
+            FakeMetric({('b',): FakeChild(values['b'])}),
+            ['b'])
+        self.assertEqual(self.compactor._compact_own_files(state), 1)
+        file_name = f'counter_{os.getpid()}.db'
+        self.assertEqual(
+            self.read_file(file_name),
+            {self.get_key('a'): 1.0, self.get_key('c'): 1.0})
+        self.assertNotIn(values['b'], state['values'])
+        # the live values write to the compacted file from now on
+        values['a'].inc(2.0)
+        self.assertEqual(
+            self.read_file(file_name),
+            {self.get_key('a'): 3.0, self.get_key('c'): 1.0})
+        self.assertEqual(self.compactor._compact_own_files(state), 0)
+
+    def test_own_files_left_alone_on_other_versions(self):
+        value_class, values = self.get_value_class()
+        with mock.patch.object(
+                self.compactor_class,
+                'get_prometheus_client_version',
+                return_value='0.16.0'):
+            self.assertIsNone(
+                self.compactor_class.get_value_state(value_class))
+        self.assertIsNone(
+            self.compactor_class.get_value_state(PlainValue))
+        self.compactor._value_state_checked = True
+        self.compactor.mark_removed(
+            FakeMetric({('b',): FakeChild(values['b'])}),
+            ['b'])
+        self.assertEqual(self.compactor._removed, [])
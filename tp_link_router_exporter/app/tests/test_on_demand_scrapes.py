@@ -0,0 +1,68 @@
+import time
+import tempfile
+import threading
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.tests.test_collector_session import (
+    FakeTplinkRouter,
+)
+
+
+class TestOnDemandScrapes(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import Collector
+        from tp_link_router_exporter.app.clients import tp_link_router
+        from tp_link_router_exporter.app.common.scrape_events import (
+            ScrapeEvents,
+        )
+        self.scrape_events = ScrapeEvents
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        router_client = tp_link_router.TPLinkRouter(
+            router_ip=f'http://10.0.0.3/{self.id()}',
+            router_password='password')
+        router_client._router = FakeTplinkRouter()
+        self.collector = Collector.get_collector(
+            router_client=router_client,
+            router_name='on_demand_test',
+            on_demand_ttl_seconds=60)
+        self.collector.router_lock.directory = self.directory.name
+        self.scrapes = 0
+        # only the single-flight and TTL checks around it are under test
+        self.collector.get_router_metrics = self.scrape
+
+    def scrape(self):
+        self.scrapes += 1
+        time.sleep(0.1)
+        return self.scrapes
+
+    def get_event_count(self, event):
+        return self.collector._scrape_event_children[event]._value.get()
+
+    def test_concurrent_callers_share_one_scrape(self):
+        callers = 5
+        barrier = threading.Barrier(callers)
+
+        def call():
+            barrier.wait(5)
+            self.collector.update_router_metrics_if_stale()
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(self.scrapes, 1)
+
+    def test_fresh_scrape_is_skipped_until_ttl(self):
+        fresh = self.scrape_events.ON_DEMAND_FRESH
+        before = self.get_event_count(fresh)
+        self.assertEqual(self.collector.update_router_metrics_if_stale(), 1)
+        self.assertIsNone(self.collector.update_router_metrics_if_stale())
+        self.assertEqual(self.scrapes, 1)
+        self.assertEqual(self.get_event_count(fresh), before + 1)
+        # once the last scrape is older than the TTL
+        self.collector._last_scraped_at -= 61
+        self.assertEqual(self.collector.update_router_metrics_if_stale(), 2)
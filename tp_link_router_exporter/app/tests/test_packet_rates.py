@@ -0,0 +1,39 @@
+import unittest
+from tp_link_router_exporter.app.clients.packet_rates import PacketRates
+from tp_link_router_exporter.app.common.packet_actions import PacketActions
+
+
+MAC = 'AA-BB-CC-DD-EE-FF'
+SENT = PacketActions.SENT
+
+
+class TestPacketRates(unittest.TestCase):
+    def setUp(self):
+        self.rates = PacketRates()
+
+    def test_first_sample_has_no_rate(self):
+        self.assertEqual(self.rates.observe(MAC, SENT, 500, 0.0), (0, False))
+        rate = self.rates.get(MAC, SENT)
+        self.assertEqual(rate.total, 0)
+        self.assertIsNone(rate.per_second)
+
+    def test_rate_and_reset(self):
+        self.rates.observe(MAC, SENT, 100, 0.0)
+        self.assertEqual(self.rates.observe(MAC, SENT, 160, 30.0), (60, False))
+        self.assertEqual(self.rates.get(MAC, SENT).per_second, 2.0)
+        # the router rebooted and counted 30 since
+        self.assertEqual(self.rates.observe(MAC, SENT, 30, 60.0), (30, True))
+        rate = self.rates.get(MAC, SENT)
+        self.assertEqual(rate.total, 90)
+        self.assertEqual(rate.per_second, 1.0)
+
+    def test_disconnected_device_starts_its_rate_over(self):
+        self.rates.observe(MAC, SENT, 100, 0.0)
+        rates = self.rates.mark_disconnected(MAC)
+        self.assertEqual(rates[SENT].per_second, 0.0)
+        self.assertEqual(self.rates.observe(MAC, SENT, 5, 90.0), (5, True))
+        rate = self.rates.get(MAC, SENT)
+        self.assertEqual(rate.total, 5)
+        self.assertIsNone(rate.per_second)
+        self.rates.pop_mac(MAC)
+        self.assertIsNone(self.rates.get(MAC, SENT))
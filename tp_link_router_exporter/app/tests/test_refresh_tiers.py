@@ -0,0 +1,74 @@
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.clients.refresh_tier import RefreshTier
+from tp_link_router_exporter.app.tests.test_collector_session import (
+    FakeTplinkRouter,
+)
+
+
+class TestRefreshTiers(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import Collector
+        from tp_link_router_exporter.app.clients import tp_link_router
+        from tp_link_router_exporter.app.common.router_endpoints import (
+            RouterEndpoints,
+        )
+        from tp_link_router_exporter.app.common.scrape_events import (
+            ScrapeEvents,
+        )
+        router_client = tp_link_router.TPLinkRouter(
+            router_ip='http://10.0.0.6',
+            router_password='password')
+        router_client._router = FakeTplinkRouter()
+        self.endpoint = RouterEndpoints.FIRMWARE
+        self.collector = Collector.get_collector(
+            router_client=router_client,
+            router_name=f'refresh_tier_test_{self.id()}',
+            **{self.endpoint.refresh_seconds_key_name: 60})
+        self.cached_event = ScrapeEvents.RECORD_CACHED_RESULT
+        self.tier = self.collector.get_refresh_tier(self.endpoint)
+        self.fetches = 0
+        self.recorded = []
+
+    def fetch(self):
+        self.fetches += 1
+        return f'firmware {self.fetches}'
+
+    def get_and_record(self):
+        self.collector._get_and_record(
+            self.endpoint,
+            self.fetch,
+            self.recorded.append,
+            'firmware')
+
+    def get_cached_count(self):
+        children = self.collector._scrape_event_children
+        return children[self.cached_event]._value.get()
+
+    def test_tier_is_fetched_only_when_due(self):
+        cached_before = self.get_cached_count()
+        self.get_and_record()
+        # skipped before its period passed, the cached result is recorded
+        self.get_and_record()
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(self.recorded, ['firmware 1', 'firmware 1'])
+        self.assertEqual(self.get_cached_count(), cached_before + 1)
+        # fetched again once it is due
+        self.tier._fetched_at -= 60
+        self.get_and_record()
+        self.assertEqual(self.fetches, 2)
+        self.assertEqual(self.recorded[-1], 'firmware 2')
+        self.assertEqual(self.get_cached_count(), cached_before + 1)
+
+    def test_is_due(self):
+        self.assertTrue(self.tier.is_due(now=0.0))
+        self.tier.update('firmware', now=100.0)
+        self.assertFalse(self.tier.is_due(now=158.0))
+        # a scheduler tick a little early still refreshes
+        self.assertTrue(self.tier.is_due(now=159.0))
+        # `0` fetches every scrape
+        every_scrape = RefreshTier(self.endpoint, 0)
+        every_scrape.update('firmware', now=100.0)
+        self.assertTrue(every_scrape.is_due(now=100.0))
@@ -0,0 +1,162 @@
+import fcntl
+import time
+import tempfile
+import threading
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.tests.test_collector_session import (
+    FakeTplinkRouter,
+)
+
+
+class TestRouterLock(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients import router_lock
+        self.router_lock = router_lock
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        # thread locks are per `router_ip` for the whole process
+        self.router_ip = f'http://10.0.0.1/{self.id()}'
+
+    def get_lock(self, timeout_seconds=5):
+        return self.router_lock.RouterLock(
+            self.router_ip,
+            directory=self.directory.name,
+            timeout_seconds=timeout_seconds)
+
+    def hold_in_thread(self, lock):
+        acquired = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with lock.hold():
+                acquired.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait(5)
+
+        def stop():
+            release.set()
+            thread.join(5)
+
+        self.addCleanup(stop)
+        return stop
+
+    def test_threads_take_turns(self):
+        events = []
+
+        def scrape(name):
+            with self.get_lock().hold_or_raise():
+                events.append(f'{name} in')
+                time.sleep(0.02)
+                events.append(f'{name} out')
+
+        threads = [
+            threading.Thread(target=scrape, args=(name,))
+            for name in 'abc'
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(events), 6)
+        for index in range(0, 6, 2):
+            name = events[index].split()[0]
+            self.assertEqual(events[index + 1], f'{name} out')
+
+    def test_waiting_thread_times_out(self):
+        release = self.hold_in_thread(self.get_lock())
+        lock = self.get_lock(timeout_seconds=0.05)
+        self.assertFalse(lock.acquire())
+        release()
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+    def test_file_lock_of_other_process_times_out(self):
+        lock = self.get_lock(timeout_seconds=0.1)
+        # another open file description conflicts just like another process
+        with open(lock.get_path(), 'a') as other_process:
+            fcntl.flock(other_process, fcntl.LOCK_EX)
+            with self.assertRaises(
+                    self.router_lock.RouterLockTimeoutException):
+                with lock.hold_or_raise():
+                    pass
+        with lock.hold() as acquired:
+            self.assertTrue(acquired)
+
+    def test_debug_and_test_routes_raise_while_scraped(self):
+        from tp_link_router_exporter.app.routers.debug_router import (
+            DebugRouter,
+        )
+        from tp_link_router_exporter.app.routers.tp_link_router_router import (
+            TPLinkRouterRouter,
+        )
+        self.hold_in_thread(self.get_lock())
+        for router_class, handle in [
+                (DebugRouter, 'handle_debug_route_response'),
+                (TPLinkRouterRouter, 'test_router_response')]:
+            route_router = router_class()
+            fake_router = FakeTplinkRouter()
+            route_router.router_client = fake_router
+            route_router.router_lock = self.get_lock(timeout_seconds=0.05)
+            with self.assertRaises(
+                    self.router_lock.RouterLockTimeoutException):
+                getattr(route_router, handle)()
+            self.assertEqual(fake_router.fetch_calls, 0)
+
+
+class TestCollectorRouterLock(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import Collector
+        from tp_link_router_exporter.app.clients import tp_link_router
+        from tp_link_router_exporter.app.common.scrape_events import (
+            ScrapeEvents,
+        )
+        self.scrape_events = ScrapeEvents
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.fake_router = FakeTplinkRouter()
+        router_client = tp_link_router.TPLinkRouter(
+            router_ip=f'http://10.0.0.2/{self.id()}',
+            router_password='password')
+        router_client._router = self.fake_router
+        self.collector = Collector.get_collector(
+            router_client=router_client,
+            router_name='router_lock_test',
+            session_reuse=1,
+            session_idle_logout_seconds=0,
+            router_lock_timeout_seconds=0.05)
+        self.collector.router_lock.directory = self.directory.name
+
+    def get_event_count(self, event):
+        return self.collector._scrape_event_children[event]._value.get()
+
+    def hold_lock(self):
+        lock_file = open(self.collector.router_lock.get_path(), 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        self.addCleanup(lock_file.close)
+        return lock_file
+
+    def test_timeout_skips_scrape(self):
+        event = self.scrape_events.ROUTER_LOCK_TIMEOUT
+        before = self.get_event_count(event)
+        self.hold_lock()
+        self.assertIsNone(self.collector.update_router_metrics())
+        self.assertEqual(self.get_event_count(event), before + 1)
+        self.assertEqual(self.fake_router.authorize_calls, 0)
+
+    def test_idle_logout_skipped_while_scraping(self):
+        self.collector._authorize()
+        lock_file = self.hold_lock()
+        self.collector._idle_logout()
+        self.assertEqual(self.fake_router.logout_calls, 0)
+        self.assertTrue(self.collector.router_client.is_authorized)
+        lock_file.close()
+        self.collector._idle_logout()
+        self.assertEqual(self.fake_router.logout_calls, 1)
+        self.assertFalse(self.collector.router_client.is_authorized)
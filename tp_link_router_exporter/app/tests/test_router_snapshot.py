@@ -0,0 +1,64 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class TestRouterSnapshot(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.router_snapshot import (
+            RouterSnapshotBuilder,
+            RouterSnapshotCollector,
+        )
+        # not registered anywhere, the builder only reads their description
+        registry = CollectorRegistry()
+        self.gauge = Gauge(
+            'snapshot_test_connected',
+            'Connected',
+            ['router_name', 'mac_address'],
+            registry=registry)
+        self.counter = Counter(
+            'snapshot_test_logins',
+            'Logins',
+            ['router_name'],
+            registry=registry)
+        self.builder_class = RouterSnapshotBuilder
+        self.collector = RouterSnapshotCollector()
+
+    def get_families(self):
+        return {f.name: f for f in self.collector.collect()}
+
+    def test_snapshot_families(self):
+        builder = self.builder_class('router 1')
+        builder.add(self.gauge, 1, router_name='router 1', mac_address='AA')
+        builder.add(self.gauge, 0, router_name='router 1', mac_address='BB')
+        # the same labels twice keeps the last value
+        builder.add(self.gauge, 1, router_name='router 1', mac_address='BB')
+        builder.add_values(self.counter, ('router_name',), ('router 1',), 3)
+        self.collector.update(builder.build())
+        families = self.get_families()
+        connected = families['snapshot_test_connected']
+        self.assertEqual(connected.type, 'gauge')
+        self.assertEqual(
+            [(s.labels['mac_address'], s.value) for s in connected.samples],
+            [('AA', 1.0), ('BB', 1.0)])
+        logins = families['snapshot_test_logins']
+        self.assertEqual(logins.type, 'counter')
+        self.assertEqual(
+            [(s.name, s.labels, s.value) for s in logins.samples],
+            [('snapshot_test_logins_total', {'router_name': 'router 1'}, 3.0)])
+
+    def test_routers_share_families(self):
+        for router_name in ['router 1', 'router 2']:
+            builder = self.builder_class(router_name)
+            builder.add(
+                self.gauge, 1, router_name=router_name, mac_address='AA')
+            self.collector.update(builder.build())
+        samples = self.get_families()['snapshot_test_connected'].samples
+        self.assertEqual(
+            [s.labels['router_name'] for s in samples],
+            ['router 1', 'router 2'])
+        self.collector.remove('router 1')
+        samples = self.get_families()['snapshot_test_connected'].samples
+        self.assertEqual(len(samples), 1)
@@ -0,0 +1,54 @@
+import logging
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class TestScrapeLog(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.scrape_log import ScrapeLog
+        self.scrape_log_class = ScrapeLog
+
+    def get_scrape_log(self, name, **kwargs):
+        return self.scrape_log_class(f'{name}_{self.id()}', **kwargs)
+
+    def get_suppressed(self, scrape_log):
+        return scrape_log._suppressed._value.get()
+
+    def log_devices(self, scrape_log, count):
+        for i in range(count):
+            scrape_log.sampled_debug('device', 'device %s', i)
+
+    def test_one_in_sample_rate_per_key(self):
+        scrape_log = self.get_scrape_log('sampled', level='debug',
+                                         sample_rate=3)
+        before = self.get_suppressed(scrape_log)
+        with self.assertLogs(scrape_log.logger, logging.DEBUG) as logs:
+            self.log_devices(scrape_log, 7)
+            # every key is sampled on its own
+            scrape_log.sampled_debug('lease', 'lease %s', 0)
+        self.assertEqual(len(logs.records), 4)
+        self.assertEqual(
+            [record.getMessage().split('=> ')[1] for record in logs.records],
+            ['(1 in 3) device 0', '(1 in 3) device 3', '(1 in 3) device 6',
+             '(1 in 3) lease 0'])
+        self.assertEqual(self.get_suppressed(scrape_log), before + 4)
+
+    def test_routers_decide_on_their_own(self):
+        sampled = self.get_scrape_log('sampled', level='debug',
+                                      sample_rate=2)
+        quiet = self.get_scrape_log('quiet', level='info', sample_rate=2)
+        everything = self.get_scrape_log('everything', level='debug')
+        quiet_before = self.get_suppressed(quiet)
+        with self.assertLogs(sampled.logger, logging.DEBUG) as sampled_logs:
+            self.log_devices(sampled, 4)
+        with self.assertLogs(everything.logger, logging.DEBUG) as all_logs:
+            self.log_devices(everything, 4)
+        self.log_devices(quiet, 4)
+        self.assertEqual(len(sampled_logs.records), 2)
+        self.assertEqual(len(all_logs.records), 4)
+        # below its level nothing is sampled, or counted as suppressed
+        self.assertFalse(quiet.is_debug)
+        self.assertEqual(quiet._sample_counts, {})
+        self.assertEqual(self.get_suppressed(quiet), quiet_before)
@@ -0,0 +1,89 @@
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+from tp_link_router_exporter.app.tests.test_collector_session import (
+    FakeTplinkRouter,
+)
+
+
+class TestScrapePhases(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients.collector import (
+            Collector,
+            CollectorFetchException,
+        )
+        from tp_link_router_exporter.app.clients import tp_link_router
+        from tp_link_router_exporter.app.common.router_endpoints import (
+            RouterEndpoints,
+        )
+        from tp_link_router_exporter.app.common.scrape_phases import (
+            ScrapePhases,
+        )
+        from tp_link_router_exporter.app.metrics import (
+            SCRAPE_PHASE_BUCKETS,
+            Metrics,
+        )
+        self.collector_class = Collector
+        self.fetch_exception_class = CollectorFetchException
+        self.tp_link_router = tp_link_router
+        self.endpoint = RouterEndpoints.FIRMWARE
+        self.phases = ScrapePhases
+        self.buckets = SCRAPE_PHASE_BUCKETS
+        self.histogram = Metrics.ROUTER_SCRAPE_PHASE_SECONDS
+
+    def get_collector(self, name):
+        router_client = self.tp_link_router.TPLinkRouter(
+            router_ip='http://10.0.0.7',
+            router_password='password')
+        router_client._router = FakeTplinkRouter()
+        return self.collector_class.get_collector(
+            router_client=router_client,
+            router_name=f'{name}_{self.id()}',
+            **{self.endpoint.refresh_seconds_key_name: 60})
+
+    def get_counts(self, collector):
+        """`{phase: observations}` of every phase `collector` timed"""
+        counts = {}
+        for phase in self.phases:
+            child = self.histogram.labels(
+                router_name=collector.router_name,
+                scrape_phase=phase.label_string)
+            count = sum(bucket.get() for bucket in child._buckets)
+            if count:
+                counts[phase.label_string] = count
+        return counts
+
+    def get_and_record(self, collector, fetch_func):
+        collector._get_and_record(
+            self.endpoint,
+            fetch_func,
+            lambda result: None,
+            'firmware')
+
+    def test_phases_are_recorded_per_router(self):
+        collector = self.get_collector('phases')
+        other_collector = self.get_collector('other_phases')
+        self.get_and_record(collector, lambda: 'firmware')
+        # not due, only recorded again
+        self.get_and_record(collector, lambda: 'firmware')
+        self.assertEqual(self.get_counts(collector), {
+            'get_firmware': 1.0,
+            'record_firmware': 2.0,
+        })
+        self.assertEqual(self.get_counts(other_collector), {})
+
+    def test_failed_phases_are_timed(self):
+        collector = self.get_collector('failed_phases')
+
+        def fail():
+            raise self.fetch_exception_class('router is down')
+
+        self.get_and_record(collector, fail)
+        self.assertEqual(self.get_counts(collector), {'get_firmware': 1.0})
+
+    def test_scrape_phase_buckets(self):
+        child = self.histogram.labels(
+            router_name=f'buckets_{self.id()}',
+            scrape_phase=self.phases.SCRAPE.label_string)
+        self.assertEqual(child._upper_bounds, list(self.buckets))
@@ -0,0 +1,41 @@
+from prometheus_client import Gauge
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+class TestSeriesWriteCache(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.clients import series_write_cache
+        from tp_link_router_exporter.app.common import series_writes
+        self.writes = series_writes.SeriesWrites
+        self.cache = series_write_cache.SeriesWriteCache()
+        self.gauge = Gauge(
+            'series', 'series', ['router_name', 'mac_address'],
+            registry=None)
+
+    def test_key_uses_declared_label_order(self):
+        self.assertEqual(
+            self.cache.get_key(
+                self.gauge,
+                {'mac_address': 'aa', 'router_name': 'r'}),
+            self.cache.get_removal_key(self.gauge, ['r', 'aa']))
+
+    def test_only_changed_values_are_written(self):
+        key = self.cache.get_key(
+            self.gauge,
+            {'router_name': 'r', 'mac_address': 'aa'})
+        self.assertTrue(self.cache.should_write(key, 1))
+        self.assertFalse(self.cache.should_write(key, 1))
+        self.assertTrue(self.cache.should_write(key, 0))
+        self.cache.forget(key)
+        self.cache.forget(key)
+        self.assertTrue(self.cache.should_write(key, 0))
+        self.assertEqual(self.cache.pop_counts(), {
+            self.writes.ADDED: 2,
+            self.writes.CHANGED: 1,
+            self.writes.UNCHANGED: 1,
+            self.writes.REMOVED: 1,
+        })
+        self.assertEqual(set(self.cache.pop_counts().values()), {0})
@@ -0,0 +1,27 @@
+from collections import namedtuple
+from tp_link_router_exporter.app.tests.app_context_test_case import (
+    AppContextTestCase,
+)
+
+
+FakeCollector = namedtuple('FakeCollector', ['router_name', 'router_ip'])
+
+
+class TestTPLinkRouterPinger(AppContextTestCase):
+    def setUp(self):
+        super().setUp()
+        from tp_link_router_exporter.app.tasks.tp_link_router_pinger import (
+            TPLinkRouterPinger,
+        )
+        self.pinger = TPLinkRouterPinger
+
+    def test_routers_sharing_a_name_get_their_own_job(self):
+        job_ids = {
+            self.pinger.get_job_id(FakeCollector('Office', router_ip))
+            for router_ip in ['http://10.0.1.1', 'http://10.0.2.1']
+        }
+        self.assertEqual(len(job_ids), 2)
+        padded = FakeCollector(' Office ', 'http://10.0.1.1')
+        self.assertEqual(
+            self.pinger.get_job_id(padded),
+            self.pinger.get_job_id(FakeCollector('Office', 'http://10.0.1.1')))
@@ -94,6 +94,14 @@ def normalize_int(value):
     raise NormalizeIntegerException(message)
 
 
+def normalize_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return bool(str(value).strip().lower() in ('1', 'true', 'yes', 'on'))
+
+
 def generate_uuid():
     return str(uuid4())
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Compares stale device handling of `DeviceCache` with the old approach
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp \
+        python -m tp_link_router_exporter.benchmarks.device_cache_benchmark
+"""
+import argparse
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import Flask
+
+
+FakeDevice = namedtuple('FakeDevice', ['macaddress', 'ipaddress'])
+
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_DEPARTURES = 10
+DEFAULT_SCRAPES = 20
+
+log = logging.getLogger(__name__)
+
+
+class LegacyDeviceCacheValue(object):
+    def __init__(self, device, update_date):
+        super().__init__()
+        self.device = device
+        self.update_date = update_date
+
+    def __repr__(self):
+        return (f'DeviceCacheValue ({self.update_date}) '
+                f'=> {self.device.ipaddress}')
+
+
+class LegacyDeviceCache(object):
+    """The datetime based cache, full scans and full debug dumps included"""
+    def __init__(self):
+        super().__init__()
+        self.devices = {}
+
+    def add_or_update_device(self, device, update_date):
+        key = str(device.macaddress)
+        self.devices[key] = LegacyDeviceCacheValue(device, update_date)
+
+    def get_stale_devices_map(self, update_date):
+        log.debug(f'get_stale_devices_map {len(self.devices)}')
+        dev_map = {
+            k: v for k, v
+            in self.devices.items() if v.update_date < update_date
+        }
+        log.debug(f'dev_map: {dev_map}')
+        return dev_map
+
+    def drop_all_stale_devices(self, update_date):
+        log.debug(f'^^^^^^^^^^^^ drop_all_stale_devices '
+                  f'starting ({len(self.devices)}) {self.devices}')
+        fresh_devices = {
+            k: v for k, v
+            in self.devices.items() if not v.update_date < update_date
+        }
+        log.debug(f'------------ drop_all_stale_devices '
+                  f'fresh_devices ({len(fresh_devices)}) {fresh_devices}')
+        self.devices = fresh_devices
+
+
+def get_devices(size):
+    return [
+        FakeDevice(f'{i:012x}', f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}')
+        for i in range(size)
+    ]
+
+
+def get_scrapes(devices, departures, scrapes):
+    # every scrape a few devices leave and the ones that left before return
+    scrape_devices = []
+    for scrape in range(scrapes):
+        start = scrape * departures % len(devices)
+        gone = set(range(start, start + departures))
+        scrape_devices.append([
+            device for i, device in enumerate(devices) if i not in gone
+        ])
+    return scrape_devices
+
+
+def time_legacy(devices, scrape_devices):
+    cache = LegacyDeviceCache()
+    update_date = datetime.now()
+    for device in devices:
+        cache.add_or_update_device(device, update_date)
+    stale_seconds = 0.0
+    scrape_seconds = 0.0
+    for scrape in scrape_devices:
+        scrape_start = time.perf_counter()
+        update_date += timedelta(seconds=1)
+        for device in scrape:
+            cache.add_or_update_device(device, update_date)
+        start = time.perf_counter()
+        cache.get_stale_devices_map(update_date)
+        cache.drop_all_stale_devices(update_date)
+        end = time.perf_counter()
+        stale_seconds += end - start
+        scrape_seconds += end - scrape_start
+    scrapes = len(scrape_devices)
+    return stale_seconds / scrapes, scrape_seconds / scrapes
+
+
+def time_generations(devices, scrape_devices):
+    from ..app.clients.device_cache import DeviceCache
+    cache = DeviceCache()
+    cache.start_generation()
+    for device in devices:
+        cache.add_or_update_device(device)
+    stale_seconds = 0.0
+    scrape_seconds = 0.0
+    for scrape in scrape_devices:
+        scrape_start = time.perf_counter()
+        cache.start_generation()
+        for device in scrape:
+            cache.add_or_update_device(device)
+        start = time.perf_counter()
+        cache.get_stale_devices_map()
+        cache.drop_all_stale_devices()
+        end = time.perf_counter()
+        stale_seconds += end - start
+        scrape_seconds += end - scrape_start
+    scrapes = len(scrape_devices)
+    return stale_seconds / scrapes, scrape_seconds / scrapes
+
+
+def print_row(size, phase, legacy, generations):
+    print(f'{size:>10} {phase:>8} {legacy * 1000:>12.3f} '
+          f'{generations * 1000:>14.3f} {legacy / generations:>8.1f}x')
+
+
+def run(sizes, departures, scrapes):
+    print(f'{"devices":>10} {"phase":>8} {"legacy ms":>12} '
+          f'{"generation ms":>14} {"speedup":>9}')
+    for size in sizes:
+        devices = get_devices(size)
+        scrape_devices = get_scrapes(devices, departures, scrapes)
+        legacy_stale, legacy_scrape = time_legacy(devices, scrape_devices)
+        stale, scrape = time_generations(devices, scrape_devices)
+        print_row(size, 'stale', legacy_stale, stale)
+        print_row(size, 'scrape', legacy_scrape, scrape)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES)
+    parser.add_argument('--departures', type=int,
+                        default=DEFAULT_DEPARTURES)
+    parser.add_argument('--scrapes', type=int, default=DEFAULT_SCRAPES)
+    args = parser.parse_args()
+    # the cache only needs an app context for its logger
+    with Flask(__name__).app_context():
+        run(args.sizes, args.departures, args.scrapes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Compares the per device recording loop of `Collector` with the old one
+
+    PROMETHEUS_MULTIPROC_DIR=$(mktemp -d) \
+        python -m tp_link_router_exporter.benchmarks.device_recording_benchmark
+"""
+import argparse
+import ipaddress
+import time
+import macaddress
+from flask import Flask
+from tplinkrouterc6u.dataclass import Device
+from tplinkrouterc6u.enum import Wifi
+
+
+DEFAULT_SIZES = [100, 1_000, 10_000]
+DEFAULT_SCRAPES = 20
+
+
+class FakeRouterClient(object):
+    router_ip = 'http://127.0.0.1'
+
+
+def get_devices(size):
+    devices = []
+    for i in range(size):
+        device = Device(
+            Wifi.WIFI_5G,
+            macaddress.EUI48(i),
+            ipaddress.IPv4Address(0x0a000000 + i),
+            f'host-{i}')
+        device.packets_sent = i
+        device.packets_received = i * 2
+        devices.append(device)
+    return devices
+
+
+def record_device_metrics_legacy(collector, device):
+    """The loop as it was before the labels and children were cached"""
+    from ..app.clients.collector import log
+    from ..app.common.packet_actions import PacketActions
+    from ..app.metrics import Metrics
+
+    log.debug(f'recording found device: {device}')
+    device_type = collector.normalize_input(device.type)
+    hostname = device.hostname
+    ipaddress = str(device.ipaddress)
+    macaddress = str(device.macaddress)
+    collector.add_or_update_device(device)
+    collector.device_eviction.mark_present(macaddress)
+    d_m = (f'parsed device: {device} to get '
+           f'device_type: {device_type}, '
+           f'hostname: {hostname}, '
+           f'ipaddress: {ipaddress}, '
+           f'macaddress: {macaddress}, ')
+    log.debug(d_m)
+    collector._set_gauge(
+        Metrics.ROUTER_DEVICE_CONNECTED_STATUS,
+        1,
+        router_name=collector.router_name,
+        device_type=device_type,
+        hostname=hostname,
+        ip_address=ipaddress,
+        mac_address=macaddress)
+    for packet_action in PacketActions.metrics_actions_list():
+        packets = collector._get_packets_for_action(device, packet_action)
+        device_type = collector.normalize_input(device.type)
+        hostname = device.hostname
+        ipaddress = str(device.ipaddress)
+        macaddress = str(device.macaddress)
+        d_m = (f'parsed device: {device} to get '
+               f'device_type: {device_type}, '
+               f'hostname: {hostname}, '
+               f'ipaddress: {ipaddress}, '
+               f'macaddress: {macaddress}, '
+               f'packet_action: {packet_action}, '
+               f'packets: {packets}')
+        log.debug(d_m)
+        collector._set_gauge(
+            Metrics.ROUTER_DEVICE_PACKETS_TOTAL,
+            packets or 0,
+            router_name=collector.router_name,
+            device_type=device_type,
+            hostname=hostname,
+            ip_address=ipaddress,
+            mac_address=macaddress,
+            packet_action=packet_action.label_string)
+
+
+def time_scrapes(collector, devices, scrapes, record_device_metrics):
+    # the first scrape binds everything, only time the ones after it
+    collector.device_cache.start_generation()
+    for device in devices:
+        record_device_metrics(device)
+    elapsed = 0.0
+    for _ in range(scrapes):
+        collector.device_cache.start_generation()
+        start = time.perf_counter()
+        for device in devices:
+            record_device_metrics(device)
+        elapsed += time.perf_counter() - start
+    return elapsed / scrapes
+
+
+def run(sizes, scrapes):
+    from ..app.clients.collector import Collector
+
+    print(f'{"devices":>10} {"legacy ms":>12} {"cached ms":>12} '
+          f'{"speedup":>9}')
+    for size in sizes:
+        devices = get_devices(size)
+        legacy_collector = Collector.get_collector(
+            router_client=FakeRouterClient(),
+            router_name=f'legacy_{size}')
+        legacy = time_scrapes(
+            legacy_collector,
+            devices,
+            scrapes,
+            lambda device: record_device_metrics_legacy(
+                legacy_collector,
+                device))
+        collector = Collector.get_collector(
+            router_client=FakeRouterClient(),
+            router_name=f'cached_{size}')
+        cached = time_scrapes(
+            collector,
+            devices,
+            scrapes,
+            collector._record_device_metrics)
+        print(f'{size:>10} {legacy * 1000:>12.3f} {cached * 1000:>12.3f} '
+              f'{legacy / cached:>8.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES)
+    parser.add_argument('--scrapes', type=int, default=DEFAULT_SCRAPES)
+    args = parser.parse_args()
+    # the collector only needs an app context for its logger
+    with Flask(__name__).app_context():
+        run(args.sizes, args.scrapes)
+
+
+if __name__ == '__main__':
+    main()
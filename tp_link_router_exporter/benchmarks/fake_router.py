@@ -0,0 +1,159 @@
+"""In-process stand-in for `tplinkrouterc6u.TplinkRouter`
+
+Serves a network of `devices` devices, the first `leases` of which have a
+DHCP lease and the first `reservations` of which have a reservation. Every
+`get_status` is one cycle: packet counters go up and `churn` (a fraction) of
+the devices leave and are replaced by new ones.
+"""
+import ipaddress
+import random
+import macaddress
+from tplinkrouterc6u.dataclass import (
+    Device,
+    Firmware,
+    IPv4DHCPLease,
+    IPv4Reservation,
+    IPv4Status,
+    Status,
+)
+from tplinkrouterc6u.enum import Wifi
+
+
+DEVICE_TYPES = [
+    Wifi.WIFI_2G,
+    Wifi.WIFI_5G,
+    Wifi.WIFI_GUEST_2G,
+    Wifi.WIFI_GUEST_5G,
+]
+# locally administered, so they never clash with a real vendor prefix
+MAC_ADDRESS_BASE = 0x02_00_00_00_00_00
+IP_ADDRESS_BASE = 0x0a_00_00_00
+
+
+class FakeTplinkRouter(object):
+    def __init__(self, devices=100, leases=None, reservations=None,
+                 churn=0.0, seed=0):
+        super().__init__()
+        self.device_count = devices
+        self.lease_count = devices if leases is None else leases
+        self.reservation_count = (
+            devices // 10 if reservations is None else reservations)
+        self.churn = churn
+        self.cycle = 0
+        self._random = random.Random(seed)
+        self._next_device_id = 0
+        # device id => Device, in the order they joined
+        self._devices = {}
+        for _ in range(devices):
+            self._add_device()
+
+    def __repr__(self):
+        return (f'FakeTplinkRouter ({self.cycle}) => {len(self._devices)} '
+                f'devices, churn: {self.churn}')
+
+    @classmethod
+    def get_device_type(cls, device_id):
+        return DEVICE_TYPES[device_id % len(DEVICE_TYPES)]
+
+    @classmethod
+    def get_mac_address(cls, device_id):
+        return macaddress.EUI48(MAC_ADDRESS_BASE + device_id)
+
+    @classmethod
+    def get_ip_address(cls, device_id):
+        return ipaddress.IPv4Address(IP_ADDRESS_BASE + device_id % 2 ** 24)
+
+    @classmethod
+    def get_hostname(cls, device_id):
+        return f'host-{device_id}'
+
+    def _add_device(self):
+        device_id = self._next_device_id
+        self._next_device_id += 1
+        device = Device(
+            self.get_device_type(device_id),
+            self.get_mac_address(device_id),
+            self.get_ip_address(device_id),
+            self.get_hostname(device_id))
+        device.packets_sent = 0
+        device.packets_received = 0
+        self._devices[device_id] = device
+
+    def _churn_devices(self):
+        departures = int(len(self._devices) * self.churn)
+        if not departures:
+            return
+        for device_id in self._random.sample(list(self._devices), departures):
+            del self._devices[device_id]
+        for _ in range(departures):
+            self._add_device()
+
+    def _advance(self):
+        self.cycle += 1
+        if self.cycle > 1:
+            self._churn_devices()
+        for device_id, device in self._devices.items():
+            device.packets_sent += 10 + device_id % 100
+            device.packets_received += 20 + device_id % 200
+
+    @property
+    def devices(self):
+        return list(self._devices.values())
+
+    def authorize(self):
+        pass
+
+    def logout(self):
+        pass
+
+    def get_firmware(self):
+        return Firmware('Archer AX55 v1.0', 'Archer AX55', '1.1.0 Build 1')
+
+    def get_status(self):
+        self._advance()
+        status = Status()
+        status.devices = self.devices
+        guests = [d for d in status.devices if 'guest' in d.type.value]
+        status.guest_clients_total = len(guests)
+        status.wifi_clients_total = len(status.devices) - len(guests)
+        status.wired_total = 0
+        status.clients_total = len(status.devices)
+        status.mem_usage = 0.5
+        status.cpu_usage = 0.25
+        return status
+
+    def get_ipv4_status(self):
+        return IPv4Status()
+
+    def get_ipv4_reservations(self):
+        return [
+            IPv4Reservation(
+                device.macaddress,
+                device.ipaddress,
+                device.hostname,
+                True)
+            for device in self.devices[:self.reservation_count]
+        ]
+
+    def get_ipv4_dhcp_leases(self):
+        return [
+            IPv4DHCPLease(
+                device.macaddress,
+                device.ipaddress,
+                device.hostname,
+                '01:02:03')
+            for device in self.devices[:self.lease_count]
+        ]
+
+
+def get_fake_client(fake_router, **kwargs):
+    """A real `TPLinkRouter` client talking to `fake_router`, needs an app
+    context
+    """
+    from ..app.clients.tp_link_router import TPLinkRouter
+
+    kwargs.setdefault('router_ip', 'http://fake-router')
+    kwargs.setdefault('router_password', 'fake')
+    client = TPLinkRouter.get_client(**kwargs)
+    client._router = fake_router
+    return client
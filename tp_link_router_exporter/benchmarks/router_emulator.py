@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""Emulates TP-Link routers at the HTTP layer, for end-to-end load tests
+
+    python -m tp_link_router_exporter.benchmarks.router_emulator \
+        --routers 200 --devices 30 --latency-ms 40 --error-rate 0.01 \
+        --config-out /tmp/emulated_routers.yaml
+
+Every emulated router listens on its own port (`--base-port` onwards) and
+speaks the same encrypted web API as a real one, so the `tplinkrouterc6u`
+clients (sync and async) log in to it as they would to hardware: RSA keys,
+signed and AES encrypted requests, one session at a time (a new login kicks
+out the previous one), `403`s for stale sessions, and an optional login
+lockout. Latency, errors and hangs can be injected per request. The devices
+come from a `FakeTplinkRouter` per router, so they churn between status
+requests.
+
+`--config-out` writes an exporter config with every emulated router in it.
+`GET /emulator/stats` on a router's port returns its counters as JSON.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import random
+import re
+import secrets
+import signal
+import sys
+import time
+from collections import Counter
+import yaml
+from aiohttp import web
+from Crypto.Cipher import AES, PKCS1_v1_5
+from Crypto.PublicKey import RSA
+from Crypto.Util.Padding import pad, unpad
+from tplinkrouterc6u.enum import Wifi
+from .fake_router import FakeTplinkRouter
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_BASE_PORT = 20080
+DEFAULT_PASSWORD = 'emulated'
+DEFAULT_USERNAME = 'admin'
+# real routers use 512 bits, which pycryptodome no longer generates
+RSA_KEY_BITS = 1024
+REQUEST_PATH_REGEX = re.compile(r'^/cgi-bin/luci/;stok=([^/]*)/(.*)$')
+# (device list in the status response, `wire_type`)
+DEVICE_LISTS = {
+    Wifi.WIFI_2G: ('access_devices_wireless_host', '2.4G'),
+    Wifi.WIFI_5G: ('access_devices_wireless_host', '5G'),
+    Wifi.WIFI_6G: ('access_devices_wireless_host', '6G'),
+    Wifi.WIFI_GUEST_2G: ('access_devices_wireless_guest', '2.4G'),
+    Wifi.WIFI_GUEST_5G: ('access_devices_wireless_guest', '5G'),
+    Wifi.WIFI_GUEST_6G: ('access_devices_wireless_guest', '6G'),
+}
+
+
+class RouterEmulatorException(Exception):
+    pass
+
+
+class EmulatorOptions(object):
+    """How every emulated router behaves, besides its network"""
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.password = kwargs.get('password', DEFAULT_PASSWORD)
+        self.username = kwargs.get('username', DEFAULT_USERNAME)
+        self.latency_seconds = kwargs.get('latency_ms', 0) / 1000
+        self.jitter_seconds = kwargs.get('jitter_ms', 0) / 1000
+        self.error_rate = kwargs.get('error_rate', 0.0)
+        self.hang_rate = kwargs.get('hang_rate', 0.0)
+        self.hang_seconds = kwargs.get('hang_seconds', 30.0)
+        # `0` keeps sessions until the next login or logout
+        self.session_idle_seconds = kwargs.get('session_idle_seconds', 0)
+        # `0` never locks anyone out
+        self.lockout_failures = kwargs.get('lockout_failures', 0)
+        self.lockout_seconds = kwargs.get('lockout_seconds', 60)
+
+    def __repr__(self):
+        return (f'EmulatorOptions (latency: {self.latency_seconds}s, '
+                f'errors: {self.error_rate}, hangs: {self.hang_rate})')
+
+
+class EmulatedSession(object):
+    __slots__ = ('stok', 'sysauth', 'key', 'iv', 'last_used_at', 'devices')
+
+    def __init__(self, key, iv):
+        super().__init__()
+        self.stok = secrets.token_hex(16)
+        self.sysauth = secrets.token_hex(16)
+        self.key = key
+        self.iv = iv
+        self.last_used_at = time.monotonic()
+        # devices of the last status, the statistics request reports on them
+        self.devices = None
+
+    def __repr__(self):
+        return f'EmulatedSession ({self.stok})'
+
+    def encrypt(self, payload):
+        cipher = AES.new(self.key, AES.MODE_CBC, self.iv)
+        raw = pad(json.dumps(payload).encode(), AES.block_size)
+        return base64.b64encode(cipher.encrypt(raw)).decode()
+
+    def decrypt(self, data):
+        cipher = AES.new(self.key, AES.MODE_CBC, self.iv)
+        raw = cipher.decrypt(base64.b64decode(data))
+        return unpad(raw, AES.block_size).decode()
+
+
+class EmulatedRouter(object):
+    def __init__(self, name, port, network, rsa_key, options):
+        super().__init__()
+        self.name = name
+        self.port = port
+        self.network = network
+        self.options = options
+        self._rsa_key = rsa_key
+        self._rsa_cipher = PKCS1_v1_5.new(rsa_key)
+        self._public_key = [
+            f'{rsa_key.n:x}',
+            f'{rsa_key.e:x}',
+        ]
+        self._seq = random.randint(100_000_000, 999_999_999)
+        self._session = None
+        self._login_failures = 0
+        self._locked_until = 0
+        self.stats = Counter()
+
+    def __repr__(self):
+        return f'EmulatedRouter ({self.name}:{self.port}) => {self._session}'
+
+    @property
+    def url(self):
+        return f'http://{DEFAULT_HOST}:{self.port}'
+
+    def get_application(self):
+        application = web.Application()
+        application.router.add_get('/emulator/stats', self.handle_stats)
+        application.router.add_post('/{tail:.*}', self.handle)
+        return application
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    async def _inject_latency(self):
+        options = self.options
+        if not options.latency_seconds and not options.jitter_seconds:
+            return
+        await asyncio.sleep(max(0.0, random.gauss(
+            options.latency_seconds,
+            options.jitter_seconds)))
+
+    async def handle(self, request):
+        self.stats['requests'] += 1
+        await self._inject_latency()
+        if random.random() < self.options.hang_rate:
+            # long enough for the client to give up first
+            self.stats['injected_hangs'] += 1
+            await asyncio.sleep(self.options.hang_seconds)
+        if random.random() < self.options.error_rate:
+            self.stats['injected_errors'] += 1
+            return web.Response(status=500, text='Internal Server Error')
+        match = REQUEST_PATH_REGEX.match(request.path)
+        if not match:
+            return web.Response(status=404, text='Not Found')
+        stok, path = match.groups()
+        form = request.query.get('form')
+        if not stok and path == 'login':
+            return await self.handle_login(request, form)
+        return await self.handle_authed(request, stok, path, form)
+
+    # login handshake
+
+    async def handle_login(self, request, form):
+        if form == 'keys':
+            return web.json_response({
+                'success': True,
+                'data': {'password': self._public_key},
+            })
+        if form == 'auth':
+            return web.json_response({
+                'success': True,
+                'data': {'seq': self._seq, 'key': self._public_key},
+            })
+        if form == 'login':
+            return await self.handle_login_form(request)
+        return web.Response(status=404, text='Not Found')
+
+    def _rsa_decrypt(self, hex_string):
+        chunk_size = self._rsa_key.size_in_bytes() * 2
+        plain = b''
+        for pos in range(0, len(hex_string), chunk_size):
+            chunk = binascii.a2b_hex(hex_string[pos:pos + chunk_size])
+            decrypted = self._rsa_cipher.decrypt(chunk, None)
+            if decrypted is None:
+                raise RouterEmulatorException('cannot decrypt rsa chunk')
+            plain += decrypted
+        return plain.decode()
+
+    @classmethod
+    def _parse_pairs(cls, text):
+        return dict(pair.split('=', 1) for pair in text.split('&') if pair)
+
+    def _is_locked_out(self):
+        return bool(time.monotonic() < self._locked_until)
+
+    def _handle_login_failure(self):
+        self.stats['failed_logins'] += 1
+        self._login_failures += 1
+        options = self.options
+        if options.lockout_failures and \
+                self._login_failures >= options.lockout_failures:
+            self.stats['lockouts'] += 1
+            self._locked_until = time.monotonic() + options.lockout_seconds
+            self._login_failures = 0
+
+    async def handle_login_form(self, request):
+        body = await request.post()
+        try:
+            sign = self._parse_pairs(self._rsa_decrypt(body['sign']))
+            # the AES key and iv are sent as hex text and used as is
+            session = EmulatedSession(sign['k'].encode(), sign['i'].encode())
+            fields = self._parse_pairs(session.decrypt(body['data']))
+            password = self._rsa_decrypt(fields['password'])
+        except Exception as e:
+            self.stats['bad_requests'] += 1
+            return web.Response(status=403, text=f'bad login request: {e}')
+        if self._is_locked_out():
+            self.stats['locked_out_logins'] += 1
+            return web.json_response({'data': session.encrypt({
+                'success': False,
+                'errorcode': 'exceeded max attempts',
+                'data': {},
+            })})
+        expected_hash = hashlib.md5(
+            (self.options.username + self.options.password).encode())
+        if password != self.options.password or \
+                sign.get('h') != expected_hash.hexdigest():
+            self._handle_login_failure()
+            return web.json_response({'data': session.encrypt({
+                'success': False,
+                'errorcode': 'login failed',
+                'data': {'failureCount': self._login_failures},
+            })})
+        self._login_failures = 0
+        if self._session:
+            # the web interface only allows one logged in user
+            self.stats['kicked_sessions'] += 1
+        self._session = session
+        self.stats['logins'] += 1
+        response = web.json_response({'data': session.encrypt({
+            'success': True,
+            'data': {'stok': session.stok},
+        })})
+        response.set_cookie('sysauth', session.sysauth, path='/cgi-bin/luci')
+        return response
+
+    # everything after logging in
+
+    def _get_session(self, request, stok):
+        session = self._session
+        if session is None or session.stok != stok:
+            return None
+        if request.cookies.get('sysauth') != session.sysauth:
+            return None
+        idle_seconds = self.options.session_idle_seconds
+        now = time.monotonic()
+        if idle_seconds and now - session.last_used_at > idle_seconds:
+            self.stats['expired_sessions'] += 1
+            self._session = None
+            return None
+        session.last_used_at = now
+        return session
+
+    async def handle_authed(self, request, stok, path, form):
+        session = self._get_session(request, stok)
+        if session is None:
+            self.stats['unauthorised'] += 1
+            return web.json_response(
+                {'success': False, 'errorcode': 'timeout'},
+                status=403)
+        body = await request.post()
+        try:
+            session.decrypt(body['data'])
+        except Exception as e:
+            self.stats['bad_requests'] += 1
+            return web.Response(status=400, text=f'bad request: {e}')
+        handler = self.get_handler(path, form)
+        if handler is None:
+            payload = {'success': False, 'errorcode': 'unknown form'}
+        else:
+            payload = {'success': True, 'data': handler(session)}
+        return web.json_response({'data': session.encrypt(payload)})
+
+    def get_handler(self, path, form):
+        return {
+            ('admin/firmware', 'upgrade'): self.get_firmware,
+            ('admin/status', 'all'): self.get_status,
+            ('admin/wireless', 'statistics'): self.get_wireless_statistics,
+            ('admin/dhcps', 'reservation'): self.get_ipv4_reservations,
+            ('admin/dhcps', 'client'): self.get_ipv4_dhcp_leases,
+            ('admin/network', 'status_ipv4'): self.get_ipv4_status,
+            ('admin/system', 'logout'): self.logout,
+        }.get((path, form))
+
+    def get_firmware(self, session):
+        firmware = self.network.get_firmware()
+        return {
+            'hardware_version': firmware.hardware_version,
+            'model': firmware.model,
+            'firmware_version': firmware.firmware_version,
+        }
+
+    def get_status(self, session):
+        status = self.network.get_status()
+        session.devices = status.devices
+        data = {
+            'lan_macaddr': '02-00-00-00-00-01',
+            'wan_macaddr': '02-00-00-00-00-02',
+            'lan_ipv4_ipaddr': '192.168.0.1',
+            'wan_ipv4_ipaddr': '10.255.0.2',
+            'wan_ipv4_gateway': '10.255.0.1',
+            'wan_ipv4_uptime': int(time.monotonic()),
+            'mem_usage': status.mem_usage,
+            'cpu_usage': status.cpu_usage,
+            'wireless_2g_enable': 'on',
+            'wireless_5g_enable': 'on',
+            'guest_2g_enable': 'on',
+            'guest_5g_enable': 'off',
+            'access_devices_wired': [],
+            'access_devices_wireless_host': [],
+            'access_devices_wireless_guest': [],
+        }
+        for device in status.devices:
+            device_list, wire_type = DEVICE_LISTS[device.type]
+            data[device_list].append({
+                'macaddr': str(device.macaddress),
+                'ipaddr': str(device.ipaddress),
+                'hostname': device.hostname,
+                'wire_type': wire_type,
+            })
+        return data
+
+    def get_wireless_statistics(self, session):
+        devices = session.devices
+        if devices is None:
+            devices = self.network.devices
+        return [
+            {
+                'mac': str(device.macaddress),
+                'type': DEVICE_LISTS[device.type][1],
+                'txpkts': device.packets_sent,
+                'rxpkts': device.packets_received,
+            }
+            for device in devices
+        ]
+
+    def get_ipv4_reservations(self, session):
+        return [
+            {
+                'mac': str(reservation.macaddress),
+                'ip': str(reservation.ipaddress),
+                'comment': reservation.hostname,
+                'enable': 'on' if reservation.enabled else 'off',
+            }
+            for reservation in self.network.get_ipv4_reservations()
+        ]
+
+    def get_ipv4_dhcp_leases(self, session):
+        return [
+            {
+                'macaddr': str(lease.macaddress),
+                'ipaddr': str(lease.ipaddress),
+                'name': lease.hostname,
+                'leasetime': lease.lease_time,
+            }
+            for lease in self.network.get_ipv4_dhcp_leases()
+        ]
+
+    def get_ipv4_status(self, session):
+        return {
+            'wan_macaddr': '02-00-00-00-00-02',
+            'wan_ipv4_ipaddr': '10.255.0.2',
+            'wan_ipv4_gateway': '10.255.0.1',
+            'wan_ipv4_conntype': 'dhcp',
+            'wan_ipv4_netmask': '255.255.255.0',
+            'wan_ipv4_pridns': '10.255.0.1',
+            'wan_ipv4_snddns': '0.0.0.0',
+            'lan_macaddr': '02-00-00-00-00-01',
+            'lan_ipv4_ipaddr': '192.168.0.1',
+            'lan_ipv4_dhcp_enable': 'on',
+            'lan_ipv4_netmask': '255.255.255.0',
+            'remote': 'off',
+        }
+
+    def logout(self, session):
+        self.stats['logouts'] += 1
+        self._session = None
+        return {}
+
+
+class RouterEmulator(object):
+    """Runs `routers` emulated routers on one event loop"""
+    def __init__(self, routers, base_port=DEFAULT_BASE_PORT, host=DEFAULT_HOST,
+                 devices=30, leases=None, reservations=None, churn=0.0,
+                 down_routers=0, **kwargs):
+        super().__init__()
+        self.host = host
+        # one key for every router, generating them is slow
+        rsa_key = RSA.generate(RSA_KEY_BITS)
+        options = EmulatorOptions(**kwargs)
+        down_options = EmulatorOptions(**dict(kwargs, hang_rate=1.0))
+        self.routers = [
+            EmulatedRouter(
+                f'emulated_{index:03d}',
+                base_port + index,
+                FakeTplinkRouter(
+                    devices=devices,
+                    leases=leases,
+                    reservations=reservations,
+                    churn=churn,
+                    seed=index),
+                rsa_key,
+                down_options if index < down_routers else options)
+            for index in range(routers)
+        ]
+        self._runners = []
+
+    def __repr__(self):
+        return f'RouterEmulator ({len(self.routers)} routers)'
+
+    def get_exporter_config(self):
+        return {
+            'routers': [
+                {
+                    'router_name': router.name,
+                    'router_ip': f'http://{self.host}:{router.port}',
+                    'router_password': router.options.password,
+                }
+                for router in self.routers
+            ],
+        }
+
+    def write_exporter_config(self, path):
+        with open(path, 'w') as f:
+            yaml.safe_dump(self.get_exporter_config(), f, sort_keys=False)
+
+    async def start(self):
+        for router in self.routers:
+            runner = web.AppRunner(router.get_application(), access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, router.port).start()
+            self._runners.append(runner)
+
+    async def stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+
+    def get_stats(self):
+        total = Counter()
+        for router in self.routers:
+            total.update(router.stats)
+        return dict(total)
+
+
+async def serve(emulator):
+    await emulator.start()
+    print(f'{emulator} listening on {emulator.host}:'
+          f'{emulator.routers[0].port}-{emulator.routers[-1].port}',
+          file=sys.stderr)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+    await emulator.stop()
+    print(json.dumps(emulator.get_stats()), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routers', type=int, default=1)
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--base-port', type=int, default=DEFAULT_BASE_PORT)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--devices', type=int, default=30)
+    parser.add_argument('--leases', type=int)
+    parser.add_argument('--reservations', type=int)
+    parser.add_argument('--churn', type=float, default=0.0,
+                        help='fraction of devices replaced every status')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 500')
+    parser.add_argument('--hang-rate', type=float, default=0.0,
+                        help='fraction of requests held for --hang-seconds')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--down-routers', type=int, default=0,
+                        help='the first N routers hang on every request')
+    parser.add_argument('--session-idle-seconds', type=float, default=0)
+    parser.add_argument('--lockout-failures', type=int, default=0)
+    parser.add_argument('--lockout-seconds', type=float, default=60)
+    parser.add_argument('--config-out',
+                        help='write an exporter config for every router')
+    args = parser.parse_args()
+    emulator = RouterEmulator(
+        args.routers,
+        base_port=args.base_port,
+        host=args.host,
+        devices=args.devices,
+        leases=args.leases,
+        reservations=args.reservations,
+        churn=args.churn,
+        down_routers=args.down_routers,
+        password=args.password,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        session_idle_seconds=args.session_idle_seconds,
+        lockout_failures=args.lockout_failures,
+        lockout_seconds=args.lockout_seconds)
+    if args.config_out:
+        emulator.write_exporter_config(args.config_out)
+    asyncio.run(serve(emulator))
+
+
+if __name__ == '__main__':
+    main()
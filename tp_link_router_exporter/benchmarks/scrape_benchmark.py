@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Measures the exporter's own overhead per scrape, against a fake router
+
+    python -m tp_link_router_exporter.benchmarks.scrape_benchmark \
+        --output scrape_benchmark.json
+
+Every size runs in its own process with its own empty
+`PROMETHEUS_MULTIPROC_DIR`, so memory and `/metrics` render times only ever
+include that size. Writes one JSON document (to `--output` or stdout) and a
+summary table to stderr.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import Flask
+
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 50_000]
+DEFAULT_CYCLES = 10
+DEFAULT_RENDERS = 3
+DEFAULT_CHURN = 0.01
+FORMAT_VERSION = 1
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def get_benchmark_collector_class():
+    from ..app.clients.collector import Collector
+
+    class BenchmarkCollector(Collector):
+        """Also adds up the CPU time (of this thread) spent in every phase"""
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.phase_cpu_seconds = defaultdict(float)
+
+        @contextmanager
+        def _time_scrape_phase(self, phase):
+            started_at = time.thread_time()
+            try:
+                with super()._time_scrape_phase(phase):
+                    yield
+            finally:
+                self.phase_cpu_seconds[phase.label_string] += (
+                    time.thread_time() - started_at)
+
+    return BenchmarkCollector
+
+
+def get_collector(fake_router, args):
+    from ..app.common.router_endpoints import RouterEndpoints
+    from .fake_router import get_fake_client
+
+    # fetch every endpoint every cycle, the worst case
+    refresh_seconds = {
+        endpoint.refresh_seconds_key_name: 0
+        for endpoint in RouterEndpoints.metrics_endpoints_list()
+    }
+    return get_benchmark_collector_class().get_collector(
+        router_client=get_fake_client(fake_router),
+        router_name='benchmark',
+        metrics_recording_mode=args.mode,
+        circuit_breaker_failure_threshold=0,
+        **refresh_seconds)
+
+
+def render_metrics():
+    from prometheus_client import generate_latest
+    from ..app.routers.metrics_router import MetricsRouter
+
+    return generate_latest(MetricsRouter.get_registry())
+
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+    index = min(int(round(percentile * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize_ms(seconds):
+    return {
+        'mean': statistics.mean(seconds) * 1000,
+        'p50': get_percentile(seconds, 0.5) * 1000,
+        'p95': get_percentile(seconds, 0.95) * 1000,
+        'max': max(seconds) * 1000,
+    }
+
+
+def run_size(args):
+    from .fake_router import FakeTplinkRouter
+
+    fake_router = FakeTplinkRouter(
+        devices=args.devices,
+        leases=args.leases,
+        reservations=args.reservations,
+        churn=args.churn)
+    collector = get_collector(fake_router, args)
+    # the first cycle creates every series, which later cycles only update
+    collector.get_router_metrics()
+    collector.phase_cpu_seconds.clear()
+    wall_seconds = []
+    cpu_seconds = []
+    for _ in range(args.cycles):
+        wall_started_at = time.perf_counter()
+        cpu_started_at = time.thread_time()
+        collector.get_router_metrics()
+        cpu_seconds.append(time.thread_time() - cpu_started_at)
+        wall_seconds.append(time.perf_counter() - wall_started_at)
+    phase_cpu_ms = {
+        phase: seconds * 1000 / args.cycles
+        for phase, seconds in sorted(collector.phase_cpu_seconds.items())
+    }
+    render_seconds = []
+    output = b''
+    for _ in range(args.renders):
+        started_at = time.perf_counter()
+        output = render_metrics()
+        render_seconds.append(time.perf_counter() - started_at)
+    # traced separately, tracemalloc slows everything down a lot
+    tracemalloc.start()
+    collector.get_router_metrics()
+    render_metrics()
+    _, peak_traced_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'devices': args.devices,
+        'leases': fake_router.lease_count,
+        'reservations': fake_router.reservation_count,
+        'churn': args.churn,
+        'mode': args.mode,
+        'cycles': args.cycles,
+        'cycle_wall_ms': summarize_ms(wall_seconds),
+        'cycle_cpu_ms': summarize_ms(cpu_seconds),
+        'cycles_per_second': args.cycles / sum(wall_seconds),
+        'devices_per_second': args.devices * args.cycles / sum(wall_seconds),
+        'phase_cpu_ms': phase_cpu_ms,
+        'render_ms': summarize_ms(render_seconds),
+        'render_bytes': len(output),
+        'peak_traced_bytes': peak_traced_bytes,
+        # kilobytes on linux
+        'max_rss_bytes': resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def run_worker(args):
+    # the collector only needs an app context for its logger
+    with Flask(__name__).app_context():
+        result = run_size(args)
+    json.dump(result, sys.stdout)
+
+
+def get_worker_command(args, size):
+    command = [
+        sys.executable, '-m', __spec__.name,
+        '--worker',
+        '--devices', str(size),
+        '--cycles', str(args.cycles),
+        '--renders', str(args.renders),
+        '--churn', str(args.churn),
+        '--mode', args.mode,
+    ]
+    if args.leases is not None:
+        command.extend(['--leases', str(args.leases)])
+    if args.reservations is not None:
+        command.extend(['--reservations', str(args.reservations)])
+    return command
+
+
+def run_size_in_worker(args, size):
+    multiproc_dir = tempfile.mkdtemp(prefix='scrape_benchmark_')
+    env = dict(os.environ)
+    env['PROMETHEUS_MULTIPROC_DIR'] = multiproc_dir
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in [ROOT_DIR, env.get('PYTHONPATH')] if p)
+    try:
+        completed = subprocess.run(
+            get_worker_command(args, size),
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True)
+    finally:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+    return json.loads(completed.stdout)
+
+
+def get_version():
+    from importlib.metadata import version, PackageNotFoundError
+
+    versions = {'python': platform.python_version()}
+    for package in ['tplinkrouterc6u', 'prometheus_client']:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    version_path = os.path.join(
+        ROOT_DIR, 'tp_link_router_exporter', 'app', 'version.py')
+    with open(version_path) as f:
+        # `version = '1.2.3'`, without importing the app
+        versions['exporter'] = f.read().split("'")[1]
+    return versions
+
+
+def print_table(results):
+    print(f'{"devices":>8} {"cycle ms":>10} {"cpu ms":>10} '
+          f'{"render ms":>10} {"peak MB":>9} {"rss MB":>8}',
+          file=sys.stderr)
+    for result in results:
+        print(f'{result["devices"]:>8} '
+              f'{result["cycle_wall_ms"]["mean"]:>10.2f} '
+              f'{result["cycle_cpu_ms"]["mean"]:>10.2f} '
+              f'{result["render_ms"]["mean"]:>10.2f} '
+              f'{result["peak_traced_bytes"] / 2 ** 20:>9.1f} '
+              f'{result["max_rss_bytes"] / 2 ** 20:>8.1f}',
+              file=sys.stderr)
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        print(f'running {size} devices ...', file=sys.stderr)
+        results.append(run_size_in_worker(args, size))
+    document = {
+        'benchmark': 'scrape',
+        'format_version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'versions': get_version(),
+        'results': results,
+    }
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES)
+    parser.add_argument('--cycles', type=int, default=DEFAULT_CYCLES)
+    parser.add_argument('--renders', type=int, default=DEFAULT_RENDERS)
+    # defaults to one lease per device and a reservation per 10 devices
+    parser.add_argument('--leases', type=int)
+    parser.add_argument('--reservations', type=int)
+    parser.add_argument('--churn', type=float, default=DEFAULT_CHURN,
+                        help='fraction of devices replaced every cycle')
+    parser.add_argument('--mode', choices=['gauges', 'snapshot'],
+                        default='gauges')
+    parser.add_argument('--output', help='JSON file, stdout by default')
+    parser.add_argument('--worker', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--devices', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return run_worker(args)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,34 @@
 import os
+from prometheus_client import CollectorRegistry
 from prometheus_flask_exporter.multiprocess import GunicornPrometheusMetrics
+import metrics_server
 
 
 def when_ready(server):
-    # https://github.com/rycus86/prometheus_flask_exporter/blob/62e836435324501dc496059843d094c9cca909c0/examples/gunicorn/config.py
     port = int(os.getenv('METRICS_PORT'))
-    GunicornPrometheusMetrics.start_http_server_when_ready(port)
+    if metrics_server.is_enabled():
+        # serves what the scheduler leader rendered after its last scrape
+        metrics_server.start_http_server(port)
+        return
+    # https://github.com/rycus86/prometheus_flask_exporter/blob/62e836435324501dc496059843d094c9cca909c0/examples/gunicorn/config.py
+    # the multiprocess files plus what only the scheduler leader holds
+    registry = CollectorRegistry()
+    registry.register(metrics_server.LeaderStateCollector())
+    GunicornPrometheusMetrics(registry=registry).start_http_server(port)
 
 
 def child_exit(server, worker):
     GunicornPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
+    # nothing to do for the scheduler leader, its `flock` died with it and a
+    # waiting worker has already taken over the scheduled scrapes
 
 
 # https://docs.gunicorn.org/en/latest/configure.html
 bind = "0.0.0.0:3133"
-# FIXME: If this is a webserver, we can have more than 1, but we need to
-#  solve for scheduler with DB and/or a semaphore. For now, avoid by
-#  keeping workers limited to 1, since this is really just a
-#  prometheus exporter. But in the future I could stick a dashboard on this.
-workers = 1
+# one worker unless asked for more, then only one of them (the elected
+# scheduler leader, see `SchedulerLeader`) scrapes the routers and the rest
+# just serve requests, so a slow request and a long scrape don't stall each
+# other
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# every worker has to run the leader election itself, after the fork
+preload_app = False
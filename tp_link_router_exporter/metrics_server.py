@@ -0,0 +1,365 @@
+"""Serves the `/metrics` page pre-rendered by the scheduler leader
+
+Runs in the gunicorn master on `METRICS_PORT` (see `gunicorn.conf.py`), so it
+must not import the app. After every scrape the leader writes the page, plain
+and gzipped, to `SCHEDULER_LEADER_DIR` (see `MetricsRenderer`). Both are
+kept in memory here and only re-read when they change, so a pull costs one
+copy of the page however many scrapers there are. Until the first page is
+written, pulls are rendered from the multiprocess files like before, and a
+page left behind by an earlier run is never served.
+
+The time left on each DHCP lease is appended on every pull, from the lease
+expiries written next to the page, as a second gzip member when gzipped.
+
+`LeaderStateCollector` serves the router snapshots and the same lease times
+from the state file the leader saves after every scrape, for the pages
+rendered from the multiprocess files here (with `PRERENDERED_METRICS=0` too,
+see `gunicorn.conf.py`).
+"""
+import fcntl
+import gzip
+import json
+import marshal
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.utils import floatToGoString
+
+
+# same files as `MetricsRenderer` writes
+FILE_NAME = 'tp_link_router_exporter_metrics.prom'
+GZIP_FILE_NAME = f'{FILE_NAME}.gz'
+LEASES_FILE_NAME = 'tp_link_router_exporter_metrics_leases.json'
+# same lock as `MultiprocessCompactor.reading()`
+COMPACTION_LOCK_FILE_NAME = 'tp_link_router_exporter_compaction.lock'
+# same file and format as `LeaderMetricsCollector` saves
+STATE_FILE_NAME = 'tp_link_router_exporter_scheduler_leader.state'
+STATE_FORMAT_VERSION = 1
+# same family as `LeaseExpiryCollector` yields
+LEASE_NAME = 'tp_link_router_exporter_router_ipv4_dhcp_lease_remaining_seconds'
+LEASE_DOCUMENTATION = ('The time remaining (s) for an IPv4 DHCP lease, '
+                       'as of this scrape')
+LEASE_LABELNAMES = ['router_name', 'hostname', 'ip_address', 'mac_address']
+GZIP_ENCODING = 'gzip'
+IDENTITY_ENCODING = 'identity'
+METRICS_PATHS = ('/', '/metrics')
+
+
+class MetricsServerException(Exception):
+    pass
+
+
+def is_enabled():
+    value = os.getenv('PRERENDERED_METRICS', '0')
+    return bool(value.strip().lower() in ('1', 'true', 'yes', 'on'))
+
+
+def get_directory():
+    # same as `SchedulerLeader.get_default_directory()`
+    default_directory = os.path.join(
+        tempfile.gettempdir(),
+        f'tp_link_router_exporter_{os.getuid()}')
+    return os.getenv('SCHEDULER_LEADER_DIR') or default_directory
+
+
+def is_private_directory(directory):
+    # same check as `SchedulerLeader.ensure_directory()`
+    stat = os.stat(directory)
+    return bool(stat.st_uid == os.getuid() and not stat.st_mode & 0o022)
+
+
+def get_multiprocess_directory():
+    # the same two names `MultiProcessCollector` looks for
+    return (os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+            or os.environ.get('prometheus_multiproc_dir'))
+
+
+def render_leases(leases, now):
+    """Exposition text of the time left on every lease in `leases`, as
+    written by `MetricsRenderer`
+    """
+    name = leases['name']
+    documentation = (leases['documentation']
+                     .replace('\\', r'\\')
+                     .replace('\n', r'\n'))
+    lines = [
+        f'# HELP {name} {documentation}\n',
+        f'# TYPE {name} gauge\n',
+    ]
+    for label_text, expires_at in leases['series']:
+        remaining = floatToGoString(max(expires_at - now, 0.0))
+        lines.append(f'{name}{label_text} {remaining}\n')
+    return ''.join(lines).encode('utf-8')
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an `Accept-Encoding` header allows gzip, e.g.
+    `'gzip, deflate'`, `'*'` or not `'gzip;q=0'`
+    """
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    quality = qualities.get(GZIP_ENCODING, qualities.get('*', 0.0))
+    return bool(quality > 0)
+
+
+class LeaderStateCollector(object):
+    """Custom prometheus collector over the state the scheduler leader
+    saves after every scrape, like `LeaderMetricsCollector` in followers
+    """
+    def __init__(self, directory=None):
+        super().__init__()
+        self.directory = directory or get_directory()
+        self._lock = threading.Lock()
+        # (mtime_ns, size) of the loaded file => its records
+        self._key = None
+        self._records = ([], [])
+
+    def __repr__(self):
+        return f'LeaderStateCollector ({self.directory}) => {self._key}'
+
+    def get_path(self):
+        return os.path.join(self.directory, STATE_FILE_NAME)
+
+    def load(self):
+        """`(snapshot records, lease records)` of the saved state, empty
+        while there is none
+        """
+        path = self.get_path()
+        try:
+            if not is_private_directory(self.directory):
+                return [], []
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return [], []
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key != self._key:
+                with open(path, 'rb') as f:
+                    version, snapshot_records, lease_records = marshal.loads(
+                        f.read())
+                if version != STATE_FORMAT_VERSION:
+                    e_m = f'unsupported leader state format version: {version}'
+                    raise MetricsServerException(e_m)
+                self._records = (snapshot_records, lease_records)
+                self._key = key
+            return self._records
+
+    def describe(self):
+        return []
+
+    @classmethod
+    def get_snapshot_families(cls, snapshot_records):
+        # same families as `RouterSnapshotCollector.collect()`
+        metric_families = {}
+        for _, _, families in snapshot_records:
+            for (name, documentation, family_type, labelnames,
+                 samples) in families:
+                metric_family = metric_families.get(name)
+                if metric_family is None:
+                    family_class = GaugeMetricFamily
+                    if family_type == 'counter':
+                        family_class = CounterMetricFamily
+                    metric_family = family_class(
+                        name,
+                        documentation,
+                        labels=labelnames)
+                    metric_families[name] = metric_family
+                for label_values, value in samples:
+                    metric_family.add_metric(label_values, value)
+        return list(metric_families.values())
+
+    def collect(self, now=None):
+        try:
+            snapshot_records, lease_records = self.load()
+        except Exception:
+            # an unreadable state must not fail the whole page
+            snapshot_records, lease_records = [], []
+        yield from self.get_snapshot_families(snapshot_records)
+        if now is None:
+            now = time.time()
+        family = GaugeMetricFamily(
+            LEASE_NAME,
+            LEASE_DOCUMENTATION,
+            labels=LEASE_LABELNAMES)
+        for router_name, expiries in lease_records:
+            for hostname, ip_address, mac_address, expires_at in expiries:
+                family.add_metric(
+                    [router_name, hostname, ip_address, mac_address],
+                    max(expires_at - now, 0.0))
+        yield family
+
+
+class PrerenderedMetrics(object):
+    def __init__(self, directory=None, started_at_ns=None):
+        super().__init__()
+        self.directory = directory or get_directory()
+        # files older than this are from an earlier run
+        if started_at_ns is None:
+            started_at_ns = time.time_ns()
+        self.started_at_ns = started_at_ns
+        self._lock = threading.Lock()
+        # (mtime_ns, size) of all files => their contents
+        self._key = None
+        self._pages = None
+        self._leases = None
+
+    def __repr__(self):
+        return f'PrerenderedMetrics ({self.directory}) => {self._key}'
+
+    def get_paths(self):
+        return (
+            os.path.join(self.directory, FILE_NAME),
+            os.path.join(self.directory, GZIP_FILE_NAME),
+            os.path.join(self.directory, LEASES_FILE_NAME),
+        )
+
+    @classmethod
+    def _read(cls, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _get_key(self):
+        try:
+            stats = [os.stat(path) for path in self.get_paths()]
+        except FileNotFoundError:
+            return None
+        if any(s.st_mtime_ns < self.started_at_ns for s in stats):
+            return None
+        return tuple((s.st_mtime_ns, s.st_size) for s in stats)
+
+    def _load(self, key):
+        with self._lock:
+            if key != self._key:
+                plain_path, gzip_path, leases_path = self.get_paths()
+                try:
+                    pages = {
+                        IDENTITY_ENCODING: self._read(plain_path),
+                        GZIP_ENCODING: self._read(gzip_path),
+                    }
+                    leases = json.loads(self._read(leases_path))
+                except FileNotFoundError:
+                    return self._pages, self._leases
+                self._pages = pages
+                self._leases = leases
+                self._key = key
+            return self._pages, self._leases
+
+    def get_pages(self):
+        """`({encoding: body}, leases)` of the latest pre-rendered page,
+        `(None, None)` while there is none
+        """
+        key = self._get_key()
+        if key is None:
+            return None, None
+        if key == self._key:
+            return self._pages, self._leases
+        return self._load(key)
+
+    @classmethod
+    def render_multiprocess(cls):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(LeaderStateCollector())
+        lock_path = os.path.join(
+            get_multiprocess_directory(),
+            COMPACTION_LOCK_FILE_NAME)
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            plain = generate_latest(registry)
+        return {
+            IDENTITY_ENCODING: plain,
+            GZIP_ENCODING: gzip.compress(plain),
+        }
+
+    def get_page(self, accept_encoding, now=None):
+        """`(encoding, body)` to answer a pull with"""
+        pages, leases = self.get_pages()
+        if pages is None:
+            pages = self.render_multiprocess()
+        encoding = IDENTITY_ENCODING
+        if accepts_gzip(accept_encoding):
+            encoding = GZIP_ENCODING
+        body = pages[encoding]
+        if not leases or not leases['series']:
+            return encoding, body
+        if now is None:
+            now = time.time()
+        lease_body = render_leases(leases, now)
+        if encoding == GZIP_ENCODING:
+            # gzip readers go on to the next member, as if one stream
+            lease_body = gzip.compress(lease_body, compresslevel=1)
+        return encoding, body + lease_body
+
+
+class PrerenderedMetricsHandler(BaseHTTPRequestHandler):
+    # keep-alive, every response has a `Content-Length`
+    protocol_version = 'HTTP/1.1'
+    metrics = None
+
+    def _send_page(self, include_body):
+        if self.path.split('?', 1)[0] not in METRICS_PATHS:
+            body = b'Not Found\n'
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if include_body:
+                self.wfile.write(body)
+            return
+        encoding, body = self.metrics.get_page(
+            self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE_LATEST)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding != IDENTITY_ENCODING:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._send_page(include_body=True)
+
+    def do_HEAD(self):
+        self._send_page(include_body=False)
+
+    def log_message(self, format, *args):
+        # every pull would be logged otherwise
+        pass
+
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def start_http_server(port, addr='0.0.0.0', directory=None):
+    handler = type(
+        'BoundPrerenderedMetricsHandler',
+        (PrerenderedMetricsHandler,),
+        {'metrics': PrerenderedMetrics(directory)})
+    server = MetricsHTTPServer((addr, port), handler)
+    thread = threading.Thread(
+        target=server.serve_forever,
+        name='prerendered_metrics_server',
+        daemon=True)
+    thread.start()
+    return server, thread